@@ -4,6 +4,7 @@ from datetime import datetime
 import re
 
 from models.user import User, db, UserRole
+from services.identity import get_current_user
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -148,7 +149,7 @@ def get_profile():
     """Get user profile."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
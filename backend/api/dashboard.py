@@ -1,11 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
 import json
 
-from models.user import User, UserRole, db
-from models.health import HealthRecord, SymptomReport, RiskAssessment, EnvironmentalData, SeverityLevel, RiskCategory
+from models.user import UserRole
+from services.identity import get_current_user
+from services.user_activity import cached_user_view, fetch_user_activity
+from services.health_summary import get_user_summary, summary_statistics
+from services.outbreak_detection import recent_outbreak_alerts
+from services.environmental_analytics import analyze_environmental_impact
+from services.health_alerts import get_user_alerts
+from services.trends import RESOLUTIONS as TREND_RESOLUTIONS, build_trends
+from services.rate_limit import rate_cost
+from services.task_queue import BrokerUnavailable, broker_unavailable_response, enqueue, job_response
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -15,41 +22,12 @@ def get_dashboard_overview():
     """Get dashboard overview for current user."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get user's recent data
-        recent_health_records = HealthRecord.query.filter_by(user_id=current_user_id)\
-            .order_by(HealthRecord.recorded_at.desc()).limit(5).all()
-        
-        recent_symptoms = SymptomReport.query.filter_by(user_id=current_user_id)\
-            .order_by(SymptomReport.reported_at.desc()).limit(3).all()
-        
-        recent_assessments = RiskAssessment.query.filter_by(user_id=current_user_id)\
-            .order_by(RiskAssessment.assessed_at.desc()).limit(3).all()
-        
-        # Calculate health metrics
-        health_metrics = calculate_health_metrics(recent_health_records)
-        
-        # Get latest risk assessment
-        latest_risk = None
-        if recent_assessments:
-            latest_risk = recent_assessments[0].to_dict()
-        
-        overview = {
-            'user_info': {
-                'name': f"{user.first_name} {user.last_name}",
-                'age': user.age,
-                'location': user.location
-            },
-            'health_metrics': health_metrics,
-            'recent_symptoms': [symptom.to_dict() for symptom in recent_symptoms],
-            'latest_risk_assessment': latest_risk,
-            'total_records': len(recent_health_records),
-            'last_updated': datetime.utcnow().isoformat()
-        }
+        overview = cached_user_view(current_user_id, 'overview', lambda: build_overview(user))
         
         return jsonify({
             'overview': overview,
@@ -61,12 +39,13 @@ def get_dashboard_overview():
         return jsonify({'error': 'Failed to get dashboard overview'}), 500
 
 @dashboard_bp.route('/public-health', methods=['GET'])
+@rate_cost('analytics')
 @jwt_required()
 def get_public_health_dashboard():
     """Get public health dashboard (for health officials)."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user or user.role not in [UserRole.PUBLIC_HEALTH_OFFICIAL, UserRole.ADMIN]:
             return jsonify({'error': 'Public health official access required'}), 403
@@ -76,31 +55,23 @@ def get_public_health_dashboard():
         
         # Get time range (default to last 30 days)
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # Get aggregated data
-        health_trends = get_health_trends(location, start_date)
-        symptom_patterns = get_symptom_patterns(location, start_date)
-        risk_distribution = get_risk_distribution(location, start_date)
-        environmental_impact = get_environmental_impact(location, start_date)
         
-        dashboard = {
-            'health_trends': health_trends,
-            'symptom_patterns': symptom_patterns,
-            'risk_distribution': risk_distribution,
-            'environmental_impact': environmental_impact,
-            'location': location,
-            'date_range': {
-                'start': start_date.isoformat(),
-                'end': datetime.utcnow().isoformat()
-            }
-        }
+        # Aggregate on the analytics queue and return a job handle to poll
+        if request.args.get('async', 'false').lower() == 'true':
+            job = enqueue('public_health_dashboard', location, days, user_id=user.id)
+            return jsonify({
+                'job': job_response(job),
+                'message': 'Public health dashboard queued'
+            }), 202
         
         return jsonify({
-            'dashboard': dashboard,
+            'dashboard': build_public_health_dashboard(location, days),
             'message': 'Public health dashboard retrieved successfully'
         }), 200
         
+    except BrokerUnavailable as e:
+        current_app.logger.warning(f"Task broker unavailable queueing public health dashboard: {str(e)}")
+        return broker_unavailable_response()
     except Exception as e:
         current_app.logger.error(f"Error getting public health dashboard: {str(e)}")
         return jsonify({'error': 'Failed to get public health dashboard'}), 500
@@ -111,7 +82,7 @@ def get_health_alerts():
     """Get health alerts for the current user."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -129,12 +100,13 @@ def get_health_alerts():
         return jsonify({'error': 'Failed to get health alerts'}), 500
 
 @dashboard_bp.route('/trends', methods=['GET'])
+@rate_cost('analytics')
 @jwt_required()
 def get_health_trends():
     """Get health trends for the current user."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -143,56 +115,20 @@ def get_health_trends():
         days = request.args.get('days', 30, type=int)
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get user's health records
-        health_records = HealthRecord.query.filter(
-            and_(
-                HealthRecord.user_id == current_user_id,
-                HealthRecord.recorded_at >= start_date
-            )
-        ).order_by(HealthRecord.recorded_at).all()
+        # Optional server-side resampling and downsampling
+        resolution = request.args.get('resolution', 'raw')
+        points = request.args.get('points', type=int)
         
-        # Generate trends
-        trends = {
-            'blood_pressure': [],
-            'heart_rate': [],
-            'weight': [],
-            'sleep_hours': [],
-            'stress_level': []
-        }
+        if resolution not in TREND_RESOLUTIONS:
+            return jsonify({'error': f'Resolution must be one of: {", ".join(TREND_RESOLUTIONS)}'}), 400
         
-        for record in health_records:
-            date_str = record.recorded_at.strftime('%Y-%m-%d')
-            
-            if record.blood_pressure_systolic and record.blood_pressure_diastolic:
-                trends['blood_pressure'].append({
-                    'date': date_str,
-                    'systolic': record.blood_pressure_systolic,
-                    'diastolic': record.blood_pressure_diastolic
-                })
-            
-            if record.heart_rate:
-                trends['heart_rate'].append({
-                    'date': date_str,
-                    'value': record.heart_rate
-                })
-            
-            if record.weight:
-                trends['weight'].append({
-                    'date': date_str,
-                    'value': record.weight
-                })
-            
-            if record.sleep_hours:
-                trends['sleep_hours'].append({
-                    'date': date_str,
-                    'value': record.sleep_hours
-                })
-            
-            if record.stress_level:
-                trends['stress_level'].append({
-                    'date': date_str,
-                    'value': record.stress_level
-                })
+        if points is not None:
+            max_points = current_app.config['TRENDS_MAX_POINTS']
+            if not 3 <= points <= max_points:
+                return jsonify({'error': f'Points must be between 3 and {max_points}'}), 400
+        
+        # Generate trends
+        trends = build_trends(current_user_id, start_date, resolution=resolution, points=points)
         
         return jsonify({
             'trends': trends,
@@ -200,6 +136,7 @@ def get_health_trends():
                 'start': start_date.isoformat(),
                 'end': datetime.utcnow().isoformat()
             },
+            'resolution': resolution,
             'message': 'Health trends retrieved successfully'
         }), 200
         
@@ -207,45 +144,93 @@ def get_health_trends():
         current_app.logger.error(f"Error getting health trends: {str(e)}")
         return jsonify({'error': 'Failed to get health trends'}), 500
 
-def calculate_health_metrics(health_records):
-    """Calculate health metrics from recent health records."""
-    if not health_records:
+def build_public_health_dashboard(location, days):
+    """Aggregate the public health dashboard; also run as the 'public_health_dashboard' task."""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    
+    return {
+        'health_trends': get_health_trends(location, start_date),
+        'symptom_patterns': get_symptom_patterns(location, start_date),
+        'risk_distribution': get_risk_distribution(location, start_date),
+        'environmental_impact': get_environmental_impact(location, start_date),
+        'outbreak_alerts': get_outbreak_alerts(location, start_date),
+        'location': location,
+        'date_range': {
+            'start': start_date.isoformat(),
+            'end': datetime.utcnow().isoformat()
+        }
+    }
+
+def build_overview(user):
+    """Build the dashboard overview from a single activity query."""
+    activity = fetch_user_activity(user.id, {
+        'health_summary': 1,
+        'symptom_reports': 3,
+        'risk_assessments': 1
+    })
+    
+    summary_rows = activity['health_summary']['rows']
+    summary = summary_rows[0] if summary_rows else get_user_summary(user.id)
+    recent_symptoms = activity['symptom_reports']['rows']
+    recent_assessments = activity['risk_assessments']['rows']
+    
+    # Calculate health metrics
+    health_metrics = calculate_health_metrics(summary)
+    
+    # Get latest risk assessment
+    latest_risk = None
+    if recent_assessments:
+        latest_risk = recent_assessments[0].to_dict()
+    
+    return {
+        'user_info': {
+            'name': f"{user.first_name} {user.last_name}",
+            'age': user.age,
+            'location': user.location
+        },
+        'health_metrics': health_metrics,
+        'recent_symptoms': [symptom.to_dict() for symptom in recent_symptoms],
+        'latest_risk_assessment': latest_risk,
+        'total_records': summary.health_record_count,
+        'last_updated': datetime.utcnow().isoformat()
+    }
+
+def calculate_health_metrics(summary):
+    """Calculate health metrics from the user's health summary."""
+    latest_vitals = summary.get_latest_vitals()
+    if not latest_vitals:
         return {}
     
-    latest_record = health_records[0]
+    statistics = summary_statistics(summary)
     
     metrics = {
         'latest_vitals': {
-            'heart_rate': latest_record.heart_rate,
+            'heart_rate': latest_vitals.get('heart_rate'),
             'blood_pressure': {
-                'systolic': latest_record.blood_pressure_systolic,
-                'diastolic': latest_record.blood_pressure_diastolic
+                'systolic': latest_vitals.get('blood_pressure_systolic'),
+                'diastolic': latest_vitals.get('blood_pressure_diastolic')
             },
-            'temperature': latest_record.temperature,
-            'weight': latest_record.weight,
-            'recorded_at': latest_record.recorded_at.isoformat()
+            'temperature': latest_vitals.get('temperature'),
+            'weight': latest_vitals.get('weight'),
+            'recorded_at': latest_vitals.get('recorded_at')
         },
-        'averages': {}
+        'averages': {},
+        'rolling': statistics['rolling']
     }
     
-    # Calculate averages
-    if len(health_records) > 1:
-        heart_rates = [r.heart_rate for r in health_records if r.heart_rate]
-        bp_systolic = [r.blood_pressure_systolic for r in health_records if r.blood_pressure_systolic]
-        bp_diastolic = [r.blood_pressure_diastolic for r in health_records if r.blood_pressure_diastolic]
-        sleep_hours = [r.sleep_hours for r in health_records if r.sleep_hours]
-        stress_levels = [r.stress_level for r in health_records if r.stress_level]
-        
-        if heart_rates:
-            metrics['averages']['heart_rate'] = round(sum(heart_rates) / len(heart_rates), 1)
-        if bp_systolic:
-            metrics['averages']['bp_systolic'] = round(sum(bp_systolic) / len(bp_systolic), 1)
-        if bp_diastolic:
-            metrics['averages']['bp_diastolic'] = round(sum(bp_diastolic) / len(bp_diastolic), 1)
-        if sleep_hours:
-            metrics['averages']['sleep_hours'] = round(sum(sleep_hours) / len(sleep_hours), 1)
-        if stress_levels:
-            metrics['averages']['stress_level'] = round(sum(stress_levels) / len(stress_levels), 1)
+    # Averages over the last 7 days
+    average_fields = {
+        'heart_rate': 'heart_rate',
+        'bp_systolic': 'blood_pressure_systolic',
+        'bp_diastolic': 'blood_pressure_diastolic',
+        'sleep_hours': 'sleep_hours',
+        'stress_level': 'stress_level'
+    }
+    
+    weekly = statistics['rolling']['7d']
+    for name, metric in average_fields.items():
+        if metric in weekly:
+            metrics['averages'][name] = round(weekly[metric]['mean'], 1)
     
     return metrics
 
@@ -309,92 +294,43 @@ def get_risk_distribution(location, start_date):
 
 def get_environmental_impact(location, start_date):
     """Get environmental impact data for public health dashboard."""
-    # Mock implementation
+    days = max((datetime.utcnow() - start_date).days, 1)
+    analytics = analyze_environmental_impact(location, days)
+    summary = analytics['summary']
+    
+    air_quality = summary['correlations']['air_quality_index']['respiratory']
+    pollen = summary['correlations']['pollen_count']['allergy']
+    temperature = summary['correlations']['temperature']['respiratory']
+    
     impact = {
         'air_quality_correlation': {
-            'poor_air_quality_days': 8,
-            'increased_respiratory_symptoms': 23,
-            'correlation_coefficient': 0.67
+            'poor_air_quality_days': summary['exposure']['air_quality_index']['days_above_threshold'],
+            'increased_respiratory_symptoms': summary['exposure']['air_quality_index']['symptoms']['respiratory'],
+            'correlation_coefficient': air_quality['coefficient'],
+            'lag_days': air_quality['best_lag']
         },
         'weather_impact': {
-            'high_temperature_days': 15,
-            'heat_related_symptoms': 12,
-            'precipitation_days': 7,
-            'allergy_symptoms': 45
-        }
+            'high_temperature_days': summary['exposure']['temperature']['days_above_threshold'],
+            'heat_related_symptoms': summary['exposure']['temperature']['symptoms']['respiratory'],
+            'temperature_correlation_coefficient': temperature['coefficient'],
+            'high_pollen_days': summary['exposure']['pollen_count']['days_above_threshold'],
+            'allergy_symptoms': summary['symptom_totals']['allergy'],
+            'pollen_correlation_coefficient': pollen['coefficient'],
+            'pollen_lag_days': pollen['best_lag']
+        },
+        'locations': analytics['locations']
     }
     
     return impact
 
+def get_outbreak_alerts(location, start_date):
+    """Get outbreak alerts raised by streaming detection for public health dashboard."""
+    return recent_outbreak_alerts(location, start_date)
+
 def generate_health_alerts(user):
-    """Generate personalized health alerts for a user."""
-    alerts = []
-    
-    # Get user's recent data
-    recent_records = HealthRecord.query.filter_by(user_id=user.id)\
-        .order_by(HealthRecord.recorded_at.desc()).limit(5).all()
-    
-    recent_assessments = RiskAssessment.query.filter_by(user_id=user.id)\
-        .order_by(RiskAssessment.assessed_at.desc()).limit(3).all()
-    
-    # Check for health concerns
-    if recent_records:
-        latest_record = recent_records[0]
-        
-        # Blood pressure alert
-        if (latest_record.blood_pressure_systolic and 
-            latest_record.blood_pressure_systolic > 140):
-            alerts.append({
-                'type': 'health_metric',
-                'severity': 'high',
-                'title': 'High Blood Pressure Detected',
-                'message': f'Your latest blood pressure reading ({latest_record.blood_pressure_systolic}/{latest_record.blood_pressure_diastolic}) is elevated.',
-                'recommendations': [
-                    'Monitor blood pressure daily',
-                    'Consult your healthcare provider',
-                    'Reduce sodium intake'
-                ]
-            })
-        
-        # Heart rate alert
-        if latest_record.heart_rate and latest_record.heart_rate > 100:
-            alerts.append({
-                'type': 'health_metric',
-                'severity': 'medium',
-                'title': 'Elevated Heart Rate',
-                'message': f'Your latest heart rate ({latest_record.heart_rate} bpm) is higher than normal.',
-                'recommendations': [
-                    'Monitor heart rate throughout the day',
-                    'Consider stress management techniques',
-                    'Consult healthcare provider if persists'
-                ]
-            })
-        
-        # Sleep alert
-        if latest_record.sleep_hours and latest_record.sleep_hours < 6:
-            alerts.append({
-                'type': 'lifestyle',
-                'severity': 'medium',
-                'title': 'Insufficient Sleep',
-                'message': f'You\'re only getting {latest_record.sleep_hours} hours of sleep per night.',
-                'recommendations': [
-                    'Aim for 7-8 hours of sleep',
-                    'Establish a regular sleep schedule',
-                    'Limit screen time before bed'
-                ]
-            })
-    
-    # Check risk assessments
-    if recent_assessments:
-        latest_assessment = recent_assessments[0]
-        if latest_assessment.risk_level == SeverityLevel.HIGH:
-            alerts.append({
-                'type': 'risk_assessment',
-                'severity': 'high',
-                'title': 'High Health Risk Detected',
-                'message': f'Your latest risk assessment shows high risk for {latest_assessment.predicted_condition}.',
-                'recommendations': latest_assessment.get_recommendations()
-            })
+    """Get personalized health alerts for a user."""
+    # Alerts are evaluated and stored as records and assessments are written
+    alerts = get_user_alerts(user.id)
     
     # Add general health reminders
     if len(alerts) == 0:
@@ -413,23 +349,29 @@ def generate_health_alerts(user):
     return alerts
 
 @dashboard_bp.route('/statistics', methods=['GET'])
+@rate_cost('analytics')
 @jwt_required()
 def get_user_statistics():
     """Get user's health statistics."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get user's statistics
+        # Get user's statistics from the maintained summary row
+        summary = get_user_summary(current_user_id)
+        
         stats = {
-            'total_health_records': HealthRecord.query.filter_by(user_id=current_user_id).count(),
-            'total_symptom_reports': SymptomReport.query.filter_by(user_id=current_user_id).count(),
-            'total_risk_assessments': RiskAssessment.query.filter_by(user_id=current_user_id).count(),
+            'total_health_records': summary.health_record_count,
+            'total_symptom_reports': summary.symptom_report_count,
+            'total_risk_assessments': summary.risk_assessment_count,
             'account_created': user.created_at.isoformat(),
-            'last_activity': user.last_login.isoformat() if user.last_login else None
+            'last_activity': user.last_login.isoformat() if user.last_login else None,
+            'last_health_record_at': summary.last_health_record_at.isoformat() if summary.last_health_record_at else None,
+            'last_symptom_report_at': summary.last_symptom_report_at.isoformat() if summary.last_symptom_report_at else None,
+            'last_risk_assessment_at': summary.last_risk_assessment_at.isoformat() if summary.last_risk_assessment_at else None
         }
         
         return jsonify({
@@ -1,10 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from datetime import datetime, timedelta
 import requests
 import json
 
-from models.health import EnvironmentalData, db
+from models.health import EnvironmentalData, EnvironmentalAggregate, db
+from services.outbreak_detection import recent_outbreak_alerts
+from services.environmental_cache import get_environmental
+from services.environmental_data import environmental_record, fetch_live_data, find_nearest_environmental_data, find_recent_environmental_data, load_environmental_data, overlay_live_data
+from services.geo import search_location
+from services.alert_rules import get_alert_rules
 
 environmental_bp = Blueprint('environmental', __name__)
 
@@ -46,15 +51,24 @@ def get_environmental_history():
         location = request.args.get('location')
         limit = request.args.get('limit', 50, type=int)
         offset = request.args.get('offset', 0, type=int)
+        resolution = request.args.get('resolution', 'raw')
         
-        # Query environmental data
-        query = EnvironmentalData.query
+        if resolution not in ('raw', 'hour', 'day'):
+            return jsonify({'error': 'Resolution must be one of: raw, hour, day'}), 400
         
-        if location:
-            query = query.filter(EnvironmentalData.location.ilike(f'%{location}%'))
+        # Older history is only kept as hourly and daily aggregates
+        if resolution == 'raw':
+            query = EnvironmentalData.query
+            if location:
+                query = search_location(query, location)
+            query = query.order_by(EnvironmentalData.recorded_at.desc())
+        else:
+            query = EnvironmentalAggregate.query.filter_by(resolution=resolution)
+            if location:
+                query = search_location(query, location, EnvironmentalAggregate.location_key)
+            query = query.order_by(EnvironmentalAggregate.bucket_start.desc())
         
-        env_data = query.order_by(EnvironmentalData.recorded_at.desc())\
-            .limit(limit).offset(offset).all()
+        env_data = query.limit(limit).offset(offset).all()
         
         return jsonify({
             'environmental_data': [data.to_dict() for data in env_data],
@@ -146,46 +160,13 @@ def get_environmental_alerts():
         return jsonify({'error': 'Failed to fetch environmental alerts'}), 500
 
 def fetch_environmental_data(location, latitude=None, longitude=None):
-    """Fetch environmental data from external APIs."""
+    """Fetch environmental data, refreshing and recording it when the cached copy expires."""
     try:
-        # Mock environmental data (in production, use real APIs)
-        env_data = {
-            'location': location or f"{latitude},{longitude}",
-            'air_quality_index': 85,  # Mock AQI
-            'pm25': 12.5,
-            'pm10': 18.3,
-            'co2': 410,
-            'pollen_count': 45,
-            'temperature': 22.5,
-            'humidity': 65,
-            'pressure': 1013.25,
-            'wind_speed': 5.2,
-            'uv_index': 6,
-            'recorded_at': datetime.utcnow().isoformat()
-        }
-        
-        # Save to database
-        env_record = EnvironmentalData(
-            location=env_data['location'],
-            latitude=latitude,
-            longitude=longitude,
-            air_quality_index=env_data['air_quality_index'],
-            pm25=env_data['pm25'],
-            pm10=env_data['pm10'],
-            co2=env_data['co2'],
-            pollen_count=env_data['pollen_count'],
-            temperature=env_data['temperature'],
-            humidity=env_data['humidity'],
-            pressure=env_data['pressure'],
-            wind_speed=env_data['wind_speed'],
-            recorded_at=datetime.utcnow()
+        return get_environmental(
+            'current', location, latitude, longitude,
+            lambda: refresh_environmental_data(location, latitude, longitude)
         )
         
-        db.session.add(env_record)
-        db.session.commit()
-        
-        return env_data
-        
     except Exception as e:
         current_app.logger.error(f"Error fetching environmental data: {str(e)}")
         # Return mock data even if database save fails
@@ -199,7 +180,43 @@ def fetch_environmental_data(location, latitude=None, longitude=None):
             'error': 'Using mock data'
         }
 
+def refresh_environmental_data(location, latitude=None, longitude=None):
+    """Get environmental data from a recent snapshot, or fetch and record a new one."""
+    location = location or f"{latitude},{longitude}"
+    
+    # Another worker or the prefetcher may already have recorded a fresh snapshot,
+    # for this location or for a point close enough to stand in for it
+    max_age = current_app.config['ENVIRONMENTAL_CURRENT_TTL']
+    env_data = find_recent_environmental_data(location, max_age)
+    if env_data is None and latitude is not None and longitude is not None:
+        env_data = find_nearest_environmental_data(
+            latitude, longitude, current_app.config['ENVIRONMENTAL_NEAREST_RADIUS_KM'], max_age
+        )
+    if env_data:
+        return env_data
+    
+    env_data = load_environmental_data(location, latitude, longitude)
+    
+    # Save to database
+    env_record = EnvironmentalData(**environmental_record(env_data, latitude, longitude))
+    
+    try:
+        db.session.add(env_record)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error saving environmental data: {str(e)}")
+    
+    return env_data
+
 def fetch_air_quality_data(location, latitude=None, longitude=None):
+    """Fetch air quality data, cached per location."""
+    return get_environmental(
+        'air_quality', location, latitude, longitude,
+        lambda: load_air_quality_data(location, latitude, longitude)
+    )
+
+def load_air_quality_data(location, latitude=None, longitude=None):
     """Fetch air quality data from external APIs."""
     try:
         # Mock air quality data
@@ -219,6 +236,10 @@ def fetch_air_quality_data(location, latitude=None, longitude=None):
             ]
         }
         
+        live_data = fetch_live_data(location, latitude, longitude, ['air_quality'])
+        if overlay_live_data(air_quality, live_data.get('air_quality'), ['aqi', 'main_pollutant']):
+            air_quality['status'] = aqi_status(air_quality['aqi'])
+        
         # Add health risk assessment based on AQI
         if air_quality['aqi'] > 150:
             air_quality['health_risk'] = 'High'
@@ -242,6 +263,13 @@ def fetch_air_quality_data(location, latitude=None, longitude=None):
         }
 
 def fetch_weather_data(location, latitude=None, longitude=None):
+    """Fetch weather data, cached per location."""
+    return get_environmental(
+        'weather', location, latitude, longitude,
+        lambda: load_weather_data(location, latitude, longitude)
+    )
+
+def load_weather_data(location, latitude=None, longitude=None):
     """Fetch weather data from external APIs."""
     try:
         # Mock weather data
@@ -273,17 +301,16 @@ def fetch_weather_data(location, latitude=None, longitude=None):
             ]
         }
         
-        # Add health-related weather alerts
-        weather['health_alerts'] = []
-        
-        if weather['temperature'] > 35:
-            weather['health_alerts'].append('Heat warning - stay hydrated and avoid prolonged sun exposure')
-        
-        if weather['uv_index'] > 8:
-            weather['health_alerts'].append('High UV index - use sunscreen and wear protective clothing')
+        live_data = fetch_live_data(location, latitude, longitude, ['weather'])
+        overlay_live_data(weather, live_data.get('weather'), [
+            'temperature', 'feels_like', 'humidity', 'pressure', 'wind_speed',
+            'wind_direction', 'visibility', 'condition'
+        ])
         
-        if weather['humidity'] > 80:
-            weather['health_alerts'].append('High humidity - may affect those with respiratory conditions')
+        # Add health-related weather alerts
+        weather['health_alerts'] = [
+            alert['title'] for alert in get_alert_rules().evaluate('weather', weather)
+        ]
         
         return weather
         
@@ -295,6 +322,20 @@ def fetch_weather_data(location, latitude=None, longitude=None):
             'error': 'Using mock data'
         }
 
+def aqi_status(aqi):
+    """Get the US AQI category for an index value."""
+    if aqi <= 50:
+        return 'Good'
+    elif aqi <= 100:
+        return 'Moderate'
+    elif aqi <= 150:
+        return 'Unhealthy for Sensitive Groups'
+    elif aqi <= 200:
+        return 'Unhealthy'
+    elif aqi <= 300:
+        return 'Very Unhealthy'
+    return 'Hazardous'
+
 def generate_environmental_alerts(location):
     """Generate environmental health alerts for a location."""
     try:
@@ -325,6 +366,10 @@ def generate_environmental_alerts(location):
             }
         ]
         
+        # Add outbreak alerts raised for this location in the last week
+        since = datetime.utcnow() - timedelta(days=7)
+        alerts.extend(recent_outbreak_alerts(location, since))
+        
         return alerts
         
     except Exception as e:
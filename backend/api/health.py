@@ -3,8 +3,12 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, date
 import json
 
-from models.user import User, db
+from models.user import db
 from models.health import HealthRecord, SymptomReport, SeverityLevel
+from services.identity import get_current_user
+from services.user_activity import cached_user_view, fetch_user_activity
+from services.health_summary import get_user_summary, summary_statistics
+from services.vitals_ingest import ingest_vitals
 
 health_bp = Blueprint('health', __name__)
 
@@ -14,7 +18,7 @@ def get_health_records():
     """Get user's health records."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -43,7 +47,7 @@ def create_health_record():
     """Create a new health record."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -86,6 +90,32 @@ def create_health_record():
         current_app.logger.error(f"Error creating health record: {str(e)}")
         return jsonify({'error': 'Failed to create health record'}), 500
 
+@health_bp.route('/vitals/batch', methods=['POST'])
+@jwt_required()
+def ingest_vital_samples():
+    """Bulk ingest wearable vital samples (NDJSON or packed binary)."""
+    try:
+        current_user_id = get_jwt_identity()
+        user = get_current_user()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        try:
+            result = ingest_vitals(current_user_id, request.get_data(cache=False), request.content_type)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'message': 'Vital samples ingested successfully',
+            **result
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error ingesting vital samples: {str(e)}")
+        return jsonify({'error': 'Failed to ingest vital samples'}), 500
+
 @health_bp.route('/records/<int:record_id>', methods=['GET'])
 @jwt_required()
 def get_health_record(record_id):
@@ -163,7 +193,7 @@ def get_symptom_reports():
     """Get user's symptom reports."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -192,7 +222,7 @@ def create_symptom_report():
     """Create a new symptom report."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -363,46 +393,53 @@ def get_health_summary():
     """Get user's health summary."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get recent health records
-        recent_records = HealthRecord.query.filter_by(user_id=current_user_id)\
-            .order_by(HealthRecord.recorded_at.desc()).limit(5).all()
-        
-        # Get recent symptom reports
-        recent_symptoms = SymptomReport.query.filter_by(user_id=current_user_id)\
-            .order_by(SymptomReport.reported_at.desc()).limit(5).all()
-        
-        # Calculate basic statistics
-        total_records = HealthRecord.query.filter_by(user_id=current_user_id).count()
-        total_symptoms = SymptomReport.query.filter_by(user_id=current_user_id).count()
-        
-        # Get latest vitals
-        latest_vitals = {}
-        if recent_records:
-            latest_record = recent_records[0]
-            latest_vitals = {
-                'heart_rate': latest_record.heart_rate,
-                'blood_pressure_systolic': latest_record.blood_pressure_systolic,
-                'blood_pressure_diastolic': latest_record.blood_pressure_diastolic,
-                'temperature': latest_record.temperature,
-                'weight': latest_record.weight,
-                'recorded_at': latest_record.recorded_at.isoformat()
-            }
+        summary = cached_user_view(current_user_id, 'health_summary',
+                                   lambda: build_health_summary(current_user_id))
         
         return jsonify({
-            'summary': {
-                'total_records': total_records,
-                'total_symptoms': total_symptoms,
-                'latest_vitals': latest_vitals,
-                'recent_records': [record.to_dict() for record in recent_records],
-                'recent_symptoms': [symptom.to_dict() for symptom in recent_symptoms]
-            }
+            'summary': summary
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Error fetching health summary: {str(e)}")
-        return jsonify({'error': 'Failed to fetch health summary'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to fetch health summary'}), 500
+
+def build_health_summary(user_id):
+    """Build the health summary from a single activity query."""
+    activity = fetch_user_activity(user_id, {
+        'health_summary': 1,
+        'health_records': 5,
+        'symptom_reports': 5
+    })
+    
+    summary_rows = activity['health_summary']['rows']
+    summary = summary_rows[0] if summary_rows else get_user_summary(user_id)
+    recent_records = activity['health_records']['rows']
+    recent_symptoms = activity['symptom_reports']['rows']
+    
+    # Get latest vitals
+    latest_vitals = {}
+    vitals = summary.get_latest_vitals()
+    if vitals:
+        latest_vitals = {
+            'heart_rate': vitals.get('heart_rate'),
+            'blood_pressure_systolic': vitals.get('blood_pressure_systolic'),
+            'blood_pressure_diastolic': vitals.get('blood_pressure_diastolic'),
+            'temperature': vitals.get('temperature'),
+            'weight': vitals.get('weight'),
+            'recorded_at': vitals.get('recorded_at')
+        }
+    
+    return {
+        'total_records': summary.health_record_count,
+        'total_symptoms': summary.symptom_report_count,
+        'latest_vitals': latest_vitals,
+        'vital_statistics': summary_statistics(summary),
+        'recent_records': [record.to_dict() for record in recent_records],
+        'recent_symptoms': [symptom.to_dict() for symptom in recent_symptoms]
+    }
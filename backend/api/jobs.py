@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from services.identity import get_current_user
+from services.task_queue import BrokerUnavailable, broker_unavailable_response, get_job, job_response
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    """Get a queued job's state, and its result or error once finished."""
+    try:
+        current_user_id = get_jwt_identity()
+        user = get_current_user()
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        # Everyone who requested a deduplicated job may read it
+        if user.id not in job['user_ids'] and user.role.value != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        return jsonify({'job': job_response(job)}), 200
+        
+    except BrokerUnavailable as e:
+        current_app.logger.warning(f"Task broker unavailable getting job status: {str(e)}")
+        return broker_unavailable_response()
+    except Exception as e:
+        current_app.logger.error(f"Error getting job status: {str(e)}")
+        return jsonify({'error': 'Failed to get job status'}), 500
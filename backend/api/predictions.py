@@ -1,51 +1,225 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, has_app_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 import sys
 import os
+import threading
+import time
 
 # Add parent directory to path to import ML models
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.user import User, db
+from models.user import db
 from models.health import RiskAssessment, RiskCategory, SeverityLevel
-from ml_models.nlp.symptom_classifier import SymptomClassifier
-from ml_models.numerical.risk_predictor import HealthRiskPredictor
+from services.identity import get_current_user
+from services.alert_rules import get_alert_rules, most_severe_status
+from services.feature_store import get_user_features
+from services.rate_limit import rate_cost
+from services.task_queue import BrokerUnavailable, broker_unavailable_response, enqueue, job_response
+from config.config import get_config
+from ml_models.runtime import load_runtime
 
 predictions_bp = Blueprint('predictions', __name__)
 
-# Initialize ML models (these would be loaded from saved models in production)
+SYMPTOM_CLASSIFIER_PATH = "ml_models/nlp/trained_symptom_classifier.pkl"
+RISK_PREDICTOR_PATH = "ml_models/numerical/trained_risk_predictor.pkl"
+
+# Exported artifacts served by the NumPy runtime (MODEL_RUNTIME = 'numpy')
+SYMPTOM_CLASSIFIER_EXPORT_PATH = "ml_models/nlp/trained_symptom_classifier.npz"
+RISK_PREDICTOR_EXPORT_PATH = "ml_models/numerical/trained_risk_predictor.npz"
+
+# Model -> (saved model, exported artifact)
+MODEL_ARTIFACTS = {
+    'symptom_classifier': (SYMPTOM_CLASSIFIER_PATH, SYMPTOM_CLASSIFIER_EXPORT_PATH),
+    'risk_predictor': (RISK_PREDICTOR_PATH, RISK_PREDICTOR_EXPORT_PATH),
+}
+
+# Shared, read-only model instances; replaced as a whole, never modified in place
 symptom_classifier = None
 risk_predictor = None
 
+_models_lock = threading.Lock()
+_retrain_lock = threading.Lock()
+
+# Modification time of each served artifact when it was loaded
+_loaded_mtimes = {}
+_reload_checked_at = 0.0
+
+def _model_setting(name):
+    """Get a model setting, also outside an app context (models load at import)."""
+    if has_app_context():
+        return current_app.config[name]
+    return getattr(get_config(), name)
+
+def _model_runtime():
+    """Get the configured model runtime, 'sklearn' or 'numpy'."""
+    return _model_setting('MODEL_RUNTIME')
+
+def _export(model, export_path):
+    """Export a model for the NumPy runtime with the configured compaction."""
+    model.export(export_path, compact=_model_setting('MODEL_EXPORT_COMPACT'),
+                 prune_tolerance=_model_setting('MODEL_PRUNE_TOLERANCE'))
+
+def _served_artifact(name, runtime):
+    model_path, export_path = MODEL_ARTIFACTS[name]
+    return export_path if runtime == 'numpy' else model_path
+
+def _artifact_mtime(name, runtime):
+    try:
+        return os.stat(_served_artifact(name, runtime)).st_mtime_ns
+    except OSError:
+        return None
+
+def _model_class(name):
+    """Import a model class; scikit-learn is only imported when one is needed."""
+    if name == 'symptom_classifier':
+        from ml_models.nlp.symptom_classifier import SymptomClassifier
+        return SymptomClassifier
+    
+    from ml_models.numerical.risk_predictor import HealthRiskPredictor
+    return HealthRiskPredictor
+
+def _load_or_train(name, runtime):
+    """Load a saved model, or train and save a new one."""
+    model_path, export_path = MODEL_ARTIFACTS[name]
+    if runtime == 'numpy' and os.path.exists(export_path):
+        _loaded_mtimes[name] = _artifact_mtime(name, runtime)
+        return load_runtime(export_path)
+    
+    model_class = _model_class(name)
+    model = model_class(model_path=model_path)
+    if not model.is_trained:
+        print(f"Training {model_class.__name__}...")
+        model.train()
+        model.save_model(model_path)
+        _export(model, export_path)
+    elif runtime == 'numpy':
+        _export(model, export_path)
+    
+    _loaded_mtimes[name] = _artifact_mtime(name, runtime)
+    return load_runtime(export_path) if runtime == 'numpy' else model
+
+def _train_new(name, runtime, training_set=None):
+    """Train, save and export a new model instance (on synthetic data by default)."""
+    model_path, export_path = MODEL_ARTIFACTS[name]
+    model = _model_class(name)()
+    if training_set is None:
+        model.train()
+    else:
+        model.train(*training_set)
+    model.save_model(model_path)
+    _export(model, export_path)
+    
+    _loaded_mtimes[name] = _artifact_mtime(name, runtime)
+    return load_runtime(export_path) if runtime == 'numpy' else model
+
+def _snapshot_training_sets():
+    """Append the latest examples and read training sets from the snapshots; None if too few."""
+    from services.training_data import (
+        append_training_snapshots, has_enough_examples, risk_training_set, symptom_training_set
+    )
+    
+    append_training_snapshots()
+    minimum = current_app.config['TRAINING_MIN_EXAMPLES']
+    
+    texts, conditions = symptom_training_set()
+    frame, risk_levels = risk_training_set()
+    if not (has_enough_examples(conditions, minimum) and has_enough_examples(risk_levels.tolist(), minimum)):
+        return None
+    
+    features = _model_class('risk_predictor')().prepare_features(frame)
+    return {
+        'symptom_classifier': (texts, conditions),
+        'risk_predictor': (features, risk_levels),
+    }
+
 def initialize_models():
-    """Initialize ML models."""
+    """Initialize ML models once per process.
+    
+    Concurrent callers wait for the first one; models are only published
+    once fully loaded or trained.
+    """
     global symptom_classifier, risk_predictor
     
-    try:
-        # Initialize symptom classifier
-        symptom_classifier = SymptomClassifier()
-        if not symptom_classifier.is_trained:
-            print("Training symptom classifier...")
-            symptom_classifier.train()
-            # Save the model
-            symptom_classifier.save_model("ml_models/nlp/trained_symptom_classifier.pkl")
-        
-        # Initialize risk predictor
-        risk_predictor = HealthRiskPredictor()
-        if not risk_predictor.is_trained:
-            print("Training risk predictor...")
-            risk_predictor.train()
-            # Save the model
-            risk_predictor.save_model("ml_models/numerical/trained_risk_predictor.pkl")
-            
-        print("ML models initialized successfully")
+    if symptom_classifier is not None and risk_predictor is not None:
+        return
+    
+    with _models_lock:
+        if symptom_classifier is not None and risk_predictor is not None:
+            return
         
-    except Exception as e:
-        print(f"Error initializing ML models: {str(e)}")
-        current_app.logger.error(f"Error initializing ML models: {str(e)}")
+        try:
+            runtime = _model_runtime()
+            
+            if symptom_classifier is None:
+                symptom_classifier = _load_or_train('symptom_classifier', runtime)
+            
+            if risk_predictor is None:
+                risk_predictor = _load_or_train('risk_predictor', runtime)
+                
+            print("ML models initialized successfully")
+            
+        except Exception as e:
+            print(f"Error initializing ML models: {str(e)}")
+            current_app.logger.error(f"Error initializing ML models: {str(e)}")
+
+def reload_updated_models():
+    """Swap in models whose artifacts changed since they were loaded.
+    
+    Retraining on a task queue worker saves new artifacts there; serving
+    processes check for them every MODEL_RELOAD_CHECK_INTERVAL seconds.
+    """
+    global symptom_classifier, risk_predictor, _reload_checked_at
+    
+    if time.monotonic() - _reload_checked_at < current_app.config['MODEL_RELOAD_CHECK_INTERVAL']:
+        return
+    _reload_checked_at = time.monotonic()
+    
+    runtime = _model_runtime()
+    for name in MODEL_ARTIFACTS:
+        if name not in _loaded_mtimes or _artifact_mtime(name, runtime) in (None, _loaded_mtimes[name]):
+            continue
+        
+        model = _load_or_train(name, runtime)
+        with _models_lock:
+            if name == 'symptom_classifier':
+                symptom_classifier = model
+            else:
+                risk_predictor = model
+        current_app.logger.info(f"Reloaded updated {name}")
+
+def retrain(source='synthetic'):
+    """Train new models and swap them in; run as the 'retrain_models' task."""
+    global symptom_classifier, risk_predictor
+    
+    if not _retrain_lock.acquire(blocking=False):
+        raise RuntimeError('Model retraining already in progress')
+    
+    try:
+        training_sets = {}
+        if source == 'snapshot':
+            training_sets = _snapshot_training_sets()
+            if training_sets is None:
+                raise ValueError('Not enough labeled examples in the training snapshots')
+        
+        # Train new instances while the current ones keep serving
+        runtime = _model_runtime()
+        new_symptom_classifier = _train_new('symptom_classifier', runtime, training_sets.get('symptom_classifier'))
+        new_risk_predictor = _train_new('risk_predictor', runtime, training_sets.get('risk_predictor'))
+        
+        with _models_lock:
+            symptom_classifier = new_symptom_classifier
+            risk_predictor = new_risk_predictor
+    finally:
+        _retrain_lock.release()
+    
+    return {
+        'source': source,
+        'retrained_at': datetime.utcnow().isoformat()
+    }
 
 @predictions_bp.route('/symptoms/analyze', methods=['POST'])
+@rate_cost('inference')
 @jwt_required()
 def analyze_symptoms():
     """Analyze symptoms using NLP model."""
@@ -53,7 +227,7 @@ def analyze_symptoms():
         global symptom_classifier
         
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -64,9 +238,11 @@ def analyze_symptoms():
         if not data.get('symptom_text'):
             return jsonify({'error': 'Symptom text is required'}), 400
         
-        # Initialize models if not already done
+        # Initialize models if not already done, or pick up retrained ones
         if symptom_classifier is None:
             initialize_models()
+        else:
+            reload_updated_models()
         
         if symptom_classifier is None or not symptom_classifier.is_trained:
             return jsonify({'error': 'Symptom classifier not available'}), 503
@@ -110,6 +286,7 @@ def analyze_symptoms():
         return jsonify({'error': 'Failed to analyze symptoms'}), 500
 
 @predictions_bp.route('/risk/assess', methods=['POST'])
+@rate_cost('inference')
 @jwt_required()
 def assess_health_risk():
     """Assess health risk using numerical model."""
@@ -117,28 +294,31 @@ def assess_health_risk():
         global risk_predictor
         
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         data = request.get_json()
         
-        # Initialize models if not already done
+        # Initialize models if not already done, or pick up retrained ones
         if risk_predictor is None:
             initialize_models()
+        else:
+            reload_updated_models()
         
         if risk_predictor is None or not risk_predictor.is_trained:
             return jsonify({'error': 'Risk predictor not available'}), 503
         
-        # Prepare features for prediction
-        features = {}
+        # Stored features: demographics, latest vitals and rolling averages from health records
+        features = get_user_features(user.id)
         
         # User demographics
-        features['age'] = user.age or data.get('age', 30)
-        features['gender'] = user.gender or data.get('gender', 'unknown')
+        features.setdefault('age', data.get('age', 30))
+        if 'gender_male' not in features:
+            features['gender'] = data.get('gender', 'unknown')
         
-        # Health metrics from request
+        # Health metrics from request override stored ones
         health_metrics = [
             'bp_systolic', 'bp_diastolic', 'heart_rate', 'temperature',
             'weight', 'height', 'bmi', 'glucose', 'cholesterol',
@@ -220,7 +400,7 @@ def get_risk_assessments():
     """Get user's risk assessments."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -267,62 +447,26 @@ def get_risk_assessment(assessment_id):
         return jsonify({'error': 'Failed to fetch risk assessment'}), 500
 
 @predictions_bp.route('/quick-check', methods=['POST'])
+@rate_cost('inference')
 @jwt_required()
 def quick_health_check():
     """Perform a quick health check based on basic symptoms and vitals."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         data = request.get_json()
         
-        # Basic health check logic
-        alerts = []
-        recommendations = []
-        overall_status = "good"
-        
-        # Check vitals
-        if data.get('bp_systolic', 0) > 140 or data.get('bp_diastolic', 0) > 90:
-            alerts.append("High blood pressure detected")
-            recommendations.append("Monitor blood pressure regularly")
-            overall_status = "warning"
-        
-        if data.get('heart_rate', 0) > 100:
-            alerts.append("Elevated heart rate detected")
-            recommendations.append("Consider rest and check if persists")
-            overall_status = "warning"
-        
-        if data.get('temperature', 0) > 99.5:
-            alerts.append("Fever detected")
-            recommendations.append("Monitor temperature and consider medical consultation")
-            overall_status = "warning"
-        
-        # Check symptoms
-        if data.get('symptom_text'):
-            concerning_symptoms = [
-                'chest pain', 'difficulty breathing', 'severe headache',
-                'confusion', 'loss of consciousness', 'severe abdominal pain'
-            ]
-            
-            symptom_text = data['symptom_text'].lower()
-            for symptom in concerning_symptoms:
-                if symptom in symptom_text:
-                    alerts.append(f"Concerning symptom detected: {symptom}")
-                    recommendations.append("Seek immediate medical attention")
-                    overall_status = "urgent"
-                    break
-        
-        # Check lifestyle factors
-        if data.get('stress_level', 0) > 8:
-            alerts.append("High stress level reported")
-            recommendations.append("Consider stress management techniques")
-        
-        if data.get('sleep_hours', 8) < 5:
-            alerts.append("Insufficient sleep detected")
-            recommendations.append("Aim for 7-8 hours of sleep per night")
+        # Threshold checks come from the shared alert rules
+        matches = get_alert_rules().evaluate('quick_check', data)
+        alerts = [match['title'] for match in matches]
+        recommendations = [
+            recommendation for match in matches for recommendation in match['recommendations']
+        ]
+        overall_status = most_severe_status(matches)
         
         # Set default recommendations if none generated
         if not recommendations:
@@ -364,6 +508,7 @@ def get_model_status():
         
         return jsonify({
             'models': status,
+            'runtime': _model_runtime(),
             'message': 'Model status retrieved successfully'
         }), 200
         
@@ -372,40 +517,61 @@ def get_model_status():
         return jsonify({'error': 'Failed to get model status'}), 500
 
 @predictions_bp.route('/models/retrain', methods=['POST'])
+@rate_cost('job')
 @jwt_required()
 def retrain_models():
-    """Retrain ML models (admin only)."""
+    """Queue model retraining (admin only)."""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         
         if not user or user.role.value != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
-        global symptom_classifier, risk_predictor
+        data = request.get_json(silent=True) or {}
+        source = data.get('source', 'synthetic')
+        if source not in ('synthetic', 'snapshot'):
+            return jsonify({'error': "source must be 'synthetic' or 'snapshot'"}), 400
         
-        # Retrain symptom classifier
-        if symptom_classifier is None:
-            symptom_classifier = SymptomClassifier()
+        job = enqueue('retrain_models', source, user_id=user.id)
         
-        symptom_classifier.train()
-        symptom_classifier.save_model("ml_models/nlp/trained_symptom_classifier.pkl")
+        return jsonify({
+            'job': job_response(job),
+            'message': 'Model retraining queued'
+        }), 202
         
-        # Retrain risk predictor
-        if risk_predictor is None:
-            risk_predictor = HealthRiskPredictor()
+    except BrokerUnavailable as e:
+        current_app.logger.warning(f"Task broker unavailable queueing model retraining: {str(e)}")
+        return broker_unavailable_response()
+    except Exception as e:
+        current_app.logger.error(f"Error queueing model retraining: {str(e)}")
+        return jsonify({'error': 'Failed to queue model retraining'}), 500
+
+@predictions_bp.route('/models/rescore', methods=['POST'])
+@rate_cost('job')
+@jwt_required()
+def rescore_users():
+    """Queue risk rescoring of every active user (admin only)."""
+    try:
+        current_user_id = get_jwt_identity()
+        user = get_current_user()
         
-        risk_predictor.train()
-        risk_predictor.save_model("ml_models/numerical/trained_risk_predictor.pkl")
+        if not user or user.role.value != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        
+        job = enqueue('rescore_population', user_id=user.id)
         
         return jsonify({
-            'message': 'Models retrained successfully',
-            'retrained_at': datetime.utcnow().isoformat()
-        }), 200
+            'job': job_response(job),
+            'message': 'Rescoring queued'
+        }), 202
         
+    except BrokerUnavailable as e:
+        current_app.logger.warning(f"Task broker unavailable queueing rescoring: {str(e)}")
+        return broker_unavailable_response()
     except Exception as e:
-        current_app.logger.error(f"Error retraining models: {str(e)}")
-        return jsonify({'error': 'Failed to retrain models'}), 500
+        current_app.logger.error(f"Error queueing rescoring: {str(e)}")
+        return jsonify({'error': 'Failed to queue rescoring'}), 500
 
 # Initialize models when the module is imported
 initialize_models()
\ No newline at end of file
@@ -42,12 +42,18 @@ def create_app():
     from api.predictions import predictions_bp
     from api.environmental import environmental_bp
     from api.dashboard import dashboard_bp
+    from api.jobs import jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(health_bp, url_prefix='/api/health')
     app.register_blueprint(predictions_bp, url_prefix='/api/predictions')
     app.register_blueprint(environmental_bp, url_prefix='/api/environmental')
     app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    
+    # Charge API requests against per-client token buckets
+    from services.rate_limit import init_rate_limiting
+    init_rate_limiting(app)
     
     # Health check endpoint
     @app.route('/health')
@@ -117,6 +123,10 @@ def create_app():
             db.session.commit()
             app.logger.info('Created default admin user')
     
+    # Start periodic background jobs
+    from services.scheduler import init_scheduler
+    init_scheduler(app)
+    
     return app
 
 # Create the Flask app instance
@@ -19,26 +19,140 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
+    # Identity and per-user view cache settings; the caches are per process, so these
+    # bound how stale another worker's copy can be after a write
+    USER_CACHE_TTL = config('USER_CACHE_TTL', default=5, cast=int)
+    USER_VIEW_CACHE_TTL = config('USER_VIEW_CACHE_TTL', default=10, cast=int)
+    
     # External API keys
     OPENWEATHERMAP_API_KEY = config('OPENWEATHERMAP_API_KEY', default='')
     AIRVISUAL_API_KEY = config('AIRVISUAL_API_KEY', default='')
+    POLLEN_API_KEY = config('POLLEN_API_KEY', default='')
+    
+    # Environmental provider settings (a provider is used only when its API key is set)
+    OPENWEATHERMAP_BASE_URL = config('OPENWEATHERMAP_BASE_URL', default='https://api.openweathermap.org')
+    AIRVISUAL_BASE_URL = config('AIRVISUAL_BASE_URL', default='https://api.airvisual.com')
+    POLLEN_BASE_URL = config('POLLEN_BASE_URL', default='https://api.ambeedata.com')
+    WEATHER_PROVIDER_TIMEOUT = config('WEATHER_PROVIDER_TIMEOUT', default=3.0, cast=float)
+    AIR_QUALITY_PROVIDER_TIMEOUT = config('AIR_QUALITY_PROVIDER_TIMEOUT', default=3.0, cast=float)
+    POLLEN_PROVIDER_TIMEOUT = config('POLLEN_PROVIDER_TIMEOUT', default=5.0, cast=float)
+    ENVIRONMENTAL_PROVIDER_MAX_RETRIES = config('ENVIRONMENTAL_PROVIDER_MAX_RETRIES', default=2, cast=int)
+    ENVIRONMENTAL_PROVIDER_BREAKER_THRESHOLD = config('ENVIRONMENTAL_PROVIDER_BREAKER_THRESHOLD', default=5, cast=int)
+    ENVIRONMENTAL_PROVIDER_BREAKER_RESET = config('ENVIRONMENTAL_PROVIDER_BREAKER_RESET', default=30.0, cast=float)
+    ENVIRONMENTAL_PROVIDER_POOL_SIZE = config('ENVIRONMENTAL_PROVIDER_POOL_SIZE', default=20, cast=int)
+    ENVIRONMENTAL_PROVIDER_DEADLINE = config('ENVIRONMENTAL_PROVIDER_DEADLINE', default=8.0, cast=float)
+    
+    # Environmental cache TTLs (seconds)
+    ENVIRONMENTAL_CURRENT_TTL = config('ENVIRONMENTAL_CURRENT_TTL', default=600, cast=int)
+    ENVIRONMENTAL_AIR_QUALITY_TTL = config('ENVIRONMENTAL_AIR_QUALITY_TTL', default=900, cast=int)
+    ENVIRONMENTAL_WEATHER_TTL = config('ENVIRONMENTAL_WEATHER_TTL', default=600, cast=int)
+    
+    # Nearest-observation lookup for coordinate requests
+    ENVIRONMENTAL_NEAREST_RADIUS_KM = config('ENVIRONMENTAL_NEAREST_RADIUS_KM', default=5.0, cast=float)
+    ENVIRONMENTAL_STATION_INDEX_REFRESH = config('ENVIRONMENTAL_STATION_INDEX_REFRESH', default=60, cast=int)
+    
+    # Background scheduler and environmental prefetch settings
+    # (enable the scheduler in exactly one process per deployment)
+    SCHEDULER_ENABLED = config('SCHEDULER_ENABLED', default=False, cast=bool)
+    ENVIRONMENTAL_PREFETCH_INTERVAL = config('ENVIRONMENTAL_PREFETCH_INTERVAL', default=540, cast=int)
+    ENVIRONMENTAL_PREFETCH_SYMPTOM_DAYS = config('ENVIRONMENTAL_PREFETCH_SYMPTOM_DAYS', default=7, cast=int)
+    ENVIRONMENTAL_PREFETCH_RATE = config('ENVIRONMENTAL_PREFETCH_RATE', default=10.0, cast=float)
+    ENVIRONMENTAL_PREFETCH_CONCURRENCY = config('ENVIRONMENTAL_PREFETCH_CONCURRENCY', default=8, cast=int)
+    
+    # Environmental data retention (raw rows, then hourly and daily aggregates)
+    ENVIRONMENTAL_RETENTION_INTERVAL = config('ENVIRONMENTAL_RETENTION_INTERVAL', default=3600, cast=int)
+    ENVIRONMENTAL_RAW_RETENTION_HOURS = config('ENVIRONMENTAL_RAW_RETENTION_HOURS', default=48, cast=int)
+    ENVIRONMENTAL_HOURLY_RETENTION_DAYS = config('ENVIRONMENTAL_HOURLY_RETENTION_DAYS', default=30, cast=int)
+    ENVIRONMENTAL_DAILY_RETENTION_DAYS = config('ENVIRONMENTAL_DAILY_RETENTION_DAYS', default=730, cast=int)
     
     # ML Model settings
     MODEL_CACHE_DIR = config('MODEL_CACHE_DIR', default='./ml_models/cache')
+    # 'sklearn' serves the trained models; 'numpy' serves their exports without importing scikit-learn
+    MODEL_RUNTIME = config('MODEL_RUNTIME', default='sklearn')
+    # Exports are stored in float32 with redundant tree nodes merged; a positive tolerance also prunes
+    MODEL_EXPORT_COMPACT = config('MODEL_EXPORT_COMPACT', default=True, cast=bool)
+    MODEL_PRUNE_TOLERANCE = config('MODEL_PRUNE_TOLERANCE', default=0.0, cast=float)
+    # How often serving processes check for models retrained elsewhere
+    MODEL_RELOAD_CHECK_INTERVAL = config('MODEL_RELOAD_CHECK_INTERVAL', default=30, cast=int)
+    
+    # Per-user feature store (refreshed in the background for rows other processes wrote; 0 disables)
+    FEATURE_STORE_REFRESH_INTERVAL = config('FEATURE_STORE_REFRESH_INTERVAL', default=60, cast=int)
+    FEATURE_STORE_BATCH_SIZE = config('FEATURE_STORE_BATCH_SIZE', default=1000, cast=int)
+    
+    # Population-wide risk rescoring (also `python rescore.py`)
+    RESCORE_INTERVAL = config('RESCORE_INTERVAL', default=86400, cast=int)
+    RESCORE_CHUNK_SIZE = config('RESCORE_CHUNK_SIZE', default=1000, cast=int)
+    RESCORE_WORKERS = config('RESCORE_WORKERS', default=4, cast=int)
+    RESCORE_CHECKPOINT_PATH = config('RESCORE_CHECKPOINT_PATH', default='./rescore_checkpoint.json')
+    
+    # Training data snapshots (Parquet, appended from the database by watermark)
+    TRAINING_DATA_DIR = config('TRAINING_DATA_DIR', default='./training_data')
+    TRAINING_SNAPSHOT_INTERVAL = config('TRAINING_SNAPSHOT_INTERVAL', default=86400, cast=int)
+    TRAINING_SNAPSHOT_BATCH_SIZE = config('TRAINING_SNAPSHOT_BATCH_SIZE', default=1000, cast=int)
+    SYMPTOM_LABEL_WINDOW_HOURS = config('SYMPTOM_LABEL_WINDOW_HOURS', default=24, cast=int)
+    TRAINING_SNAPSHOT_SETTLE_MINUTES = config('TRAINING_SNAPSHOT_SETTLE_MINUTES', default=10, cast=int)
+    TRAINING_MIN_EXAMPLES = config('TRAINING_MIN_EXAMPLES', default=50, cast=int)
     
     # Redis settings (for caching and task queue)
     REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
     
+    # Background task queue (Celery on Redis); eager mode runs tasks inline without Redis
+    TASK_QUEUE_EAGER = config('TASK_QUEUE_EAGER', default=False, cast=bool)
+    CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=REDIS_URL)
+    CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=REDIS_URL)
+    TASK_RESULT_TTL = config('TASK_RESULT_TTL', default=86400, cast=int)
+    TASK_DEDUPE_TTL = config('TASK_DEDUPE_TTL', default=21600, cast=int)
+    TASK_TRAINING_CONCURRENCY = config('TASK_TRAINING_CONCURRENCY', default=1, cast=int)
+    TASK_INFERENCE_BATCH_CONCURRENCY = config('TASK_INFERENCE_BATCH_CONCURRENCY', default=1, cast=int)
+    TASK_INGESTION_CONCURRENCY = config('TASK_INGESTION_CONCURRENCY', default=4, cast=int)
+    TASK_ANALYTICS_CONCURRENCY = config('TASK_ANALYTICS_CONCURRENCY', default=2, cast=int)
+    
     # Security settings
     BCRYPT_LOG_ROUNDS = config('BCRYPT_LOG_ROUNDS', default=12, cast=int)
     
-    # API rate limiting
+    # API rate limiting (token buckets; memory:// keeps them per process)
+    RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
     RATELIMIT_STORAGE_URL = config('RATELIMIT_STORAGE_URL', default='redis://localhost:6379/1')
+    RATELIMIT_CAPACITY = config('RATELIMIT_CAPACITY', default=60, cast=float)
+    RATELIMIT_REFILL_RATE = config('RATELIMIT_REFILL_RATE', default=1.0, cast=float)
+    RATELIMIT_READ_COST = config('RATELIMIT_READ_COST', default=1, cast=float)
+    RATELIMIT_ANALYTICS_COST = config('RATELIMIT_ANALYTICS_COST', default=5, cast=float)
+    RATELIMIT_INFERENCE_COST = config('RATELIMIT_INFERENCE_COST', default=10, cast=float)
+    RATELIMIT_JOB_COST = config('RATELIMIT_JOB_COST', default=20, cast=float)
     
     # Federated learning settings
     FL_AGGREGATION_ROUNDS = config('FL_AGGREGATION_ROUNDS', default=10, cast=int)
     FL_MIN_CLIENTS = config('FL_MIN_CLIENTS', default=5, cast=int)
     
+    # Outbreak detection settings
+    OUTBREAK_EWMA_ALPHA = config('OUTBREAK_EWMA_ALPHA', default=0.05, cast=float)
+    OUTBREAK_CUSUM_K = config('OUTBREAK_CUSUM_K', default=1.0, cast=float)
+    OUTBREAK_CUSUM_H = config('OUTBREAK_CUSUM_H', default=5.0, cast=float)
+    OUTBREAK_P_THRESHOLD = config('OUTBREAK_P_THRESHOLD', default=1e-4, cast=float)
+    OUTBREAK_MIN_COUNT = config('OUTBREAK_MIN_COUNT', default=5, cast=int)
+    OUTBREAK_WARMUP_DAYS = config('OUTBREAK_WARMUP_DAYS', default=14, cast=int)
+    OUTBREAK_REPLAY_DAYS = config('OUTBREAK_REPLAY_DAYS', default=90, cast=int)
+    OUTBREAK_DETECTION_INTERVAL = config('OUTBREAK_DETECTION_INTERVAL', default=60, cast=int)
+    
+    # Wearable vitals ingestion settings
+    VITALS_MAX_BATCH_SAMPLES = config('VITALS_MAX_BATCH_SAMPLES', default=200000, cast=int)
+    VITALS_MAX_AGE_DAYS = config('VITALS_MAX_AGE_DAYS', default=30, cast=int)
+    VITALS_MAX_CLOCK_SKEW_SECONDS = config('VITALS_MAX_CLOCK_SKEW_SECONDS', default=300, cast=int)
+    VITALS_INSERT_CHUNK_SIZE = config('VITALS_INSERT_CHUNK_SIZE', default=10000, cast=int)
+    
+    # Environment-symptom correlation analytics
+    ENVIRONMENTAL_CORRELATION_MAX_LAG = config('ENVIRONMENTAL_CORRELATION_MAX_LAG', default=7, cast=int)
+    ENVIRONMENTAL_ROLLING_WINDOW = config('ENVIRONMENTAL_ROLLING_WINDOW', default=7, cast=int)
+    ENVIRONMENTAL_ANALYTICS_WORKERS = config('ENVIRONMENTAL_ANALYTICS_WORKERS', default=4, cast=int)
+    ENVIRONMENTAL_ANALYTICS_CACHE_TTL = config('ENVIRONMENTAL_ANALYTICS_CACHE_TTL', default=900, cast=int)
+    
+    # Alert rules (re-read when the file changes)
+    ALERT_RULES_PATH = config('ALERT_RULES_PATH', default=os.path.join(os.path.dirname(__file__), 'alert_rules.json'))
+    ALERT_RULES_CHECK_INTERVAL = config('ALERT_RULES_CHECK_INTERVAL', default=30, cast=int)
+    
+    # Health trend settings
+    TRENDS_MAX_POINTS = config('TRENDS_MAX_POINTS', default=5000, cast=int)
+    
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = config('UPLOAD_FOLDER', default='./uploads')
@@ -51,6 +165,10 @@ class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
     TESTING = False
+    # Run tasks inline unless Redis and workers are set up (python -m services.task_queue worker <queue>)
+    TASK_QUEUE_EAGER = config('TASK_QUEUE_EAGER', default=True, cast=bool)
+    # Per-process buckets unless Redis is set up
+    RATELIMIT_STORAGE_URL = config('RATELIMIT_STORAGE_URL', default='memory://')
 
 class ProductionConfig(Config):
     """Production configuration."""
@@ -62,6 +180,10 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SCHEDULER_ENABLED = False
+    TASK_QUEUE_EAGER = True
+    RATELIMIT_STORAGE_URL = 'memory://'
+    FEATURE_STORE_REFRESH_INTERVAL = 0
 
 config_by_name = {
     'development': DevelopmentConfig,
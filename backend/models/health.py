@@ -22,6 +22,9 @@ class HealthRecord(db.Model):
     """Health record model for storing user health data."""
     
     __tablename__ = 'health_records'
+    __table_args__ = (
+        db.Index('ix_health_records_user_id_recorded_at', 'user_id', 'recorded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -150,6 +153,9 @@ class RiskAssessment(db.Model):
     """Risk assessment model for storing AI-generated risk predictions."""
     
     __tablename__ = 'risk_assessments'
+    __table_args__ = (
+        db.Index('ix_risk_assessments_user_id_assessed_at', 'user_id', 'assessed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -175,7 +181,7 @@ class RiskAssessment(db.Model):
     
     # Timestamps
     assessed_at = db.Column(db.DateTime, default=datetime.utcnow)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Training snapshot watermark
     
     def set_risk_factors(self, factors):
         """Set risk factors as JSON string."""
@@ -215,6 +221,9 @@ class EnvironmentalData(db.Model):
     """Environmental data model for storing external environmental factors."""
     
     __tablename__ = 'environmental_data'
+    __table_args__ = (
+        db.Index('ix_environmental_data_location_key_recorded_at', 'location_key', 'recorded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -223,6 +232,10 @@ class EnvironmentalData(db.Model):
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
     
+    # Spatial lookup keys (maintained by services.geo)
+    location_key = db.Column(db.String(100))  # Normalized lowercase location
+    geohash = db.Column(db.String(12), index=True)
+    
     # Air quality
     air_quality_index = db.Column(db.Integer)
     pm25 = db.Column(db.Float)
@@ -240,7 +253,7 @@ class EnvironmentalData(db.Model):
     outbreak_alerts = db.Column(db.Text)  # JSON string
     
     # Timestamps
-    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_outbreak_alerts(self, alerts):
@@ -270,4 +283,242 @@ class EnvironmentalData(db.Model):
             'outbreak_alerts': self.get_outbreak_alerts(),
             'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class EnvironmentalAggregate(db.Model):
+    """Hourly or daily rollup of environmental observations for a location."""
+    
+    __tablename__ = 'environmental_aggregates'
+    __table_args__ = (
+        db.UniqueConstraint('resolution', 'location_key', 'bucket_start', name='uq_environmental_aggregates_bucket'),
+        db.Index('ix_environmental_aggregates_resolution_bucket_start', 'resolution', 'bucket_start'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    
+    # Location
+    location_key = db.Column(db.String(100), nullable=False)
+    location = db.Column(db.String(100), nullable=False)
+    
+    sample_count = db.Column(db.Integer, nullable=False)
+    
+    # Averages over the bucket
+    air_quality_index = db.Column(db.Float)
+    pm25 = db.Column(db.Float)
+    pm10 = db.Column(db.Float)
+    co2 = db.Column(db.Float)
+    pollen_count = db.Column(db.Float)
+    temperature = db.Column(db.Float)
+    humidity = db.Column(db.Float)
+    pressure = db.Column(db.Float)
+    wind_speed = db.Column(db.Float)
+    
+    # Extremes over the bucket
+    air_quality_index_max = db.Column(db.Integer)
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    
+    def to_dict(self):
+        """Convert environmental aggregate to dictionary."""
+        return {
+            'resolution': self.resolution,
+            'bucket_start': self.bucket_start.isoformat() if self.bucket_start else None,
+            'location': self.location,
+            'sample_count': self.sample_count,
+            'air_quality_index': self.air_quality_index,
+            'air_quality_index_max': self.air_quality_index_max,
+            'pm25': self.pm25,
+            'pm10': self.pm10,
+            'co2': self.co2,
+            'pollen_count': self.pollen_count,
+            'temperature': self.temperature,
+            'temperature_min': self.temperature_min,
+            'temperature_max': self.temperature_max,
+            'humidity': self.humidity,
+            'pressure': self.pressure,
+            'wind_speed': self.wind_speed
+        }
+
+class UserHealthSummary(db.Model):
+    """Per-user health summary maintained transactionally on every write."""
+    
+    __tablename__ = 'user_health_summary'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    
+    # Running counts
+    health_record_count = db.Column(db.Integer, default=0, nullable=False)
+    symptom_report_count = db.Column(db.Integer, default=0, nullable=False)
+    risk_assessment_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Vitals from the most recent health record
+    latest_vitals = db.Column(db.Text)  # JSON string
+    
+    # Welford running statistics: {metric: [count, mean, m2]}
+    vital_stats = db.Column(db.Text)  # JSON string
+    
+    # Per-day Welford statistics for rolling windows: {metric: {date: [count, mean, m2]}}
+    daily_stats = db.Column(db.Text)  # JSON string
+    
+    # Last activity timestamps
+    last_health_record_at = db.Column(db.DateTime)
+    last_symptom_report_at = db.Column(db.DateTime)
+    last_risk_assessment_at = db.Column(db.DateTime)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    def set_latest_vitals(self, vitals):
+        """Set latest vitals as JSON string."""
+        self.latest_vitals = json.dumps(vitals)
+    
+    def get_latest_vitals(self):
+        """Get latest vitals as Python object."""
+        return json.loads(self.latest_vitals) if self.latest_vitals else {}
+    
+    def set_vital_stats(self, stats):
+        """Set running vital statistics as JSON string."""
+        self.vital_stats = json.dumps(stats)
+    
+    def get_vital_stats(self):
+        """Get running vital statistics as Python object."""
+        return json.loads(self.vital_stats) if self.vital_stats else {}
+    
+    def set_daily_stats(self, stats):
+        """Set per-day vital statistics as JSON string."""
+        self.daily_stats = json.dumps(stats)
+    
+    def get_daily_stats(self):
+        """Get per-day vital statistics as Python object."""
+        return json.loads(self.daily_stats) if self.daily_stats else {}
+    
+    def to_dict(self):
+        """Convert health summary to dictionary."""
+        return {
+            'user_id': self.user_id,
+            'health_record_count': self.health_record_count,
+            'symptom_report_count': self.symptom_report_count,
+            'risk_assessment_count': self.risk_assessment_count,
+            'latest_vitals': self.get_latest_vitals(),
+            'last_health_record_at': self.last_health_record_at.isoformat() if self.last_health_record_at else None,
+            'last_symptom_report_at': self.last_symptom_report_at.isoformat() if self.last_symptom_report_at else None,
+            'last_risk_assessment_at': self.last_risk_assessment_at.isoformat() if self.last_risk_assessment_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class UserAlert(db.Model):
+    """Active health alert for a user, maintained by the alert rules on every write."""
+    
+    __tablename__ = 'user_alerts'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'rule_id', name='uq_user_alerts_user_rule'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Rule that raised the alert and the kind of write it evaluates
+    rule_id = db.Column(db.String(100), nullable=False)
+    scope = db.Column(db.String(50), nullable=False)
+    
+    # Alert content rendered from the rule
+    type = db.Column(db.String(50), nullable=False)
+    severity = db.Column(db.String(20), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text)
+    recommendations = db.Column(db.Text)  # JSON string
+    
+    # Timestamp of the record or assessment the alert was raised for
+    source_at = db.Column(db.DateTime)
+    rules_version = db.Column(db.String(64))
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def set_recommendations(self, recommendations):
+        """Set recommendations as JSON string."""
+        self.recommendations = json.dumps(recommendations)
+    
+    def get_recommendations(self):
+        """Get recommendations as Python object."""
+        return json.loads(self.recommendations) if self.recommendations else []
+    
+    def to_dict(self):
+        """Convert alert to dictionary."""
+        return {
+            'id': self.id,
+            'rule_id': self.rule_id,
+            'type': self.type,
+            'severity': self.severity,
+            'title': self.title,
+            'message': self.message,
+            'recommendations': self.get_recommendations(),
+            'source_at': self.source_at.isoformat() if self.source_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class AlertRulesState(db.Model):
+    """Rules version every stored alert was last re-evaluated with (a single row)."""
+    
+    __tablename__ = 'alert_rules_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    evaluated_version = db.Column(db.String(64), nullable=False)
+    evaluated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class OutbreakAlert(db.Model):
+    """Outbreak alert raised by streaming detection over symptom reports."""
+    
+    __tablename__ = 'outbreak_alerts'
+    __table_args__ = (
+        db.UniqueConstraint('location_key', 'category', 'alert_date', name='uq_outbreak_alerts_series_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False)
+    location_key = db.Column(db.String(100), nullable=False)  # Normalized lowercase location
+    category = db.Column(db.String(50), nullable=False)
+    alert_date = db.Column(db.Date, nullable=False)  # Day the unusual activity was observed
+    severity = db.Column(db.String(20), nullable=False)
+    details = db.Column(db.Text)  # JSON string of the full alert
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def set_details(self, details):
+        """Set alert details as JSON string."""
+        self.details = json.dumps(details)
+    
+    def get_details(self):
+        """Get alert details as Python object."""
+        return json.loads(self.details) if self.details else {}
+
+# Wearable metrics, indexed by the code stored in VitalSample.metric
+VITAL_METRICS = [
+    'heart_rate', 'spo2', 'respiratory_rate', 'skin_temperature',
+    'steps', 'blood_pressure_systolic', 'blood_pressure_diastolic'
+]
+
+class VitalSample(db.Model):
+    """High-frequency vital sample uploaded by a wearable device.
+    
+    On PostgreSQL the table is range-partitioned by month on recorded_at.
+    """
+    
+    __tablename__ = 'vital_samples'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (recorded_at)'}
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    metric = db.Column(db.SmallInteger, primary_key=True)  # index into VITAL_METRICS
+    recorded_at = db.Column(db.DateTime, primary_key=True)
+    value = db.Column(db.Float, nullable=False)
+    
+    def to_dict(self):
+        """Convert vital sample to dictionary."""
+        return {
+            'user_id': self.user_id,
+            'metric': VITAL_METRICS[self.metric],
+            'recorded_at': self.recorded_at.isoformat() if self.recorded_at else None,
+            'value': self.value
+        }
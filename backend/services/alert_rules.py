@@ -0,0 +1,260 @@
+"""Declarative alert rules.
+
+Rules live in a JSON file (ALERT_RULES_PATH). Each rule has a scope (the
+kind of data it is evaluated against), conditions on named fields, and the
+alert it renders. The file is compiled once into predicate closures grouped
+by scope; it is re-read only when its modification time changes, checked
+at most every ALERT_RULES_CHECK_INTERVAL seconds.
+
+Example rule:
+
+    {
+        "id": "elevated_heart_rate",
+        "scope": "health_record",
+        "type": "health_metric",
+        "severity": "medium",
+        "title": "Elevated Heart Rate",
+        "message": "Your latest heart rate ({heart_rate} bpm) is higher than normal.",
+        "when": [{"field": "heart_rate", "op": ">", "value": 100}],
+        "recommendations": ["Monitor heart rate throughout the day"]
+    }
+
+Conditions on missing fields never match. `match` is "all" (default) or
+"any"; `contains_any` matches the first listed keyword found in a text
+field and exposes it to the templates as `{match}`.
+"""
+
+import hashlib
+import json
+import logging
+import operator
+import os
+import string
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('health_record', 'risk_assessment', 'quick_check', 'weather')
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda actual, expected: actual in expected,
+}
+
+# Quick check status, least to most severe
+STATUS_LEVELS = ('good', 'warning', 'urgent')
+
+_formatter = string.Formatter()
+
+
+class AlertRuleError(ValueError):
+    """Raised for an invalid alert rule definition."""
+
+
+class _Context(dict):
+    """Template values; fields a rule doesn't have render empty."""
+
+    def __missing__(self, key):
+        return ''
+
+
+def compile_condition(spec: Dict) -> Callable[[Dict], Optional[object]]:
+    """Compile a condition into a check returning None, or the matched value."""
+    try:
+        field, op, expected = spec['field'], spec['op'], spec['value']
+    except (KeyError, TypeError):
+        raise AlertRuleError(f'Condition needs field, op and value: {spec}')
+
+    if op == 'contains_any':
+        keywords = [keyword.lower() for keyword in expected]
+
+        def check(facts):
+            text = facts.get(field)
+            if not text:
+                return None
+            text = str(text).lower()
+            return next((keyword for keyword in keywords if keyword in text), None)
+
+        return check
+
+    if op not in OPERATORS:
+        raise AlertRuleError(f'Unknown operator {op!r} for field {field!r}')
+    compare = OPERATORS[op]
+
+    def check(facts):
+        actual = facts.get(field)
+        if actual is None:
+            return None
+        try:
+            return True if compare(actual, expected) else None
+        except TypeError:
+            return None
+
+    return check
+
+
+class AlertRule:
+    """A compiled alert rule."""
+
+    __slots__ = ('id', 'scope', 'type', 'severity', 'status', 'title', 'message',
+                 'recommendations', 'recommendations_field', '_checks', '_match_all')
+
+    def __init__(self, spec: Dict):
+        """Compile a rule definition."""
+        try:
+            self.id = spec['id']
+            self.scope = spec['scope']
+            self.title = spec['title']
+            conditions = spec['when']
+        except KeyError as e:
+            raise AlertRuleError(f'Alert rule {spec.get("id", "?")} is missing {e}')
+
+        if self.scope not in SCOPES:
+            raise AlertRuleError(f'Alert rule {self.id} has unknown scope {self.scope!r}')
+        if spec.get('match', 'all') not in ('all', 'any'):
+            raise AlertRuleError(f'Alert rule {self.id} has unknown match {spec["match"]!r}')
+        if spec.get('status') is not None and spec['status'] not in STATUS_LEVELS:
+            raise AlertRuleError(f'Alert rule {self.id} has unknown status {spec["status"]!r}')
+        if not conditions:
+            raise AlertRuleError(f'Alert rule {self.id} has no conditions')
+
+        self.type = spec.get('type', self.scope)
+        self.severity = spec.get('severity', 'info')
+        self.status = spec.get('status')
+        self.message = spec.get('message', '')
+        self.recommendations = list(spec.get('recommendations', []))
+        self.recommendations_field = spec.get('recommendations_field')
+        self._checks = [compile_condition(condition) for condition in conditions]
+        self._match_all = spec.get('match', 'all') == 'all'
+
+        # Fail on malformed templates now rather than on first match
+        for template in (self.title, self.message):
+            try:
+                list(_formatter.parse(template))
+            except ValueError as e:
+                raise AlertRuleError(f'Alert rule {self.id} has an invalid template: {e}')
+
+    def match(self, facts: Dict) -> Optional[object]:
+        """Get the matched value if the rule's conditions hold, else None."""
+        matched = None
+        for check in self._checks:
+            result = check(facts)
+            if result is None:
+                if self._match_all:
+                    return None
+                continue
+            if not self._match_all:
+                return result
+            if matched is None or matched is True:
+                matched = result
+        return matched
+
+    def render(self, facts: Dict, matched) -> Dict:
+        """Render the alert for facts that matched."""
+        context = _Context(facts)
+        if matched is not True:
+            context['match'] = matched
+
+        recommendations = self.recommendations
+        if self.recommendations_field:
+            recommendations = facts.get(self.recommendations_field) or recommendations
+
+        return {
+            'rule_id': self.id,
+            'type': self.type,
+            'severity': self.severity,
+            'status': self.status,
+            'title': self.title.format_map(context),
+            'message': self.message.format_map(context),
+            'recommendations': list(recommendations)
+        }
+
+
+class AlertRules:
+    """A compiled rule set, grouped by scope in file order."""
+
+    def __init__(self, specs: List[Dict], version: str = ''):
+        """Compile rule definitions."""
+        self.version = version
+        self.rules = [AlertRule(spec) for spec in specs]
+        self.order = {}
+        self.by_scope = {scope: [] for scope in SCOPES}
+
+        for position, rule in enumerate(self.rules):
+            if rule.id in self.order:
+                raise AlertRuleError(f'Duplicate alert rule id {rule.id}')
+            self.order[rule.id] = position
+            self.by_scope[rule.scope].append(rule)
+
+    def evaluate(self, scope: str, facts: Dict) -> List[Dict]:
+        """Render every rule in `scope` whose conditions hold for `facts`."""
+        alerts = []
+        for rule in self.by_scope[scope]:
+            matched = rule.match(facts)
+            if matched is not None:
+                alerts.append(rule.render(facts, matched))
+        return alerts
+
+
+def most_severe_status(alerts: List[Dict], default: str = 'good') -> str:
+    """Get the most severe status set by matched alerts."""
+    levels = [STATUS_LEVELS.index(alert['status']) for alert in alerts if alert.get('status')]
+    return STATUS_LEVELS[max(levels)] if levels else default
+
+
+def load_alert_rules(path: str) -> AlertRules:
+    """Read and compile a rules file; the version is a hash of its contents."""
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    try:
+        specs = json.loads(content)['rules']
+    except (ValueError, KeyError, TypeError) as e:
+        raise AlertRuleError(f'Invalid alert rules file {path}: {e}')
+
+    return AlertRules(specs, version=hashlib.sha256(content).hexdigest()[:16])
+
+
+_rules = None
+_rules_mtime = None
+_checked_at = 0.0
+_rules_lock = threading.Lock()
+
+
+def get_alert_rules(force_check: bool = False) -> AlertRules:
+    """Get the compiled rules, recompiling them if the rules file changed.
+
+    A file that fails to compile is logged and the previous rules are kept.
+    """
+    global _rules, _rules_mtime, _checked_at
+
+    if _rules is not None and not force_check:
+        from flask import current_app
+
+        if time.monotonic() - _checked_at < current_app.config['ALERT_RULES_CHECK_INTERVAL']:
+            return _rules
+
+    with _rules_lock:
+        from flask import current_app
+
+        path = current_app.config['ALERT_RULES_PATH']
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if _rules is None or mtime != _rules_mtime:
+                _rules = load_alert_rules(path)
+                _rules_mtime = mtime
+                logger.info(f"Loaded {len(_rules.rules)} alert rules (version {_rules.version})")
+        except (OSError, AlertRuleError) as e:
+            if _rules is None:
+                raise
+            logger.error(f"Keeping previous alert rules: {e}")
+        _checked_at = time.monotonic()
+
+    return _rules
@@ -0,0 +1,141 @@
+"""In-process caching helpers shared by the API services."""
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+_PENDING_INVALIDATIONS = 'pending_cache_invalidations'
+
+
+class TTLCache:
+    """Thread-safe key/value cache with per-entry expiry."""
+
+    def __init__(self, ttl: float = 60, max_size: int = 10000):
+        """Initialize the cache."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a cached value, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Cache a value for `ttl` seconds (the cache default if omitted)."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_size:
+                self._evict()
+            self._data[key] = (expires_at, value)
+
+    def invalidate(self, key):
+        """Drop a cached value."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every cached value."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evict(self):
+        """Drop expired entries, or the oldest entry if none have expired."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            del self._data[key]
+
+        if not expired:
+            del self._data[next(iter(self._data))]
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is in flight wait for it and share its result or exception.
+    """
+
+    def __init__(self):
+        """Initialize the in-flight call registry."""
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run `fn()` for `key`, or wait for the call already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def invalidate_on_commit(model, key_fn, callback):
+    """Call `callback(key_fn(row))` once a transaction writing `model` rows commits.
+
+    Invalidating after commit rather than at flush time means a concurrent
+    reader cannot repopulate a cache with data from before the write.
+    """
+    def record(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault(_PENDING_INVALIDATIONS, set()).add((callback, key_fn(target)))
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, record)
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_pending_invalidations(session):
+    """Run the invalidations recorded during the committed transaction."""
+    for callback, key in session.info.pop(_PENDING_INVALIDATIONS, ()):
+        callback(key)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_pending_invalidations(session, previous_transaction):
+    """Nothing was written, so there is nothing to invalidate."""
+    session.info.pop(_PENDING_INVALIDATIONS, None)
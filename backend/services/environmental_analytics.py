@@ -0,0 +1,382 @@
+"""Correlation analytics between environmental factors and symptom reports.
+
+Daily air quality, pollen and temperature (from raw `EnvironmentalData`
+rows and the hourly/daily `EnvironmentalAggregate` rollups) and daily
+respiratory and allergy symptom counts are aligned per location on a
+common daily index. Pearson correlations for every lag up to the
+configured maximum (environment leading symptoms) and rolling statistics
+are computed as array operations over all factors, symptom groups and lags
+at once. Locations are analyzed in parallel in a process pool and each
+result is cached per (location, window).
+"""
+
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import select, union
+
+from ml_models.nlp.symptom_categories import match_categories
+from models.health import EnvironmentalAggregate, EnvironmentalData, SymptomReport, db
+from services.cache import SingleFlight, TTLCache
+from services.environmental_cache import location_key
+
+FACTORS = ('air_quality_index', 'pollen_count', 'temperature')
+SYMPTOM_GROUPS = ('respiratory', 'allergy')
+
+# Symptom text marking a report as allergy-related
+ALLERGY_KEYWORDS = ['allerg', 'sneez', 'runny nose', 'itchy', 'watery eyes',
+                    'congestion', 'hay fever', 'hives', 'rash']
+
+# Days with a factor above its threshold count as exposure days
+FACTOR_THRESHOLDS = {
+    'air_quality_index': 100,  # Unhealthy for sensitive groups
+    'pollen_count': 50,
+    'temperature': 30,
+}
+
+# Fewer paired observations than this give no coefficient
+MIN_OBSERVATIONS = 5
+
+_cache = TTLCache(ttl=900)
+_in_flight = SingleFlight()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def load_environmental_frame(start: datetime, end: datetime, keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load daily mean factors per location, weighting rollups by their sample counts.
+
+    Returns a frame with columns location_key, location, day and FACTORS.
+    """
+    raw = select(
+        EnvironmentalData.location_key, EnvironmentalData.location, EnvironmentalData.recorded_at,
+        *[getattr(EnvironmentalData, factor) for factor in FACTORS]
+    ).where(
+        EnvironmentalData.recorded_at >= start,
+        EnvironmentalData.recorded_at < end,
+        EnvironmentalData.location_key.isnot(None)
+    )
+    rollups = select(
+        EnvironmentalAggregate.location_key, EnvironmentalAggregate.location, EnvironmentalAggregate.bucket_start,
+        EnvironmentalAggregate.sample_count, *[getattr(EnvironmentalAggregate, factor) for factor in FACTORS]
+    ).where(
+        EnvironmentalAggregate.bucket_start >= start,
+        EnvironmentalAggregate.bucket_start < end
+    )
+    if keys is not None:
+        raw = raw.where(EnvironmentalData.location_key.in_(keys))
+        rollups = rollups.where(EnvironmentalAggregate.location_key.in_(keys))
+
+    columns = ['location_key', 'location', 'recorded_at']
+    raw_frame = pd.DataFrame(db.session.execute(raw).all(), columns=columns + list(FACTORS))
+    raw_frame['weight'] = 1.0
+    rollup_frame = pd.DataFrame(db.session.execute(rollups).all(), columns=columns + ['weight'] + list(FACTORS))
+
+    parts = [part for part in (raw_frame, rollup_frame) if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=['location_key', 'location', 'day', *FACTORS])
+
+    frame = pd.concat(parts, ignore_index=True)
+    frame['day'] = pd.to_datetime(frame['recorded_at']).dt.floor('D')
+    weight = frame['weight'].astype(float)
+    values = frame[list(FACTORS)].astype(float)
+
+    # Weighted mean over the rows that have each factor
+    weighted = values.mul(weight, axis=0).fillna(0.0)
+    weights = values.notna().mul(weight, axis=0)
+    keys_frame = frame[['location_key', 'day']]
+    sums = pd.concat([keys_frame, weighted], axis=1).groupby(['location_key', 'day']).sum()
+    totals = pd.concat([keys_frame, weights], axis=1).groupby(['location_key', 'day']).sum()
+    daily = (sums / totals.where(totals > 0)).reset_index()
+
+    names = frame.groupby('location_key')['location'].first()
+    daily['location'] = daily['location_key'].map(names)
+    return daily
+
+
+def load_symptom_frame(start: datetime, end: datetime, keys: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load daily respiratory and allergy report counts per location.
+
+    Returns a frame with columns location_key, day and SYMPTOM_GROUPS.
+    """
+    rows = db.session.execute(
+        select(SymptomReport.location, SymptomReport.reported_at,
+               SymptomReport.symptom_text, SymptomReport.processed_symptoms)
+        .where(SymptomReport.reported_at >= start,
+               SymptomReport.reported_at < end,
+               SymptomReport.location.isnot(None))
+    ).all()
+    frame = pd.DataFrame(rows, columns=['location', 'reported_at', 'symptom_text', 'processed_symptoms'])
+    if frame.empty:
+        return pd.DataFrame(columns=['location_key', 'day', *SYMPTOM_GROUPS])
+
+    frame['location_key'] = frame['location'].map(location_key)
+    if keys is not None:
+        frame = frame[frame['location_key'].isin(keys)]
+
+    text = frame['symptom_text'].fillna('').str.lower()
+    frame['respiratory'] = [
+        'respiratory' in report_categories(symptom_text, processed)
+        for symptom_text, processed in zip(text, frame['processed_symptoms'])
+    ]
+    frame['allergy'] = text.str.contains('|'.join(ALLERGY_KEYWORDS), regex=True)
+    frame['day'] = pd.to_datetime(frame['reported_at']).dt.floor('D')
+
+    return frame.groupby(['location_key', 'day'])[list(SYMPTOM_GROUPS)].sum().astype(float).reset_index()
+
+
+def report_categories(symptom_text: str, processed_symptoms: Optional[str]) -> List[str]:
+    """Get the symptom categories of a report from its stored classification or its text."""
+    processed = json.loads(processed_symptoms) if processed_symptoms else None
+    if isinstance(processed, dict) and processed:
+        return list(processed.keys())
+
+    return match_categories(symptom_text)
+
+
+def align_location(environment: pd.DataFrame, symptoms: pd.DataFrame,
+                   start: datetime, end: datetime) -> pd.DataFrame:
+    """Align one location's factors and symptom counts on a daily index.
+
+    Days without reports count zero symptoms; days without observations
+    leave their factors missing.
+    """
+    days = pd.date_range(pd.Timestamp(start).floor('D'), pd.Timestamp(end).floor('D'),
+                         freq='D', inclusive='left')
+    frame = pd.DataFrame(index=days)
+    frame = frame.join(environment.set_index('day')[list(FACTORS)])
+    frame = frame.join(symptoms.set_index('day')[list(SYMPTOM_GROUPS)])
+    frame[list(SYMPTOM_GROUPS)] = frame[list(SYMPTOM_GROUPS)].fillna(0.0)
+    return frame.astype(float)
+
+
+def lagged_correlations(factors: np.ndarray, counts: np.ndarray, max_lag: int):
+    """Correlate every factor with every symptom series shifted by 0..max_lag days.
+
+    `factors` is (days, F) and `counts` is (days, G); missing values are
+    NaN and are dropped pairwise. Returns coefficients and observation
+    counts, both (F, G, max_lag + 1).
+    """
+    n_days = counts.shape[0]
+
+    # lagged[t, g, lag] = counts[t + lag, g]
+    index = np.arange(n_days)[:, None] + np.arange(max_lag + 1)[None, :]
+    lagged = np.where(
+        (index < n_days)[:, None, :],
+        counts[np.minimum(index, n_days - 1)].transpose(0, 2, 1),
+        np.nan
+    )
+
+    x = factors[:, :, None, None]  # (days, F, 1, 1)
+    y = lagged[:, None, :, :]  # (days, 1, G, L)
+    mask = ~np.isnan(x) & ~np.isnan(y)
+    observations = mask.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.where(mask, x, 0.0).sum(axis=0) / observations
+        y_mean = np.where(mask, y, 0.0).sum(axis=0) / observations
+        dx = np.where(mask, x - x_mean, 0.0)
+        dy = np.where(mask, y - y_mean, 0.0)
+        covariance = (dx * dy).sum(axis=0)
+        variance = (dx * dx).sum(axis=0) * (dy * dy).sum(axis=0)
+        coefficients = covariance / np.sqrt(variance)
+
+    coefficients[(observations < MIN_OBSERVATIONS) | ~(variance > 0)] = np.nan
+    return coefficients, observations
+
+
+def _value(number, digits: int = 3):
+    """JSON-safe rounded float (None for NaN)."""
+    return None if number is None or np.isnan(number) else round(float(number), digits)
+
+
+def analyze_location(frame: pd.DataFrame, max_lag: int, window: int) -> Dict:
+    """Lagged correlations, rolling statistics and exposure counts for one aligned location.
+
+    Runs in the analytics process pool, so it only touches its arguments.
+    """
+    coefficients, observations = lagged_correlations(
+        frame[list(FACTORS)].to_numpy(), frame[list(SYMPTOM_GROUPS)].to_numpy(), max_lag
+    )
+
+    correlations = {}
+    for f, factor in enumerate(FACTORS):
+        correlations[factor] = {}
+        for g, group in enumerate(SYMPTOM_GROUPS):
+            curve = coefficients[f, g]
+            best_lag = None if np.isnan(curve).all() else int(np.nanargmax(np.abs(curve)))
+            correlations[factor][group] = {
+                'coefficients': [_value(value) for value in curve],
+                'observations': observations[f, g].tolist(),
+                'best_lag': best_lag,
+                'coefficient': None if best_lag is None else _value(curve[best_lag])
+            }
+
+    rolling = frame.rolling(window, min_periods=1)
+    means = rolling.mean()
+    rolling_correlation = {
+        factor: {
+            group: _value(frame[factor].rolling(window, min_periods=MIN_OBSERVATIONS).corr(frame[group]).iloc[-1])
+            for group in SYMPTOM_GROUPS
+        }
+        for factor in FACTORS
+    }
+
+    exposure = {}
+    for factor, threshold in FACTOR_THRESHOLDS.items():
+        exposed = (frame[factor] > threshold).to_numpy()
+        exposure[factor] = {
+            'threshold': threshold,
+            'days_above_threshold': int(exposed.sum()),
+            'symptoms': {group: int(frame[group].to_numpy()[exposed].sum()) for group in SYMPTOM_GROUPS}
+        }
+
+    return {
+        'days': len(frame),
+        'observed_days': int(frame[list(FACTORS)].notna().any(axis=1).sum()),
+        'symptom_totals': {group: int(frame[group].sum()) for group in SYMPTOM_GROUPS},
+        'correlations': correlations,
+        'rolling': {
+            'window_days': window,
+            'latest_mean': {column: _value(means[column].iloc[-1]) for column in frame.columns},
+            'peak_mean': {column: _value(means[column].max()) for column in frame.columns},
+            'correlation': rolling_correlation
+        },
+        'exposure': exposure
+    }
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned rather than forked: a fork copies locks held by this process's other threads
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def analyze_frames(frames: Dict[str, pd.DataFrame], max_lag: int, window: int, workers: int) -> Dict[str, Dict]:
+    """Analyze aligned locations, in the process pool when there is more than one."""
+    if workers <= 1 or len(frames) <= 1:
+        return {key: analyze_location(frame, max_lag, window) for key, frame in frames.items()}
+
+    pool = _get_pool(workers)
+    futures = {key: pool.submit(analyze_location, frame, max_lag, window) for key, frame in frames.items()}
+    return {key: future.result() for key, future in futures.items()}
+
+
+def known_locations(start: datetime, end: datetime) -> List[str]:
+    """Location keys with environmental data in a date range."""
+    raw = select(EnvironmentalData.location_key).where(
+        EnvironmentalData.recorded_at >= start,
+        EnvironmentalData.recorded_at < end,
+        EnvironmentalData.location_key.isnot(None)
+    )
+    rollups = select(EnvironmentalAggregate.location_key).where(
+        EnvironmentalAggregate.bucket_start >= start,
+        EnvironmentalAggregate.bucket_start < end
+    )
+    return sorted(db.session.execute(union(raw, rollups)).scalars())
+
+
+def analyze_locations(keys: List[str], days: int) -> Dict[str, Dict]:
+    """Analyze the last `days` full days for each location key, using cached results."""
+    app_config = current_app.config
+    end = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    start = end - timedelta(days=days)
+
+    results = {key: _cache.get((key, days)) for key in keys}
+    missing = [key for key, result in results.items() if result is None]
+    if missing:
+        environment = load_environmental_frame(start, end, missing)
+        symptoms = load_symptom_frame(start, end, missing)
+        names = environment.groupby('location_key')['location'].first()
+        environment_by_key = dict(tuple(environment.groupby('location_key')))
+        symptoms_by_key = dict(tuple(symptoms.groupby('location_key')))
+        empty_environment = environment.iloc[0:0]
+        empty_symptoms = symptoms.iloc[0:0]
+
+        frames = {
+            key: align_location(environment_by_key.get(key, empty_environment),
+                                symptoms_by_key.get(key, empty_symptoms), start, end)
+            for key in missing
+        }
+        analyzed = analyze_frames(
+            frames,
+            max_lag=app_config['ENVIRONMENTAL_CORRELATION_MAX_LAG'],
+            window=app_config['ENVIRONMENTAL_ROLLING_WINDOW'],
+            workers=app_config['ENVIRONMENTAL_ANALYTICS_WORKERS']
+        )
+
+        for key, result in analyzed.items():
+            result['location'] = names.get(key, key)
+            _cache.set((key, days), result, ttl=app_config['ENVIRONMENTAL_ANALYTICS_CACHE_TTL'])
+            results[key] = result
+
+    return results
+
+
+def summarize(results: Dict[str, Dict]) -> Dict:
+    """Pool per-location results, weighting correlation curves by their observations."""
+    summary = {'correlations': {}, 'exposure': {}, 'symptom_totals': {}}
+
+    for group in SYMPTOM_GROUPS:
+        summary['symptom_totals'][group] = sum(result['symptom_totals'][group] for result in results.values())
+
+    for factor in FACTORS:
+        summary['correlations'][factor] = {}
+        for group in SYMPTOM_GROUPS:
+            curves = [result['correlations'][factor][group] for result in results.values()]
+            if not curves:
+                summary['correlations'][factor][group] = {'best_lag': None, 'coefficient': None}
+                continue
+
+            coefficients = np.array([[np.nan if value is None else value for value in curve['coefficients']]
+                                     for curve in curves], dtype=float).reshape(len(curves), -1)
+            weights = np.array([curve['observations'] for curve in curves], dtype=float).reshape(len(curves), -1)
+            weights[np.isnan(coefficients)] = 0.0
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                pooled = np.nansum(coefficients * weights, axis=0) / weights.sum(axis=0)
+
+            best_lag = None if pooled.size == 0 or np.isnan(pooled).all() else int(np.nanargmax(np.abs(pooled)))
+            summary['correlations'][factor][group] = {
+                'best_lag': best_lag,
+                'coefficient': None if best_lag is None else _value(pooled[best_lag])
+            }
+
+        summary['exposure'][factor] = {
+            'days_above_threshold': sum(result['exposure'][factor]['days_above_threshold']
+                                        for result in results.values()),
+            'symptoms': {
+                group: sum(result['exposure'][factor]['symptoms'][group] for result in results.values())
+                for group in SYMPTOM_GROUPS
+            }
+        }
+
+    return summary
+
+
+def analyze_environmental_impact(location: Optional[str] = None, days: int = 30) -> Dict:
+    """Environment-symptom analytics for one location, or every location with data."""
+    if location:
+        keys = [location_key(location)]
+    else:
+        end = datetime.utcnow()
+        keys = _in_flight.do(('locations', days), lambda: known_locations(end - timedelta(days=days), end))
+
+    results = _in_flight.do((tuple(keys), days), lambda: analyze_locations(keys, days))
+    return {
+        'window_days': days,
+        'summary': summarize(results),
+        'locations': results
+    }
@@ -0,0 +1,59 @@
+"""Location-keyed cache for environmental data.
+
+Each source (current conditions, air quality, weather) is cached per
+normalized location for its own TTL. Concurrent misses for the same source
+and location share a single in-flight fetch, and the loader runs only when
+the cached value actually needs refreshing, so repeated reads no longer
+turn into upstream calls or database writes.
+"""
+
+from flask import current_app
+
+from services.cache import SingleFlight, TTLCache
+
+ENVIRONMENTAL_SOURCES = ('current', 'air_quality', 'weather')
+
+_cache = TTLCache(ttl=600)
+_in_flight = SingleFlight()
+
+
+def location_key(location=None, latitude=None, longitude=None):
+    """Normalize a location name or coordinates into a cache key.
+
+    Coordinates are rounded to two decimals (about 1 km), which is finer
+    than the resolution of the upstream environmental sources.
+    """
+    if location:
+        return ' '.join(location.lower().split())
+    return f'{round(latitude, 2)},{round(longitude, 2)}'
+
+
+def get_environmental(source, location, latitude, longitude, loader):
+    """Get cached data for a source and location, calling `loader()` to refresh it."""
+    if source not in ENVIRONMENTAL_SOURCES:
+        raise ValueError(f'Unknown environmental source: {source}')
+
+    key = (source, location_key(location, latitude, longitude))
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    ttl = current_app.config[f'ENVIRONMENTAL_{source.upper()}_TTL']
+
+    def refresh():
+        # A fetch that finished between the cache check and joining the flight already stored it
+        value = _cache.get(key)
+        if value is None:
+            value = loader()
+            # Fallback data from a failed fetch is served but not cached
+            if 'error' not in value:
+                _cache.set(key, value, ttl=ttl)
+        return value
+
+    return _in_flight.do(key, refresh)
+
+
+def prime_environmental(source, location, latitude, longitude, value):
+    """Store freshly fetched data for a source and location."""
+    key = (source, location_key(location, latitude, longitude))
+    _cache.set(key, value, ttl=current_app.config[f'ENVIRONMENTAL_{source.upper()}_TTL'])
@@ -0,0 +1,135 @@
+"""Background prefetch of environmental data for known locations.
+
+Collects the distinct locations of active users and of recent symptom
+reports, fetches a snapshot for each concurrently under a request-rate
+limit, bulk-inserts the snapshots into `EnvironmentalData` and primes the
+location cache, so request handlers almost always find warm data.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from models.health import EnvironmentalData, SymptomReport, db
+from models.user import User
+from services.environmental_cache import location_key, prime_environmental
+from services.environmental_data import environmental_record, load_environmental_data
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Space calls evenly at no more than `rate` per second across threads."""
+
+    def __init__(self, rate: float):
+        """Initialize the limiter."""
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller's slot."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def collect_prefetch_locations(symptom_days: int = 7) -> List[str]:
+    """Get distinct active-user and recent symptom-report locations, one per cache key."""
+    since = datetime.utcnow() - timedelta(days=symptom_days)
+
+    user_locations = db.session.query(User.location).filter(
+        User.location.isnot(None),
+        User.is_active.is_(True)
+    ).distinct()
+    report_locations = db.session.query(SymptomReport.location).filter(
+        SymptomReport.location.isnot(None),
+        SymptomReport.reported_at >= since
+    ).distinct()
+
+    locations = {}
+    for (location,) in user_locations.union(report_locations):
+        if location and location.strip():
+            locations.setdefault(location_key(location), location.strip())
+
+    return list(locations.values())
+
+
+def stored_coordinates(locations: List[str]) -> Dict[str, Tuple[float, float]]:
+    """Get the coordinates of each location's latest environmental row that has them."""
+    keys = {location_key(location): location for location in locations}
+    latest = select(func.max(EnvironmentalData.id)).where(
+        EnvironmentalData.location_key.in_(list(keys)),
+        EnvironmentalData.latitude.isnot(None),
+        EnvironmentalData.longitude.isnot(None)
+    ).group_by(EnvironmentalData.location_key)
+    rows = db.session.execute(
+        select(EnvironmentalData.location_key, EnvironmentalData.latitude, EnvironmentalData.longitude)
+        .where(EnvironmentalData.id.in_(latest))
+    )
+    return {keys[key]: (latitude, longitude) for key, latitude, longitude in rows}
+
+
+def fetch_snapshots(locations: List[str], rate: float, concurrency: int,
+                    coordinates: Optional[Dict[str, Tuple[float, float]]] = None) -> Dict[str, Dict]:
+    """Fetch a snapshot per location concurrently, at most `rate` fetches per second.
+
+    Locations with known `coordinates` are fetched by them too, which
+    coordinate-only providers (air quality) need.
+    """
+    app = current_app._get_current_object()
+    limiter = RateLimiter(rate)
+    coordinates = coordinates or {}
+
+    def fetch(location):
+        limiter.acquire()
+        with app.app_context():
+            try:
+                return location, load_environmental_data(location, *coordinates.get(location, (None, None)))
+            except Exception as e:
+                logger.warning(f"Prefetch failed for {location}: {e}")
+                return location, None
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='env-prefetch') as pool:
+        return {location: data for location, data in pool.map(fetch, locations) if data}
+
+
+def prefetch_environmental_data() -> int:
+    """Refresh environmental data for every known location; returns the number stored."""
+    app_config = current_app.config
+    locations = collect_prefetch_locations(app_config['ENVIRONMENTAL_PREFETCH_SYMPTOM_DAYS'])
+    if not locations:
+        return 0
+
+    started = time.monotonic()
+    coordinates = stored_coordinates(locations)
+    snapshots = fetch_snapshots(
+        locations,
+        rate=app_config['ENVIRONMENTAL_PREFETCH_RATE'],
+        concurrency=app_config['ENVIRONMENTAL_PREFETCH_CONCURRENCY'],
+        coordinates=coordinates
+    )
+
+    if snapshots:
+        db.session.execute(insert(EnvironmentalData), [
+            environmental_record(env_data, *coordinates.get(location, (None, None)))
+            for location, env_data in snapshots.items()
+        ])
+        db.session.commit()
+
+        for location, env_data in snapshots.items():
+            prime_environmental('current', location, None, None, env_data)
+
+    logger.info(f"Prefetched environmental data for {len(snapshots)}/{len(locations)} locations "
+                f"in {time.monotonic() - started:.2f}s")
+    return len(snapshots)
@@ -0,0 +1,313 @@
+"""Concurrent client for the upstream weather, air quality and pollen APIs.
+
+Each provider keeps a pooled keep-alive `requests.Session`, its own
+timeout and a circuit breaker. `ProviderClient.fetch_all` fans the
+providers out on a shared thread pool, so a refresh costs roughly the
+slowest provider rather than the sum of all of them. Failed calls are
+retried with exponential backoff and full jitter; a provider that keeps
+failing is skipped until its breaker's reset timeout passes. A provider is
+enabled only when its API key is configured.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class ProviderError(Exception):
+    """Raised when a provider call fails."""
+
+
+class ProviderUnavailable(ProviderError):
+    """Raised when a provider's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop calling a failing dependency until a reset timeout passes.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls. Once `reset_timeout` seconds have passed it lets a single
+    trial call through (half-open): success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """Initialize the breaker in the closed state."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Get 'closed', 'open' or 'half_open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """Check whether a call may go through, reserving the half-open trial."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        """Close the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def create_session(pool_size: int = 20) -> requests.Session:
+    """Create a session with a keep-alive connection pool and no transport retries."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class Provider:
+    """One upstream API: request building, response parsing and failure handling."""
+
+    def __init__(self, name: str, base_url: str, api_key: str,
+                 build_request: Callable, parse: Callable,
+                 timeout: float = 3.0, max_retries: int = 2, backoff: float = 0.2,
+                 breaker: Optional[CircuitBreaker] = None, session: Optional[requests.Session] = None):
+        """Initialize the provider."""
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.build_request = build_request
+        self.parse = parse
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = session or create_session()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def fetch(self, location=None, latitude=None, longitude=None) -> Dict:
+        """Fetch and parse data for a location, retrying transient failures."""
+        # Invalid arguments are the caller's problem, not the provider's; build before reserving a trial
+        path, params, headers = self.build_request(self.api_key, location, latitude, longitude)
+        url = f'{self.base_url}{path}'
+
+        if not self.breaker.allow():
+            raise ProviderUnavailable(f'{self.name} circuit breaker is open')
+
+        succeeded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                except requests.RequestException as e:
+                    error = e
+                else:
+                    if response.status_code < 400:
+                        try:
+                            data = self.parse(response.json())
+                        except Exception as e:
+                            error = e
+                        else:
+                            succeeded = True
+                            self.breaker.record_success()
+                            return data
+                    elif response.status_code in RETRYABLE_STATUS:
+                        error = ProviderError(f'{self.name} returned {response.status_code}')
+                    else:
+                        # Client errors won't succeed on retry
+                        raise ProviderError(f'{self.name} returned {response.status_code}')
+
+                if attempt < self.max_retries:
+                    # Exponential backoff with full jitter
+                    time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+            raise ProviderError(f'{self.name} failed after {self.max_retries + 1} attempts: {error}')
+        finally:
+            # Also releases the half-open trial if anything unexpected escapes
+            if not succeeded:
+                self.breaker.record_failure()
+
+
+class ProviderClient:
+    """Fan out to every enabled provider concurrently."""
+
+    def __init__(self, providers: Dict[str, Provider], max_workers: int = 20):
+        """Initialize the client with providers keyed by source name."""
+        self.providers = providers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='env-provider')
+
+    @property
+    def enabled(self) -> bool:
+        return any(provider.enabled for provider in self.providers.values())
+
+    def fetch_all(self, location=None, latitude=None, longitude=None, sources=None,
+                  deadline: Optional[float] = None) -> Dict[str, Optional[Dict]]:
+        """Fetch every requested source concurrently.
+
+        Returns {source: data}, with None for sources that are disabled,
+        failed, or did not finish within `deadline` seconds.
+        """
+        sources = sources or list(self.providers)
+        futures = {
+            source: self._executor.submit(self.providers[source].fetch, location, latitude, longitude)
+            for source in sources
+            if self.providers[source].enabled
+        }
+        wait(futures.values(), timeout=deadline)
+
+        results = {source: None for source in sources}
+        for source, future in futures.items():
+            if not future.done():
+                logger.warning(f"{source} provider did not respond in time")
+                continue
+            try:
+                results[source] = future.result()
+            except ProviderError as e:
+                logger.warning(f"{source} provider failed: {e}")
+            except Exception:
+                logger.exception(f"{source} provider raised an unexpected error")
+
+        return results
+
+
+# Request builders and response parsers for each provider
+
+def _location_params(location, latitude, longitude):
+    if latitude is not None and longitude is not None:
+        return {'lat': latitude, 'lon': longitude}
+    return {'q': location}
+
+
+def build_weather_request(api_key, location, latitude, longitude):
+    """OpenWeatherMap current weather."""
+    params = _location_params(location, latitude, longitude)
+    params.update({'appid': api_key, 'units': 'metric'})
+    return '/data/2.5/weather', params, {}
+
+
+_COMPASS = ['N', 'NE', 'E', 'SE', 'S', 'SW', 'W', 'NW']
+
+
+def parse_weather(payload):
+    main = payload.get('main', {})
+    wind = payload.get('wind', {})
+    conditions = payload.get('weather') or [{}]
+    degrees = wind.get('deg')
+
+    return {
+        'temperature': main.get('temp'),
+        'feels_like': main.get('feels_like'),
+        'humidity': main.get('humidity'),
+        'pressure': main.get('pressure'),
+        'wind_speed': wind.get('speed'),
+        'wind_direction': _COMPASS[round(degrees / 45) % 8] if degrees is not None else None,
+        'visibility': payload['visibility'] / 1000 if payload.get('visibility') is not None else None,
+        'condition': (conditions[0].get('description') or '').title() or None
+    }
+
+
+def build_air_quality_request(api_key, location, latitude, longitude):
+    """IQAir (AirVisual) nearest-city air quality."""
+    if latitude is None or longitude is None:
+        # Without coordinates nearest_city would geolocate the server's IP
+        raise ProviderError('airvisual requires coordinates')
+    return '/v2/nearest_city', {'lat': latitude, 'lon': longitude, 'key': api_key}, {}
+
+
+def parse_air_quality(payload):
+    pollution = payload.get('data', {}).get('current', {}).get('pollution', {})
+    return {
+        'aqi': pollution.get('aqius'),
+        'main_pollutant': pollution.get('mainus')
+    }
+
+
+def build_pollen_request(api_key, location, latitude, longitude):
+    """Ambee latest pollen counts."""
+    headers = {'x-api-key': api_key}
+    if latitude is not None and longitude is not None:
+        return '/latest/pollen/by-lat-lng', {'lat': latitude, 'lng': longitude}, headers
+    return '/latest/pollen/by-place', {'place': location}, headers
+
+
+def parse_pollen(payload):
+    readings = payload.get('data') or [{}]
+    counts = readings[0].get('Count', {})
+    return {
+        'pollen_count': sum(counts.values()) if counts else None,
+        'pollen_types': counts
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_provider_client() -> ProviderClient:
+    """Get the process-wide provider client, built from the app configuration."""
+    global _client
+
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            from flask import current_app
+
+            app_config = current_app.config
+            session = create_session(app_config['ENVIRONMENTAL_PROVIDER_POOL_SIZE'])
+
+            def provider(name, url_key, api_key, timeout_key, build_request, parse):
+                return Provider(
+                    name, app_config[url_key], app_config[api_key], build_request, parse,
+                    timeout=app_config[timeout_key],
+                    max_retries=app_config['ENVIRONMENTAL_PROVIDER_MAX_RETRIES'],
+                    breaker=CircuitBreaker(
+                        app_config['ENVIRONMENTAL_PROVIDER_BREAKER_THRESHOLD'],
+                        app_config['ENVIRONMENTAL_PROVIDER_BREAKER_RESET']
+                    ),
+                    session=session
+                )
+
+            _client = ProviderClient({
+                'weather': provider('openweathermap', 'OPENWEATHERMAP_BASE_URL', 'OPENWEATHERMAP_API_KEY',
+                                    'WEATHER_PROVIDER_TIMEOUT', build_weather_request, parse_weather),
+                'air_quality': provider('airvisual', 'AIRVISUAL_BASE_URL', 'AIRVISUAL_API_KEY',
+                                        'AIR_QUALITY_PROVIDER_TIMEOUT', build_air_quality_request, parse_air_quality),
+                'pollen': provider('ambee', 'POLLEN_BASE_URL', 'POLLEN_API_KEY',
+                                   'POLLEN_PROVIDER_TIMEOUT', build_pollen_request, parse_pollen),
+            }, max_workers=app_config['ENVIRONMENTAL_PROVIDER_POOL_SIZE'])
+
+    return _client
@@ -0,0 +1,239 @@
+"""Retention and downsampling for environmental observations.
+
+Raw `EnvironmentalData` rows are kept for ENVIRONMENTAL_RAW_RETENTION_HOURS,
+then rolled up into hourly `EnvironmentalAggregate` rows and deleted.
+Hourly aggregates are kept for ENVIRONMENTAL_HOURLY_RETENTION_DAYS, then
+rolled up into daily aggregates, which are kept for
+ENVIRONMENTAL_DAILY_RETENTION_DAYS. Cutoffs are aligned to bucket
+boundaries so every bucket is rolled up in one pass; rows that arrive late
+for an existing bucket are merged into it by sample-weighted averaging.
+Raw rows carrying outbreak alerts are never rolled up or deleted.
+Buckets are grouped in SQL on PostgreSQL and SQLite, and in Python on
+other databases.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict
+
+from flask import current_app
+from sqlalchemy import case, func
+
+from models.health import EnvironmentalAggregate, EnvironmentalData, db
+from services.environmental_data import RECORD_FIELDS
+from services.geo import backfill_environmental_keys
+
+logger = logging.getLogger(__name__)
+
+EXTREME_FIELDS = {
+    'air_quality_index_max': ('air_quality_index', func.max),
+    'temperature_min': ('temperature', func.min),
+    'temperature_max': ('temperature', func.max),
+}
+
+_MERGE_EXTREMES = {
+    'air_quality_index_max': max,
+    'temperature_min': min,
+    'temperature_max': max,
+}
+
+
+def floor_time(moment: datetime, resolution: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day."""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if resolution == 'day' else moment
+
+
+def bucket_expression(column, resolution: str):
+    """SQL expression truncating a timestamp column to its hour or day; None if the dialect has none."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return func.date_trunc(resolution, column)
+    if dialect == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:00:00' if resolution == 'hour' else '%Y-%m-%d 00:00:00', column)
+    return None
+
+
+def group_in_python(rows, resolution: str):
+    """Group rollup rows by bucket and location without SQL date truncation.
+
+    Takes (timestamp, location_key, location, sample weight, {field: value},
+    {extreme field: value}) tuples and returns rollup groups with the same
+    keys the SQL queries produce. Averages are weighted and skip missing
+    values, as the SQL aggregates do.
+    """
+    groups = {}
+    for moment, key, location, weight, values, extremes in rows:
+        bucket = (floor_time(moment, resolution), key)
+        group = groups.get(bucket)
+        if group is None:
+            group = groups[bucket] = {
+                'bucket_start': bucket[0], 'location_key': key, 'location': location, 'sample_count': 0,
+                'sums': {field: [0.0, 0] for field in RECORD_FIELDS},
+                'extremes': {name: None for name in EXTREME_FIELDS},
+            }
+
+        if location is not None and (group['location'] is None or location < group['location']):
+            group['location'] = location
+        group['sample_count'] += weight
+        for field, value in values.items():
+            if value is not None:
+                group['sums'][field][0] += value * weight
+                group['sums'][field][1] += weight
+        for name, value in extremes.items():
+            if value is not None:
+                current = group['extremes'][name]
+                group['extremes'][name] = value if current is None else _MERGE_EXTREMES[name](current, value)
+
+    results = []
+    for group in groups.values():
+        sums, extremes = group.pop('sums'), group.pop('extremes')
+        group.update({field: total / weight if weight else None for field, (total, weight) in sums.items()})
+        group.update(extremes)
+        results.append(group)
+    return results
+
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def merge_aggregates(resolution: str, groups) -> int:
+    """Insert grouped rollup rows, merging into buckets that already exist."""
+    groups = [group if isinstance(group, dict) else dict(group._mapping) for group in groups]
+    if not groups:
+        return 0
+
+    for group in groups:
+        group['bucket_start'] = _as_datetime(group['bucket_start'])
+
+    existing = {
+        (aggregate.location_key, aggregate.bucket_start): aggregate
+        for aggregate in EnvironmentalAggregate.query.filter(
+            EnvironmentalAggregate.resolution == resolution,
+            EnvironmentalAggregate.bucket_start >= min(group['bucket_start'] for group in groups),
+            EnvironmentalAggregate.bucket_start <= max(group['bucket_start'] for group in groups)
+        )
+    }
+
+    for group in groups:
+        aggregate = existing.get((group['location_key'], group['bucket_start']))
+        if aggregate is None:
+            db.session.add(EnvironmentalAggregate(resolution=resolution, **group))
+            continue
+
+        # Late rows for a bucket that was already rolled up
+        total = aggregate.sample_count + group['sample_count']
+        for field in RECORD_FIELDS:
+            old, new = getattr(aggregate, field), group[field]
+            if old is None or new is None:
+                setattr(aggregate, field, new if old is None else old)
+            else:
+                setattr(aggregate, field, (old * aggregate.sample_count + new * group['sample_count']) / total)
+        for field, combine in _MERGE_EXTREMES.items():
+            values = [value for value in (getattr(aggregate, field), group[field]) if value is not None]
+            setattr(aggregate, field, combine(values) if values else None)
+        aggregate.sample_count = total
+
+    return len(groups)
+
+
+def rollup_raw_data(cutoff: datetime) -> Dict[str, int]:
+    """Roll raw observations before `cutoff` into hourly aggregates and delete them."""
+    eligible = [
+        EnvironmentalData.recorded_at < cutoff,
+        EnvironmentalData.location_key.isnot(None),
+        EnvironmentalData.outbreak_alerts.is_(None)
+    ]
+    bucket = bucket_expression(EnvironmentalData.recorded_at, 'hour')
+
+    if bucket is None:
+        rows = db.session.query(
+            EnvironmentalData.recorded_at, EnvironmentalData.location_key, EnvironmentalData.location,
+            *[getattr(EnvironmentalData, field) for field in RECORD_FIELDS]
+        ).filter(*eligible).yield_per(1000)
+        groups = group_in_python((
+            (row.recorded_at, row.location_key, row.location, 1,
+             {field: getattr(row, field) for field in RECORD_FIELDS},
+             {name: getattr(row, field) for name, (field, _) in EXTREME_FIELDS.items()})
+            for row in rows
+        ), 'hour')
+    else:
+        groups = db.session.query(
+            bucket.label('bucket_start'),
+            EnvironmentalData.location_key,
+            func.min(EnvironmentalData.location).label('location'),
+            func.count(EnvironmentalData.id).label('sample_count'),
+            *[func.avg(getattr(EnvironmentalData, field)).label(field) for field in RECORD_FIELDS],
+            *[aggregate(getattr(EnvironmentalData, field)).label(name)
+              for name, (field, aggregate) in EXTREME_FIELDS.items()]
+        ).filter(*eligible).group_by(bucket, EnvironmentalData.location_key).all()
+
+    buckets = merge_aggregates('hour', groups)
+    deleted = EnvironmentalData.query.filter(*eligible).delete(synchronize_session=False)
+    return {'hourly_buckets': buckets, 'raw_rows_deleted': deleted}
+
+
+def rollup_hourly_aggregates(cutoff: datetime) -> Dict[str, int]:
+    """Roll hourly aggregates before `cutoff` into daily aggregates and delete them."""
+    eligible = [
+        EnvironmentalAggregate.resolution == 'hour',
+        EnvironmentalAggregate.bucket_start < cutoff
+    ]
+    bucket = bucket_expression(EnvironmentalAggregate.bucket_start, 'day')
+    count = EnvironmentalAggregate.sample_count
+
+    def weighted_average(field):
+        column = getattr(EnvironmentalAggregate, field)
+        weight = func.sum(case((column.isnot(None), count)))
+        return (func.sum(column * count) / weight).label(field)
+
+    if bucket is None:
+        rows = EnvironmentalAggregate.query.filter(*eligible).yield_per(1000)
+        groups = group_in_python((
+            (row.bucket_start, row.location_key, row.location, row.sample_count,
+             {field: getattr(row, field) for field in RECORD_FIELDS},
+             {name: getattr(row, name) for name in EXTREME_FIELDS})
+            for row in rows
+        ), 'day')
+    else:
+        groups = db.session.query(
+            bucket.label('bucket_start'),
+            EnvironmentalAggregate.location_key,
+            func.min(EnvironmentalAggregate.location).label('location'),
+            func.sum(count).label('sample_count'),
+            *[weighted_average(field) for field in RECORD_FIELDS],
+            *[aggregate(getattr(EnvironmentalAggregate, name)).label(name)
+              for name, (_, aggregate) in EXTREME_FIELDS.items()]
+        ).filter(*eligible).group_by(bucket, EnvironmentalAggregate.location_key).all()
+
+    buckets = merge_aggregates('day', groups)
+    deleted = EnvironmentalAggregate.query.filter(*eligible).delete(synchronize_session=False)
+    return {'daily_buckets': buckets, 'hourly_rows_deleted': deleted}
+
+
+def apply_environmental_retention(now: datetime = None) -> Dict[str, int]:
+    """Run the full rollup and retention pass."""
+    app_config = current_app.config
+    now = now or datetime.utcnow()
+
+    backfill_environmental_keys()
+
+    raw_cutoff = floor_time(now - timedelta(hours=app_config['ENVIRONMENTAL_RAW_RETENTION_HOURS']), 'hour')
+    hourly_cutoff = floor_time(now - timedelta(days=app_config['ENVIRONMENTAL_HOURLY_RETENTION_DAYS']), 'day')
+    daily_cutoff = floor_time(now - timedelta(days=app_config['ENVIRONMENTAL_DAILY_RETENTION_DAYS']), 'day')
+
+    try:
+        stats = rollup_raw_data(raw_cutoff)
+        stats.update(rollup_hourly_aggregates(hourly_cutoff))
+        stats['daily_rows_deleted'] = EnvironmentalAggregate.query.filter(
+            EnvironmentalAggregate.resolution == 'day',
+            EnvironmentalAggregate.bucket_start < daily_cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Environmental retention: {stats}")
+    return stats
@@ -0,0 +1,331 @@
+"""Per-user model features served from an in-memory, array-backed table.
+
+Every user has one row of raw (unstandardized) features in a preallocated
+float64 matrix: demographics, their latest vitals with derived BMI, and
+rolling means of each vital, all taken from `UserHealthSummary` (which the
+summary `before_flush` hook keeps current on write). Missing values are
+NaN and are imputed by the model.
+
+Scoring one user is a row lookup; scoring everyone is one slice of the
+matrix in the model's feature order. When a commit in this process touches
+a user or their summary, only their row is reloaded, on the next read.
+
+A background thread in each process builds the full table when the process
+first uses it, and rebuilds it when the date changes (rolling windows are
+relative to the current date). Until the first build is done, rows are
+loaded one user at a time as requests need them. Every
+FEATURE_STORE_REFRESH_INTERVAL seconds the thread also picks up rows other
+processes updated. Requests never wait for a build or a refresh.
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, union
+
+from models.health import UserHealthSummary, db
+from models.user import User
+from services.cache import invalidate_on_commit
+from services.health_summary import SUMMARY_METRICS, welford_merge
+
+logger = logging.getLogger(__name__)
+
+# Summary vital -> model feature name
+LATEST_FEATURES = {
+    'blood_pressure_systolic': 'bp_systolic',
+    'blood_pressure_diastolic': 'bp_diastolic',
+    'heart_rate': 'heart_rate',
+    'temperature': 'temperature',
+    'weight': 'weight',
+    'height': 'height',
+    'sleep_hours': 'sleep_hours',
+    'stress_level': 'stress_level',
+    'exercise_minutes': 'exercise_minutes',
+}
+
+FEATURE_WINDOWS = (7, 30)
+
+FEATURE_COLUMNS = (
+    ['age', 'gender_male', 'gender_female']
+    + list(LATEST_FEATURES.values())
+    + ['bmi', 'physical_activity']
+    + [f'{metric}_mean_{window}d' for window in FEATURE_WINDOWS for metric in SUMMARY_METRICS]
+)
+FEATURE_INDEX = {column: i for i, column in enumerate(FEATURE_COLUMNS)}
+
+
+class FeatureTable:
+    """Thread-safe user -> feature row table over a growable 2-D array."""
+
+    def __init__(self, columns: Sequence[str], capacity: int = 1024):
+        """Allocate an empty table with the given columns."""
+        self.columns = tuple(columns)
+        self.index = {column: i for i, column in enumerate(self.columns)}
+        self._values = np.full((capacity, len(self.columns)), np.nan)
+        self._user_ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, user_id):
+        return user_id in self._rows
+
+    def put(self, user_id: int, vector: np.ndarray):
+        """Insert or replace a user's row."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            if row is None:
+                row = len(self._rows)
+                if row == len(self._values):
+                    self._grow()
+                self._rows[user_id] = row
+                self._user_ids[row] = user_id
+            self._values[row] = vector
+
+    def get(self, user_id: int) -> Optional[np.ndarray]:
+        """Get a copy of a user's row, or None if they have none."""
+        with self._lock:
+            row = self._rows.get(user_id)
+            return None if row is None else self._values[row].copy()
+
+    def features(self, user_id: int) -> Optional[Dict[str, float]]:
+        """Get a user's known (non-missing) features by name."""
+        vector = self.get(user_id)
+        if vector is None:
+            return None
+        return {column: float(value) for column, value in zip(self.columns, vector) if not np.isnan(value)}
+
+    def matrix(self, columns: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (user_ids, rows) for every user, optionally in another column order.
+
+        Columns the table doesn't have come back as NaN (imputed by the model).
+        """
+        with self._lock:
+            n = len(self._rows)
+            user_ids = self._user_ids[:n].copy()
+            values = self._values[:n]
+            if columns is None:
+                return user_ids, values.copy()
+
+            positions = np.array([self.index.get(column, -1) for column in columns], dtype=np.intp)
+            X = values[:, np.maximum(positions, 0)]
+        X[:, positions < 0] = np.nan
+        return user_ids, X
+
+    def take(self, user_ids: Sequence[int], columns: Sequence[str]) -> np.ndarray:
+        """Get the rows of `user_ids` in `columns` order; unknown users and columns are NaN."""
+        positions = np.array([self.index.get(column, -1) for column in columns], dtype=np.intp)
+        with self._lock:
+            rows = np.array([self._rows.get(user_id, -1) for user_id in user_ids], dtype=np.intp)
+            X = self._values[np.maximum(rows, 0)][:, np.maximum(positions, 0)]
+        X[rows < 0] = np.nan
+        X[:, positions < 0] = np.nan
+        return X
+
+    def _grow(self):
+        capacity = 2 * len(self._values)
+        values = np.full((capacity, len(self.columns)), np.nan)
+        values[:len(self._values)] = self._values
+        user_ids = np.zeros(capacity, dtype=np.int64)
+        user_ids[:len(self._user_ids)] = self._user_ids
+        self._values, self._user_ids = values, user_ids
+
+
+def feature_vector(age, gender, latest: Dict, daily_stats: Dict, today=None) -> np.ndarray:
+    """Build a user's raw feature row from demographics and their summary's latest and daily vitals."""
+    index = FEATURE_INDEX
+    vector = np.full(len(FEATURE_COLUMNS), np.nan)
+
+    if age is not None:
+        vector[index['age']] = age
+    if gender:
+        vector[index['gender_male']] = float(gender.lower() == 'male')
+        vector[index['gender_female']] = float(gender.lower() == 'female')
+
+    for metric, feature in LATEST_FEATURES.items():
+        if latest.get(metric) is not None:
+            vector[index[feature]] = latest[metric]
+
+    weight, height = latest.get('weight'), latest.get('height')
+    if weight and height:
+        vector[index['bmi']] = weight / (height / 100) ** 2
+
+    today = today or datetime.utcnow().date()
+    for window in FEATURE_WINDOWS:
+        cutoff = (today - timedelta(days=window - 1)).isoformat()
+        for metric, days in daily_stats.items():
+            merged = None
+            for day, stats in days.items():
+                if day >= cutoff:
+                    merged = welford_merge(merged, stats)
+            if merged:
+                vector[index[f'{metric}_mean_{window}d']] = merged[1]
+                if metric == 'exercise_minutes' and window == 7:
+                    # Hours of exercise recorded over the last week
+                    vector[index['physical_activity']] = merged[0] * merged[1] / 60
+
+    return vector
+
+
+_table = None
+_loaded_on = None
+_synced_at = None
+_stale = set()
+_sync_lock = threading.Lock()
+_refresher = None
+_init_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def _mark_stale(user_id):
+    _stale.add(int(user_id))
+
+
+invalidate_on_commit(User, lambda user: user.id, _mark_stale)
+invalidate_on_commit(UserHealthSummary, lambda summary: summary.user_id, _mark_stale)
+
+
+def _load_rows(table: FeatureTable, user_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild the rows of `user_ids`, or of every user."""
+    # Plain columns, so a full load doesn't fill the session with summary objects
+    query = select(User.id, User.age, User.gender, UserHealthSummary.latest_vitals, UserHealthSummary.daily_stats)\
+        .outerjoin(UserHealthSummary, UserHealthSummary.user_id == User.id)
+    if user_ids is not None:
+        query = query.where(User.id.in_(list(user_ids)))
+
+    today = datetime.utcnow().date()
+    count = 0
+    rows = db.session.execute(query.execution_options(yield_per=current_app.config['FEATURE_STORE_BATCH_SIZE']))
+    for user_id, age, gender, latest_vitals, daily_stats in rows:
+        vector = feature_vector(age, gender, json.loads(latest_vitals) if latest_vitals else {},
+                                json.loads(daily_stats) if daily_stats else {}, today)
+        table.put(user_id, vector)
+        count += 1
+    return count
+
+
+def _changed_since(since: datetime) -> List[int]:
+    """Users whose profile or summary was updated at or after `since` (one indexed scan each)."""
+    return list(db.session.scalars(union(
+        select(User.id).where(User.updated_at >= since),
+        select(UserHealthSummary.user_id).where(UserHealthSummary.updated_at >= since)
+    )))
+
+
+def _reload_stale(table: FeatureTable):
+    stale = set(_stale)
+    _stale.difference_update(stale)
+    if stale:
+        _load_rows(table, user_ids=stale)
+
+
+def _build_table(started: datetime) -> FeatureTable:
+    """Load every user into a new table and make it current."""
+    global _table, _loaded_on, _synced_at
+
+    # Loaded without holding the sync lock, so stale reloads on the request path don't wait for it
+    table = FeatureTable(FEATURE_COLUMNS)
+    count = _load_rows(table)
+
+    with _sync_lock:
+        # Rows written while it loaded, including ones already reloaded into the current table
+        since = started - timedelta(seconds=current_app.config['FEATURE_STORE_REFRESH_INTERVAL'])
+        _stale.clear()
+        _load_rows(table, user_ids=_changed_since(since))
+        _table, _loaded_on, _synced_at = table, started.date(), started
+
+    logger.info(f"Feature store loaded {count} users")
+    return table
+
+
+def refresh_feature_store(full: bool = False) -> FeatureTable:
+    """Bring the table up to date; rebuild it if it was never built, on a new day or if `full`."""
+    global _synced_at
+
+    started = datetime.utcnow()
+    if full or _loaded_on != started.date():
+        with _build_lock:
+            return _build_table(started)
+
+    with _sync_lock:
+        # Overlap the previous sync so commits that were in flight then aren't missed
+        since = _synced_at - timedelta(seconds=current_app.config['FEATURE_STORE_REFRESH_INTERVAL'])
+        changed = _changed_since(since)
+        if changed:
+            _load_rows(_table, user_ids=changed)
+        _reload_stale(_table)
+
+        _synced_at = started
+        return _table
+
+
+def _start_refresher():
+    """Build this process's table in the background, then refresh it every FEATURE_STORE_REFRESH_INTERVAL seconds."""
+    global _refresher
+
+    interval = current_app.config['FEATURE_STORE_REFRESH_INTERVAL']
+    if _refresher is not None or interval <= 0:
+        return
+
+    from services.scheduler import Scheduler
+
+    # Per process, unlike the application scheduler: every process serves from its own table
+    _refresher = Scheduler(current_app._get_current_object())
+    _refresher.add_job('feature_store_refresh', interval, refresh_feature_store, initial_delay=0)
+    _refresher.start()
+
+
+def get_feature_table() -> FeatureTable:
+    """Get the feature table, reloading only rows this process's commits made stale.
+
+    A new process gets an empty table, which callers fill with the rows
+    they need until the refresher's full build replaces it.
+    """
+    global _table
+
+    if _table is None:
+        with _init_lock:
+            if _table is None:
+                _table = FeatureTable(FEATURE_COLUMNS)
+                _start_refresher()
+    elif _stale:
+        with _sync_lock:
+            _reload_stale(_table)
+    return _table
+
+
+def get_user_features(user_id: int) -> Dict[str, float]:
+    """Get a user's known features by name; empty if they don't exist."""
+    user_id = int(user_id)
+    table = get_feature_table()
+    if user_id not in table:
+        # Not built yet, or created since the last refresh by another process
+        _load_rows(table, user_ids=[user_id])
+    return table.features(user_id) or {}
+
+
+def get_feature_matrix(feature_names: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Get (user_ids, raw feature matrix) for every user, in `feature_names` order if given.
+
+    Builds the full table first if this process hasn't yet; not for the request path.
+    """
+    get_feature_table()
+    if _loaded_on is None:
+        refresh_feature_store(full=True)
+    return get_feature_table().matrix(feature_names)
+
+
+def get_feature_rows(user_ids: Sequence[int], feature_names: Sequence[str]) -> np.ndarray:
+    """Get the raw feature rows of `user_ids` in `feature_names` order."""
+    table = get_feature_table()
+    missing = [user_id for user_id in user_ids if user_id not in table]
+    if missing:
+        _load_rows(table, user_ids=missing)
+    return table.take(user_ids, feature_names)
@@ -0,0 +1,284 @@
+"""Geospatial indexing for environmental observations.
+
+Every `EnvironmentalData` row gets a geohash cell and a normalized
+`location_key`, both indexed: the geohash supports cell/prefix lookups in
+the database, and `location_key` turns location search into an index range
+scan instead of a leading-wildcard ILIKE. `StationIndex` keeps the latest
+recent observation point per cell in memory in a k-d tree over 3D unit
+vectors, built with NumPy alone. Straight-line (chord) distance between
+unit vectors grows with great-circle distance, so the nearest point in the
+tree is the nearest on the globe, including across the poles and the
+antimeridian, and a lookup visits O(log n) nodes.
+"""
+
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event
+
+from models.health import EnvironmentalData, db
+from services.environmental_cache import location_key
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 7  # ~150 m cells
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode coordinates as a geohash string."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+
+    return ''.join(chars)
+
+
+def prefix_range(column, prefix: str):
+    """Filter `column` to values starting with `prefix` as an index-friendly range."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (column >= prefix) & (column < upper)
+
+
+def search_location(query, text: str, column=EnvironmentalData.location_key):
+    """Restrict a query to locations starting with `text` (case-insensitive)."""
+    key = location_key(text)
+    return query.filter(prefix_range(column, key)) if key else query
+
+
+@event.listens_for(EnvironmentalData, 'before_insert')
+@event.listens_for(EnvironmentalData, 'before_update')
+def _index_environmental_data(mapper, connection, target):
+    """Keep the location key and geohash in step with the row's location."""
+    target.location_key = location_key(target.location) if target.location else None
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = encode_geohash(target.latitude, target.longitude)
+    else:
+        target.geohash = None
+
+
+def backfill_environmental_keys(batch_size: int = 1000) -> int:
+    """Fill location_key and geohash on rows recorded before they existed."""
+    updated = 0
+    while True:
+        rows = EnvironmentalData.query.filter(EnvironmentalData.location_key.is_(None))\
+            .limit(batch_size).all()
+        if not rows:
+            return updated
+
+        for row in rows:
+            _index_environmental_data(None, None, row)
+        db.session.commit()
+        updated += len(rows)
+
+
+def unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Convert coordinates in degrees to an (n, 3) array of points on the unit sphere."""
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    cos_lat = np.cos(latitudes)
+    return np.column_stack((cos_lat * np.cos(longitudes), cos_lat * np.sin(longitudes), np.sin(latitudes)))
+
+
+def chord_to_km(chord: float) -> float:
+    """Great-circle distance in km for a chord between two unit vectors."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def km_to_chord(distance_km: float) -> float:
+    """Chord between two unit vectors `distance_km` apart on the globe."""
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class KDTree:
+    """Static k-d tree answering nearest-point queries.
+
+    Nodes are implicit: a node covers a slice of the reordered points and
+    splits at its middle point on the axis where its points spread most.
+    Slices of at most `leaf_size` points are scanned in one vectorized pass.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        """Build the tree over an (n, k) array of points."""
+        points = np.asarray(points, dtype=float)
+        order = np.arange(len(points))
+        axes = np.zeros(len(points), dtype=np.intp)
+
+        pending = [(0, len(points))]
+        while pending:
+            low, high = pending.pop()
+            if high - low <= leaf_size:
+                continue
+
+            block = points[order[low:high]]
+            axis = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            middle = (low + high) // 2
+            order[low:high] = order[low:high][np.argpartition(block[:, axis], middle - low)]
+            axes[middle] = axis
+            pending.append((low, middle))
+            pending.append((middle + 1, high))
+
+        self.leaf_size = leaf_size
+        self.order = order
+        self._points = points[order]
+        self._rows = self._points.tolist()
+        self._axes = axes.tolist()
+
+    def __len__(self):
+        return len(self.order)
+
+    def nearest(self, point, max_distance: float = math.inf) -> Optional[Tuple[int, float]]:
+        """Get (position in the input points, distance) of the nearest point within `max_distance`."""
+        point = np.asarray(point, dtype=float)
+        coordinates = point.tolist()
+        best_position = -1
+        best_squared = max_distance * max_distance
+
+        # (low, high, squared distance from the query to the slice's splitting plane)
+        pending = [(0, len(self.order), 0.0)]
+        while pending:
+            low, high, plane_squared = pending.pop()
+            if plane_squared >= best_squared:
+                continue
+
+            if high - low <= self.leaf_size:
+                if high > low:
+                    squared = ((self._points[low:high] - point) ** 2).sum(axis=1)
+                    index = int(np.argmin(squared))
+                    if squared[index] < best_squared:
+                        best_position, best_squared = low + index, float(squared[index])
+                continue
+
+            middle = (low + high) // 2
+            row = self._rows[middle]
+            squared = sum((a - b) * (a - b) for a, b in zip(row, coordinates))
+            if squared < best_squared:
+                best_position, best_squared = middle, squared
+
+            axis = self._axes[middle]
+            offset = coordinates[axis] - row[axis]
+            near, far = ((middle + 1, high), (low, middle)) if offset >= 0 else ((low, middle), (middle + 1, high))
+            # Far side first so the near side is searched first and tightens the bound
+            pending.append((*far, offset * offset))
+            pending.append((*near, 0.0))
+
+        if best_position < 0:
+            return None
+        return int(self.order[best_position]), math.sqrt(best_squared)
+
+
+class StationIndex:
+    """Coordinates of the latest recent observation per geohash cell."""
+
+    def __init__(self, max_age_seconds: float = 3600, refresh_seconds: float = 300):
+        """Initialize an empty index."""
+        self.max_age_seconds = max_age_seconds
+        self.refresh_seconds = refresh_seconds
+        # (tree, row ids), replaced as a whole so a lookup never mixes two builds
+        self._stations = None
+        self._built_at = None
+        self._rebuild_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._stations[1]) if self._stations else 0
+
+    def rebuild(self):
+        """Rebuild from recent rows with coordinates."""
+        since = datetime.utcnow() - timedelta(seconds=self.max_age_seconds)
+        rows = db.session.query(
+            EnvironmentalData.id, EnvironmentalData.latitude, EnvironmentalData.longitude, EnvironmentalData.geohash
+        ).filter(
+            EnvironmentalData.recorded_at >= since,
+            EnvironmentalData.latitude.isnot(None),
+            EnvironmentalData.longitude.isnot(None)
+        ).order_by(EnvironmentalData.recorded_at.desc()).all()
+
+        # Latest observation per cell
+        latest = {}
+        for row_id, latitude, longitude, geohash in rows:
+            latest.setdefault(geohash or encode_geohash(latitude, longitude), (row_id, latitude, longitude))
+
+        if latest:
+            ids, latitudes, longitudes = zip(*latest.values())
+            self._stations = (KDTree(unit_vectors(latitudes, longitudes)), ids)
+        else:
+            self._stations = None
+
+        self._built_at = time.monotonic()
+
+    def _refresh_if_stale(self):
+        stale = self._built_at is None or time.monotonic() - self._built_at >= self.refresh_seconds
+        # One thread rebuilds; the rest keep using the current points
+        if stale and self._rebuild_lock.acquire(blocking=self._built_at is None):
+            try:
+                self.rebuild()
+            finally:
+                self._rebuild_lock.release()
+
+    def nearest(self, latitude: float, longitude: float, radius_km: float) -> Optional[Tuple[int, float]]:
+        """Get (row id, distance km) of the nearest indexed observation within `radius_km`."""
+        self._refresh_if_stale()
+        stations = self._stations
+        if stations is None:
+            return None
+
+        tree, ids = stations
+        match = tree.nearest(unit_vectors([latitude], [longitude])[0], km_to_chord(radius_km))
+        if match is None:
+            return None
+
+        position, chord = match
+        return int(ids[position]), chord_to_km(chord)
+
+
+_station_index = None
+_station_index_lock = threading.Lock()
+
+
+def get_station_index() -> StationIndex:
+    """Get the process-wide station index."""
+    global _station_index
+
+    if _station_index is None:
+        with _station_index_lock:
+            if _station_index is None:
+                from flask import current_app
+
+                _station_index = StationIndex(
+                    max_age_seconds=current_app.config['ENVIRONMENTAL_CURRENT_TTL'],
+                    refresh_seconds=current_app.config['ENVIRONMENTAL_STATION_INDEX_REFRESH']
+                )
+
+    return _station_index
@@ -0,0 +1,183 @@
+"""Per-user health alerts maintained on write.
+
+A `before_flush` hook re-evaluates the alert rules whenever a health
+record or risk assessment is added, changed or deleted, against the user's
+latest record or assessment, and stores the resulting alerts as
+`UserAlert` rows in the same transaction. Reading a user's alerts is then
+a single indexed lookup. When the rules file changes, the scheduled
+`refresh_alert_rules` job re-evaluates every user in the background.
+"""
+
+import logging
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, select, union
+from sqlalchemy.orm import Session
+
+from models.health import AlertRulesState, HealthRecord, RiskAssessment, UserAlert, db
+from services.alert_rules import AlertRules, get_alert_rules
+
+logger = logging.getLogger(__name__)
+
+# Rule scope -> (model, timestamp field picking the latest row)
+ALERT_SOURCES = {
+    'health_record': (HealthRecord, 'recorded_at'),
+    'risk_assessment': (RiskAssessment, 'assessed_at'),
+}
+
+_SCOPES_BY_MODEL = {model: scope for scope, (model, _) in ALERT_SOURCES.items()}
+
+
+def source_facts(scope: str, source) -> Dict:
+    """Get the fields of a record or assessment that rules can refer to."""
+    facts = {}
+    for column in source.__table__.columns:
+        value = getattr(source, column.name)
+        facts[column.name] = value.value if isinstance(value, Enum) else value
+
+    if scope == 'risk_assessment':
+        facts['recommendations'] = source.get_recommendations()
+        facts['risk_factors'] = source.get_risk_factors()
+
+    return facts
+
+
+def latest_source(session, scope: str, user_id: int, pending=(), excluded_ids=()):
+    """Get a user's latest record or assessment, including ones pending in this flush."""
+    model, timestamp = ALERT_SOURCES[scope]
+    query = session.query(model).filter(model.user_id == user_id)
+    if excluded_ids:
+        query = query.filter(model.id.notin_(excluded_ids))
+
+    candidates = [query.order_by(getattr(model, timestamp).desc()).first(), *pending]
+    return max((source for source in candidates if source is not None),
+               key=lambda source: getattr(source, timestamp), default=None)
+
+
+def sync_user_alerts(session, user_id: int, scope: str, source, rules: AlertRules) -> List[UserAlert]:
+    """Replace a user's alerts for a scope with those raised by `source`."""
+    matches = rules.evaluate(scope, source_facts(scope, source)) if source is not None else []
+    existing = {
+        alert.rule_id: alert
+        for alert in session.query(UserAlert).filter_by(user_id=user_id, scope=scope)
+    }
+    _, timestamp = ALERT_SOURCES[scope]
+
+    alerts = []
+    for match in matches:
+        # Alerts that are still active keep their original created_at
+        alert = existing.pop(match['rule_id'], None)
+        if alert is None:
+            alert = UserAlert(user_id=user_id, rule_id=match['rule_id'], scope=scope)
+            session.add(alert)
+
+        alert.type = match['type']
+        alert.severity = match['severity']
+        alert.title = match['title']
+        alert.message = match['message']
+        alert.set_recommendations(match['recommendations'])
+        alert.source_at = getattr(source, timestamp)
+        alert.rules_version = rules.version
+        alerts.append(alert)
+
+    for alert in existing.values():
+        session.delete(alert)
+
+    return alerts
+
+
+def get_user_alerts(user_id) -> List[Dict]:
+    """Get a user's active alerts in rule order."""
+    alerts = UserAlert.query.filter_by(user_id=int(user_id)).all()
+    order = get_alert_rules().order
+    alerts.sort(key=lambda alert: order.get(alert.rule_id, len(order)))
+    return [alert.to_dict() for alert in alerts]
+
+
+def reevaluate_user_alerts(user_id, rules: Optional[AlertRules] = None, session=None):
+    """Re-evaluate every scope for one user against their latest data."""
+    session = session or db.session
+    rules = rules or get_alert_rules()
+    with session.no_autoflush:
+        for scope in ALERT_SOURCES:
+            sync_user_alerts(session, int(user_id), scope, latest_source(session, scope, int(user_id)), rules)
+
+
+def reevaluate_all_alerts(rules: Optional[AlertRules] = None, batch_size: int = 500) -> int:
+    """Re-evaluate every user with records or assessments, committing per batch."""
+    rules = rules or get_alert_rules()
+    user_ids = db.session.execute(union(
+        select(HealthRecord.user_id), select(RiskAssessment.user_id), select(UserAlert.user_id)
+    )).scalars().all()
+
+    for start in range(0, len(user_ids), batch_size):
+        for user_id in user_ids[start:start + batch_size]:
+            reevaluate_user_alerts(user_id, rules)
+        db.session.commit()
+
+    return len(user_ids)
+
+
+def refresh_alert_rules() -> int:
+    """Scheduled job: re-evaluate all users when the rules have changed.
+
+    The version last evaluated is stored in the database, so restarts
+    don't re-evaluate unchanged rules. The first run against a database
+    re-evaluates, which also fills in alerts for history recorded before
+    they were maintained on write.
+    """
+    rules = get_alert_rules(force_check=True)
+    state = db.session.get(AlertRulesState, 1)
+    if state is not None and state.evaluated_version == rules.version:
+        return 0
+
+    started = datetime.utcnow()
+    count = reevaluate_all_alerts(rules)
+    if state is None:
+        db.session.add(AlertRulesState(id=1, evaluated_version=rules.version))
+    else:
+        state.evaluated_version = rules.version
+    db.session.commit()
+    logger.info(f"Re-evaluated alerts for {count} users with rules {rules.version} "
+                f"in {(datetime.utcnow() - started).total_seconds():.2f}s")
+    return count
+
+
+@event.listens_for(Session, 'before_flush')
+def _evaluate_alerts_on_write(session, flush_context, instances):
+    """Re-evaluate the alerts of users whose records or assessments are being written."""
+    pending = {}
+    excluded = {}
+    affected = set()
+
+    for obj in session.new:
+        scope = _SCOPES_BY_MODEL.get(type(obj))
+        if scope is not None:
+            _, timestamp = ALERT_SOURCES[scope]
+            if getattr(obj, timestamp) is None:
+                setattr(obj, timestamp, datetime.utcnow())
+            pending.setdefault((obj.user_id, scope), []).append(obj)
+            affected.add((obj.user_id, scope))
+
+    for obj in session.deleted:
+        scope = _SCOPES_BY_MODEL.get(type(obj))
+        if scope is not None:
+            excluded.setdefault((obj.user_id, scope), []).append(obj.id)
+            affected.add((obj.user_id, scope))
+
+    for obj in session.dirty:
+        scope = _SCOPES_BY_MODEL.get(type(obj))
+        if scope is not None and session.is_modified(obj):
+            affected.add((obj.user_id, scope))
+
+    if not affected:
+        return
+
+    rules = get_alert_rules()
+    with session.no_autoflush:
+        for user_id, scope in affected:
+            source = latest_source(session, scope, user_id,
+                                   pending.get((user_id, scope), ()), excluded.get((user_id, scope), ()))
+            sync_user_alerts(session, user_id, scope, source, rules)
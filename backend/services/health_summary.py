@@ -0,0 +1,366 @@
+"""Per-user health summaries maintained transactionally on write.
+
+A `before_flush` hook folds every new, updated or deleted health record,
+symptom report and risk assessment into the owning user's
+`UserHealthSummary` row inside the same transaction. Vitals are tracked
+with Welford's online algorithm (count, mean, M2), both all-time and per
+day, so reading a summary is O(1) in the user's history and rolling
+windows only merge at most `DAILY_RETENTION_DAYS` daily entries.
+"""
+
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, attributes
+
+from models.health import HealthRecord, SymptomReport, RiskAssessment, UserHealthSummary, db
+
+# Vitals tracked with running statistics
+SUMMARY_METRICS = [
+    'heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic', 'temperature',
+    'weight', 'sleep_hours', 'exercise_minutes', 'stress_level'
+]
+
+# Fields copied from the most recent health record
+LATEST_VITAL_FIELDS = SUMMARY_METRICS + ['height']
+
+ROLLING_WINDOWS = (7, 30, 90)
+DAILY_RETENTION_DAYS = max(ROLLING_WINDOWS)
+
+
+def welford_add(stats, value):
+    """Add a value to [count, mean, m2] statistics."""
+    count, mean, m2 = stats or (0, 0.0, 0.0)
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return [count, mean, m2]
+
+
+def welford_remove(stats, value):
+    """Remove a previously added value from [count, mean, m2] statistics."""
+    count, mean, m2 = stats
+    if count <= 1:
+        return None
+
+    new_mean = (count * mean - value) / (count - 1)
+    m2 -= (value - mean) * (value - new_mean)
+    return [count - 1, new_mean, max(m2, 0.0)]
+
+
+def welford_merge(a, b):
+    """Merge two [count, mean, m2] statistics (Chan et al.)."""
+    if not a:
+        return b
+    if not b:
+        return a
+
+    count = a[0] + b[0]
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / count
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / count
+    return [count, mean, m2]
+
+
+def describe(stats):
+    """Convert [count, mean, m2] statistics to a response dictionary."""
+    count, mean, m2 = stats
+    variance = m2 / (count - 1) if count > 1 else 0.0
+    return {
+        'count': count,
+        'mean': round(mean, 2),
+        'variance': round(variance, 2),
+        'std': round(math.sqrt(variance), 2)
+    }
+
+
+def summary_statistics(summary, windows=ROLLING_WINDOWS, today=None):
+    """Get all-time and rolling-window vital statistics from a summary."""
+    today = today or datetime.utcnow().date()
+    vital_stats = summary.get_vital_stats()
+    daily_stats = summary.get_daily_stats()
+
+    rolling = {}
+    for window in windows:
+        cutoff = (today - timedelta(days=window - 1)).isoformat()
+        window_stats = {}
+        for metric, days in daily_stats.items():
+            merged = None
+            for day, stats in days.items():
+                if day >= cutoff:
+                    merged = welford_merge(merged, stats)
+            if merged:
+                window_stats[metric] = describe(merged)
+        rolling[f'{window}d'] = window_stats
+
+    return {
+        'all_time': {metric: describe(stats) for metric, stats in vital_stats.items()},
+        'rolling': rolling
+    }
+
+
+def get_user_summary(user_id):
+    """Get a user's summary, building it from their history if it doesn't exist yet."""
+    summary = UserHealthSummary.query.get(int(user_id))
+    if summary is None:
+        summary = rebuild_user_summary(user_id)
+        db.session.commit()
+
+    return summary
+
+
+def rebuild_user_summary(user_id, session=None):
+    """Recompute a user's summary from their full history."""
+    session = session or db.session
+    user_id = int(user_id)
+
+    with session.no_autoflush:
+        summary = session.get(UserHealthSummary, user_id)
+        if summary is None:
+            summary = UserHealthSummary(user_id=user_id)
+            session.add(summary)
+
+        vital_stats = {}
+        daily_stats = {}
+        cutoff = (datetime.utcnow().date() - timedelta(days=DAILY_RETENTION_DAYS)).isoformat()
+        latest = None
+        count = 0
+
+        records = session.query(HealthRecord).filter_by(user_id=user_id)\
+            .order_by(HealthRecord.recorded_at).yield_per(500)
+        for record in records:
+            count += 1
+            latest = record
+            _add_vitals(vital_stats, daily_stats, record, cutoff)
+
+        summary.health_record_count = count
+        summary.set_vital_stats(vital_stats)
+        summary.set_daily_stats(daily_stats)
+        summary.set_latest_vitals(_latest_vitals(latest) if latest else {})
+        summary.last_health_record_at = latest.recorded_at if latest else None
+
+        summary.symptom_report_count, summary.last_symptom_report_at = session.query(
+            func.count(SymptomReport.id), func.max(SymptomReport.reported_at)
+        ).filter(SymptomReport.user_id == user_id).one()
+
+        summary.risk_assessment_count, summary.last_risk_assessment_at = session.query(
+            func.count(RiskAssessment.id), func.max(RiskAssessment.assessed_at)
+        ).filter(RiskAssessment.user_id == user_id).one()
+
+    return summary
+
+
+def _latest_vitals(record):
+    vitals = {field: getattr(record, field) for field in LATEST_VITAL_FIELDS}
+    vitals['recorded_at'] = record.recorded_at.isoformat()
+    return vitals
+
+
+def _add_vitals(vital_stats, daily_stats, record, cutoff):
+    day = record.recorded_at.date().isoformat()
+    for metric in SUMMARY_METRICS:
+        value = getattr(record, metric)
+        if value is None:
+            continue
+
+        vital_stats[metric] = welford_add(vital_stats.get(metric), value)
+        if day >= cutoff:
+            days = daily_stats.setdefault(metric, {})
+            days[day] = welford_add(days.get(day), value)
+
+
+def _remove_value(vital_stats, daily_stats, metric, value, day):
+    if metric in vital_stats:
+        remaining = welford_remove(vital_stats[metric], value)
+        if remaining:
+            vital_stats[metric] = remaining
+        else:
+            del vital_stats[metric]
+
+    days = daily_stats.get(metric, {})
+    if day in days:
+        remaining = welford_remove(days[day], value)
+        if remaining:
+            days[day] = remaining
+        else:
+            del days[day]
+
+
+def _trim_daily_stats(daily_stats):
+    cutoff = (datetime.utcnow().date() - timedelta(days=DAILY_RETENTION_DAYS)).isoformat()
+    for metric in list(daily_stats):
+        days = {day: stats for day, stats in daily_stats[metric].items() if day >= cutoff}
+        if days:
+            daily_stats[metric] = days
+        else:
+            del daily_stats[metric]
+
+
+def _ensure_timestamp(obj, field):
+    """Fill a defaulted timestamp now so the summary and the row agree."""
+    if getattr(obj, field) is None:
+        setattr(obj, field, datetime.utcnow())
+    return getattr(obj, field)
+
+
+class _SummaryUpdate:
+    """Summary rows touched during one flush, with their decoded statistics."""
+
+    def __init__(self, session):
+        self.session = session
+        self.entries = {}
+
+    def get(self, user_id):
+        if user_id not in self.entries:
+            summary = self.session.get(UserHealthSummary, user_id, with_for_update=True)
+            if summary is None:
+                summary = rebuild_user_summary(user_id, self.session)
+            self.entries[user_id] = (summary, summary.get_vital_stats(), summary.get_daily_stats())
+        return self.entries[user_id]
+
+    def save(self):
+        for summary, vital_stats, daily_stats in self.entries.values():
+            _trim_daily_stats(daily_stats)
+            summary.set_vital_stats(vital_stats)
+            summary.set_daily_stats(daily_stats)
+            summary.updated_at = datetime.utcnow()
+
+
+def _record_added(update, record):
+    summary, vital_stats, daily_stats = update.get(record.user_id)
+    recorded_at = _ensure_timestamp(record, 'recorded_at')
+    cutoff = (datetime.utcnow().date() - timedelta(days=DAILY_RETENTION_DAYS)).isoformat()
+
+    summary.health_record_count = (summary.health_record_count or 0) + 1
+    _add_vitals(vital_stats, daily_stats, record, cutoff)
+
+    if summary.last_health_record_at is None or recorded_at >= summary.last_health_record_at:
+        summary.last_health_record_at = recorded_at
+        summary.set_latest_vitals(_latest_vitals(record))
+
+
+def _record_changed(update, record):
+    summary, vital_stats, daily_stats = update.get(record.user_id)
+    day = record.recorded_at.date().isoformat()
+    cutoff = (datetime.utcnow().date() - timedelta(days=DAILY_RETENTION_DAYS)).isoformat()
+
+    for metric in SUMMARY_METRICS:
+        history = attributes.get_history(record, metric)
+        if not history.has_changes():
+            continue
+
+        # The old value is always in the history; see _load_replaced_vitals
+        for old_value in history.deleted:
+            if old_value is not None:
+                _remove_value(vital_stats, daily_stats, metric, old_value, day)
+        for new_value in history.added:
+            if new_value is not None:
+                vital_stats[metric] = welford_add(vital_stats.get(metric), new_value)
+                if day >= cutoff:
+                    days = daily_stats.setdefault(metric, {})
+                    days[day] = welford_add(days.get(day), new_value)
+
+    if record.recorded_at == summary.last_health_record_at:
+        summary.set_latest_vitals(_latest_vitals(record))
+
+
+def _record_deleted(update, record):
+    summary, vital_stats, daily_stats = update.get(record.user_id)
+    day = record.recorded_at.date().isoformat()
+
+    summary.health_record_count = max((summary.health_record_count or 0) - 1, 0)
+    for metric in SUMMARY_METRICS:
+        value = getattr(record, metric)
+        if value is not None:
+            _remove_value(vital_stats, daily_stats, metric, value, day)
+
+    if record.recorded_at == summary.last_health_record_at:
+        latest = update.session.query(HealthRecord).filter(
+            HealthRecord.user_id == record.user_id,
+            HealthRecord.id != record.id
+        ).order_by(HealthRecord.recorded_at.desc()).first()
+        summary.last_health_record_at = latest.recorded_at if latest else None
+        summary.set_latest_vitals(_latest_vitals(latest) if latest else {})
+
+
+def _symptom_added(update, report):
+    summary, _, _ = update.get(report.user_id)
+    reported_at = _ensure_timestamp(report, 'reported_at')
+
+    summary.symptom_report_count = (summary.symptom_report_count or 0) + 1
+    if summary.last_symptom_report_at is None or reported_at > summary.last_symptom_report_at:
+        summary.last_symptom_report_at = reported_at
+
+
+def _symptom_deleted(update, report):
+    summary, _, _ = update.get(report.user_id)
+
+    summary.symptom_report_count = max((summary.symptom_report_count or 0) - 1, 0)
+    if report.reported_at == summary.last_symptom_report_at:
+        summary.last_symptom_report_at = update.session.query(func.max(SymptomReport.reported_at))\
+            .filter(SymptomReport.user_id == report.user_id, SymptomReport.id != report.id).scalar()
+
+
+def _assessment_added(update, assessment):
+    summary, _, _ = update.get(assessment.user_id)
+    assessed_at = _ensure_timestamp(assessment, 'assessed_at')
+
+    summary.risk_assessment_count = (summary.risk_assessment_count or 0) + 1
+    if summary.last_risk_assessment_at is None or assessed_at > summary.last_risk_assessment_at:
+        summary.last_risk_assessment_at = assessed_at
+
+
+def _assessment_deleted(update, assessment):
+    summary, _, _ = update.get(assessment.user_id)
+
+    summary.risk_assessment_count = max((summary.risk_assessment_count or 0) - 1, 0)
+    if assessment.assessed_at == summary.last_risk_assessment_at:
+        summary.last_risk_assessment_at = update.session.query(func.max(RiskAssessment.assessed_at))\
+            .filter(RiskAssessment.user_id == assessment.user_id, RiskAssessment.id != assessment.id).scalar()
+
+
+def _load_replaced_vitals(target, value, oldvalue, initiator):
+    """No-op; registering it with active_history makes setting a vital load the old value."""
+
+
+# Without this, setting a vital on a record expired by a commit records no old value to remove
+for _metric in SUMMARY_METRICS:
+    event.listen(getattr(HealthRecord, _metric), 'set', _load_replaced_vitals, active_history=True)
+
+
+_ADDED_HANDLERS = {
+    HealthRecord: _record_added,
+    SymptomReport: _symptom_added,
+    RiskAssessment: _assessment_added,
+}
+
+_DELETED_HANDLERS = {
+    HealthRecord: _record_deleted,
+    SymptomReport: _symptom_deleted,
+    RiskAssessment: _assessment_deleted,
+}
+
+
+@event.listens_for(Session, 'before_flush')
+def _maintain_health_summaries(session, flush_context, instances):
+    """Fold pending activity writes into the owners' summary rows."""
+    new = [obj for obj in session.new if type(obj) in _ADDED_HANDLERS]
+    deleted = [obj for obj in session.deleted if type(obj) in _DELETED_HANDLERS]
+    changed = [obj for obj in session.dirty
+               if isinstance(obj, HealthRecord) and session.is_modified(obj)]
+
+    if not (new or deleted or changed):
+        return
+
+    update = _SummaryUpdate(session)
+    with session.no_autoflush:
+        for obj in new:
+            _ADDED_HANDLERS[type(obj)](update, obj)
+        for obj in deleted:
+            _DELETED_HANDLERS[type(obj)](update, obj)
+        for record in changed:
+            _record_changed(update, record)
+
+    update.save()
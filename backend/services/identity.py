@@ -0,0 +1,67 @@
+"""Cached identity layer for JWT-authenticated request handlers.
+
+Most handlers only need to know that the token's user exists plus a few
+profile fields. Snapshots of those fields are memoized for the request in
+`flask.g` and for a short TTL across requests, and are dropped as soon as a
+transaction that updates or deletes the user commits (profile update,
+deactivation, role change, login).
+
+The cache is per process, and a commit only invalidates it in the process
+that made it. Other web workers can keep serving the old snapshot for up to
+USER_CACHE_TTL seconds, so the TTL bounds how long a deactivation or role
+change can go unnoticed; keep it short.
+"""
+
+from flask import current_app, g
+from flask_jwt_extended import get_jwt_identity
+
+from models.user import User
+from services.cache import TTLCache, invalidate_on_commit
+
+_user_cache = TTLCache(ttl=5)
+invalidate_on_commit(User, lambda user: user.id, _user_cache.invalidate)
+
+
+class CachedUser:
+    """Read-only snapshot of the user fields request handlers use."""
+
+    __slots__ = ('id', 'email', 'first_name', 'last_name', 'age', 'gender', 'location',
+                 'role', 'is_active', 'created_at', 'last_login', '_profile')
+
+    def __init__(self, user: User):
+        for field in self.__slots__[:-1]:
+            setattr(self, field, getattr(user, field))
+        self._profile = user.to_dict()
+
+    def to_dict(self):
+        """Convert user to dictionary for API responses."""
+        return dict(self._profile)
+
+    def __repr__(self):
+        return f'<CachedUser {self.email}>'
+
+
+def get_cached_user(user_id):
+    """Get a user snapshot by ID, loading it from the database on a cache miss."""
+    if user_id is None:
+        return None
+
+    user_id = int(user_id)
+    cached = _user_cache.get(user_id)
+    if cached is None:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+
+        cached = CachedUser(user)
+        _user_cache.set(user_id, cached, ttl=current_app.config['USER_CACHE_TTL'])
+
+    return cached
+
+
+def get_current_user():
+    """Get the snapshot for the JWT identity, memoized for the current request."""
+    if 'current_user' not in g:
+        g.current_user = get_cached_user(get_jwt_identity())
+
+    return g.current_user
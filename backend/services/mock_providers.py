@@ -0,0 +1,132 @@
+"""Local mock of the upstream environmental providers.
+
+Serves canned OpenWeatherMap, IQAir and Ambee responses from a threaded
+`http.server`, with configurable latency and failure injection, so the
+provider client can be exercised without network access or API keys.
+Point OPENWEATHERMAP_BASE_URL, AIRVISUAL_BASE_URL and POLLEN_BASE_URL at
+`server.url` (any non-empty API keys work).
+
+    with MockProviderServer(latency=0.05, failure_rate=0.1) as server:
+        ...
+
+Run `python -m services.mock_providers` to serve on a fixed port.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+WEATHER_RESPONSE = {
+    'coord': {'lon': -71.06, 'lat': 42.36},
+    'weather': [{'main': 'Clouds', 'description': 'partly cloudy'}],
+    'main': {'temp': 22.5, 'feels_like': 24.1, 'pressure': 1013, 'humidity': 65},
+    'visibility': 10000,
+    'wind': {'speed': 5.2, 'deg': 225},
+}
+
+AIR_QUALITY_RESPONSE = {
+    'status': 'success',
+    'data': {'current': {'pollution': {'aqius': 85, 'mainus': 'p2'}}},
+}
+
+POLLEN_RESPONSE = {
+    'message': 'success',
+    'data': [{'Count': {'grass_pollen': 20, 'tree_pollen': 15, 'weed_pollen': 10}}],
+}
+
+ROUTES = {
+    '/data/2.5/weather': WEATHER_RESPONSE,
+    '/v2/nearest_city': AIR_QUALITY_RESPONSE,
+    '/latest/pollen/by-lat-lng': POLLEN_RESPONSE,
+    '/latest/pollen/by-place': POLLEN_RESPONSE,
+}
+
+
+class MockProviderServer:
+    """Threaded HTTP server answering every provider route."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 failure_rate: float = 0.0, failure_status: int = 503):
+        """Initialize the server; port 0 picks a free port."""
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                payload = ROUTES.get(urlparse(self.path).path)
+                if payload is None:
+                    status, payload = 404, {'error': 'Not found'}
+                elif random.random() < server.failure_rate:
+                    status, payload = server.failure_status, {'error': 'Injected failure'}
+                else:
+                    status = 200
+
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve mock environmental provider APIs')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockProviderServer(port=args.port, latency=args.latency, failure_rate=args.failure_rate)
+    print(f"Mock providers listening on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
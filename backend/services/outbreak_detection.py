@@ -0,0 +1,397 @@
+"""Streaming outbreak detection over incoming symptom reports.
+
+Reports are bucketed by (location, symptom category, day). Each
+(location, category) pair keeps a fixed-size state: the open day's count,
+an EWMA baseline mean/variance and a one-sided CUSUM. When a report for a
+later day arrives the open day is closed, scored against the baseline (an
+exact Poisson tail probability for sudden spikes, CUSUM for sustained
+rises) and folded into it, so memory stays O(1) per bucket no matter how long a
+location has been monitored.
+
+A single detector runs as a scheduled job in the scheduler process, so it
+sees every report no matter which web worker saved it. Each run reads the
+reports saved since the last one; the first run replays OUTBREAK_REPLAY_DAYS
+of history to warm the baselines. Alerts are stored in the outbreak_alerts
+table, which the alert endpoints read.
+"""
+
+import math
+import threading
+from datetime import datetime, timedelta, date
+from typing import Dict, Iterable, List, Optional
+
+from ml_models.nlp.symptom_categories import match_categories
+
+
+class BucketState:
+    """Incremental statistics for one (location, category) series."""
+
+    __slots__ = ('location', 'day', 'count', 'mean', 'var', 'cusum', 'days_seen')
+
+    def __init__(self, location: str, day: int):
+        self.location = location
+        self.day = day
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum = 0.0
+        self.days_seen = 0
+
+
+class OutbreakDetector:
+    """EWMA baseline anomaly detector over daily symptom counts."""
+
+    def __init__(self, alpha: float = 0.05, cusum_k: float = 1.0, cusum_h: float = 5.0,
+                 p_threshold: float = 1e-4, min_count: int = 5, warmup_days: int = 14,
+                 max_gap_days: int = 60):
+        """Initialize the detector."""
+        self.alpha = alpha
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.p_threshold = p_threshold
+        self.min_count = min_count
+        self.warmup_days = warmup_days
+        self.max_gap_days = max_gap_days
+
+        self._buckets: Dict[tuple, BucketState] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bucket_count(self) -> int:
+        """Number of (location, category) series being monitored."""
+        return len(self._buckets)
+
+    def observe(self, location: str, category: str, day: int, count: int = 1) -> List[Dict]:
+        """Add reports for a bucket and return alerts for any day it closed.
+
+        `day` is a proleptic ordinal (`date.toordinal()`). Reports for days
+        that have already been closed are too late to change the statistic
+        and are ignored.
+        """
+        key = (location.strip().lower(), category)
+
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                state = BucketState(location.strip(), day)
+                self._buckets[key] = state
+
+            alerts = []
+            if day > state.day:
+                alerts = self._advance(state, category, day)
+
+            if day == state.day:
+                state.count += count
+
+            return alerts
+
+    def flush(self, day: int) -> List[Dict]:
+        """Close every bucket whose open day is before `day`."""
+        with self._lock:
+            alerts = []
+            for (_, category), state in self._buckets.items():
+                if state.day < day:
+                    alerts.extend(self._advance(state, category, day))
+
+            return alerts
+
+    def _advance(self, state: BucketState, category: str, day: int) -> List[Dict]:
+        """Close the open day and fold in empty days up to `day`."""
+        alerts = []
+
+        alert = self._close_day(state, category)
+        if alert:
+            alerts.append(alert)
+
+        # Empty days only decay the baseline; past the cap it has fully decayed anyway
+        gap = min(day - state.day - 1, self.max_gap_days)
+        for _ in range(gap):
+            state.count = 0
+            self._close_day(state, category)
+
+        state.day = day
+        state.count = 0
+        return alerts
+
+    def _close_day(self, state: BucketState, category: str) -> Optional[Dict]:
+        """Score the open day against the baseline, then update the baseline."""
+        observed = state.count
+        alert = None
+
+        # Poisson floor: the variance of a count is at least its mean
+        sd = math.sqrt(max(state.var, state.mean, 1.0))
+        z_score = (observed - state.mean) / sd
+
+        if state.days_seen >= self.warmup_days:
+            state.cusum = max(0.0, state.cusum + z_score - self.cusum_k)
+
+            method = None
+            p_value = 1.0
+            if observed >= self.min_count:
+                p_value = poisson_upper_tail(observed, state.mean)
+                if p_value <= self.p_threshold:
+                    method = 'poisson'
+                elif state.cusum >= self.cusum_h:
+                    method = 'cusum'
+
+            if method:
+                alert = self._build_alert(state, category, observed, z_score, p_value, method)
+                state.cusum = 0.0
+
+        # Cap the update so an outbreak does not immediately become the new normal
+        capped = min(observed, state.mean + 3 * sd)
+        if state.days_seen == 0:
+            state.mean = float(capped)
+        else:
+            diff = capped - state.mean
+            increment = self.alpha * diff
+            state.mean += increment
+            state.var = (1 - self.alpha) * (state.var + diff * increment)
+
+        state.days_seen += 1
+        return alert
+
+    def _build_alert(self, state: BucketState, category: str, observed: int,
+                     z_score: float, p_value: float, method: str) -> Dict:
+        """Build an outbreak alert in the shape used by the alert endpoints."""
+        severity = 'high' if p_value <= self.p_threshold ** 2 else 'medium'
+        day = date.fromordinal(state.day)
+
+        return {
+            'type': 'outbreak',
+            'severity': severity,
+            'title': f'Unusual {category} symptom activity',
+            'message': (f'{observed} {category} symptom reports in {state.location} on '
+                        f'{day.isoformat()}, against an expected {state.mean:.1f}.'),
+            'location': state.location,
+            'category': category,
+            'date': day.isoformat(),
+            'observed': observed,
+            'expected': round(state.mean, 2),
+            'z_score': round(z_score, 2),
+            'p_value': float(f'{p_value:.3g}'),
+            'cusum': round(state.cusum, 2),
+            'method': method,
+            'recommendations': [
+                'Review recent reports from this area',
+                'Coordinate with local health providers',
+                'Monitor the trend over the coming days'
+            ]
+        }
+
+
+def poisson_upper_tail(observed: int, expected: float) -> float:
+    """P(X >= observed) for X ~ Poisson(expected), summed directly over the tail."""
+    if observed <= expected:
+        return 1.0
+
+    expected = max(expected, 1e-3)
+    term = math.exp(-expected + observed * math.log(expected) - math.lgamma(observed + 1))
+    total = term
+    i = observed
+    while term > total * 1e-12:
+        i += 1
+        term *= expected / i
+        total += term
+
+    return min(total, 1.0)
+
+
+def report_categories(report) -> List[str]:
+    """Get the symptom categories for a symptom report."""
+    processed = report.get_processed_symptoms()
+    if isinstance(processed, dict) and processed:
+        return [category for category in processed.keys() if category != 'other']
+
+    return match_categories(report.symptom_text)
+
+
+def observe_report(detector: OutbreakDetector, report) -> List[Dict]:
+    """Feed a single symptom report into the detector."""
+    if not report.location or not report.reported_at:
+        return []
+
+    day = report.reported_at.date().toordinal()
+    alerts = []
+    for category in report_categories(report):
+        alerts.extend(detector.observe(report.location, category, day))
+
+    return alerts
+
+
+# Reports are read again for this long after they were saved, in case their
+# transaction committed after a run that should have seen them
+LATE_COMMIT_WINDOW = timedelta(minutes=5)
+
+_detector = None
+_read_until = None
+_recent_ids: Dict[int, datetime] = {}
+
+
+def build_outbreak_detector(app_config) -> OutbreakDetector:
+    """Create a detector with the configured thresholds."""
+    return OutbreakDetector(
+        alpha=app_config['OUTBREAK_EWMA_ALPHA'],
+        cusum_k=app_config['OUTBREAK_CUSUM_K'],
+        cusum_h=app_config['OUTBREAK_CUSUM_H'],
+        p_threshold=app_config['OUTBREAK_P_THRESHOLD'],
+        min_count=app_config['OUTBREAK_MIN_COUNT'],
+        warmup_days=app_config['OUTBREAK_WARMUP_DAYS']
+    )
+
+
+def detect_outbreaks() -> List[Dict]:
+    """Scheduled job: run reports saved since the last run through detection.
+
+    The first run builds the detector and replays recent history into it.
+    Every report is observed exactly once: reports inside the late-commit
+    window are read again on the next run, and skipped if already seen.
+    """
+    global _detector, _read_until, _recent_ids
+    from flask import current_app
+    from models.health import SymptomReport
+
+    run_at = datetime.utcnow()
+    if _detector is None:
+        _detector = build_outbreak_detector(current_app.config)
+        since = run_at - timedelta(days=current_app.config['OUTBREAK_REPLAY_DAYS'])
+    else:
+        since = _read_until
+
+    # Report order, so baselines see each series' days in sequence
+    reports = SymptomReport.query.filter(
+        SymptomReport.reported_at >= since,
+        SymptomReport.location.isnot(None)
+    ).order_by(SymptomReport.reported_at, SymptomReport.id).yield_per(1000)
+
+    read_until = run_at - LATE_COMMIT_WINDOW
+    recent_ids = {report_id: reported_at for report_id, reported_at in _recent_ids.items()
+                  if reported_at >= read_until}
+    alerts = []
+    for report in reports:
+        if report.id in recent_ids:
+            continue
+        if report.reported_at >= read_until:
+            recent_ids[report.id] = report.reported_at
+        alerts.extend(observe_report(_detector, report))
+
+    _read_until = read_until
+    _recent_ids = recent_ids
+
+    if alerts:
+        record_outbreak_alerts(alerts)
+    return alerts
+
+
+def record_outbreak_alerts(alerts: Iterable[Dict]):
+    """Store alerts that aren't stored yet; a replay raises the same alerts again."""
+    from models.health import OutbreakAlert, db
+
+    for alert in alerts:
+        location_key = alert['location'].lower()
+        alert_date = date.fromisoformat(alert['date'])
+        exists = db.session.query(OutbreakAlert.id).filter_by(
+            location_key=location_key,
+            category=alert['category'],
+            alert_date=alert_date
+        ).first()
+        if exists:
+            continue
+
+        outbreak_alert = OutbreakAlert(
+            location=alert['location'],
+            location_key=location_key,
+            category=alert['category'],
+            alert_date=alert_date,
+            severity=alert['severity']
+        )
+        outbreak_alert.set_details(alert)
+        db.session.add(outbreak_alert)
+
+    db.session.commit()
+
+
+def recent_outbreak_alerts(location: Optional[str] = None, since: Optional[date] = None) -> List[Dict]:
+    """Get stored outbreak alerts, newest first."""
+    from models.health import OutbreakAlert
+
+    query = OutbreakAlert.query
+    if location:
+        query = query.filter(OutbreakAlert.location_key == location.strip().lower())
+    if since is not None:
+        if isinstance(since, datetime):
+            since = since.date()
+        query = query.filter(OutbreakAlert.alert_date >= since)
+
+    alerts = query.order_by(OutbreakAlert.alert_date.desc(), OutbreakAlert.id.desc()).all()
+    return [alert.get_details() for alert in alerts]
+
+
+# Replay benchmark over a synthetic multi-year report stream
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import numpy as np
+
+    parser = argparse.ArgumentParser(description='Replay benchmark for the outbreak detector')
+    parser.add_argument('--locations', type=int, default=500)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--outbreaks', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    categories = ['respiratory', 'gastrointestinal', 'neurological', 'cardiovascular',
+                  'musculoskeletal', 'dermatological', 'systemic']
+    locations = [f'City {i}' for i in range(args.locations)]
+    n_days = 365 * args.years
+    first_day = date(2020, 1, 1).toordinal()
+
+    # Baseline daily rate per series, with a weekly cycle
+    rates = rng.uniform(0.5, 6.0, size=(args.locations, len(categories)))
+    weekly = 1.0 + 0.2 * np.sin(2 * np.pi * np.arange(n_days) / 7)
+
+    # Injected outbreaks: a week at 3-5x the baseline rate
+    injected = {}
+    for _ in range(args.outbreaks):
+        loc = int(rng.integers(args.locations))
+        cat = int(rng.integers(len(categories)))
+        start = int(rng.integers(60, n_days - 7))
+        injected[(loc, cat)] = (start, float(rng.uniform(3, 5)))
+
+    detector = OutbreakDetector()
+    alerts = []
+    total_reports = 0
+    elapsed = 0.0
+
+    for day_index in range(n_days):
+        counts = rng.poisson(rates * weekly[day_index])
+        for (loc, cat), (start, factor) in injected.items():
+            if start <= day_index < start + 7:
+                counts[loc, cat] = rng.poisson(rates[loc, cat] * factor * weekly[day_index])
+
+        day = first_day + day_index
+        nonzero = np.argwhere(counts > 0)
+        started = time.perf_counter()
+        for loc, cat in nonzero:
+            alerts.extend(detector.observe(locations[loc], categories[cat], day, int(counts[loc, cat])))
+        elapsed += time.perf_counter() - started
+        total_reports += int(counts.sum())
+
+    alerts.extend(detector.flush(first_day + n_days))
+
+    detected = 0
+    injected_keys = {(locations[loc].lower(), categories[cat]): start
+                     for (loc, cat), (start, _) in injected.items()}
+    for key, start in injected_keys.items():
+        window = {date.fromordinal(first_day + start + offset).isoformat() for offset in range(8)}
+        if any((a['location'].lower(), a['category']) == key and a['date'] in window for a in alerts):
+            detected += 1
+
+    series_years = args.locations * len(categories) * args.years
+    print(f"Series monitored: {detector.bucket_count}")
+    print(f"Reports replayed: {total_reports:,} over {n_days} days")
+    print(f"Detector time: {elapsed:.2f}s ({total_reports / elapsed:,.0f} reports/s)")
+    print(f"Injected outbreaks detected: {detected}/{len(injected_keys)}")
+    print(f"Alerts raised: {len(alerts)}, "
+          f"~{max(len(alerts) - detected, 0) / series_years:.3f} false alerts per series-year")
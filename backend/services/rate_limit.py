@@ -0,0 +1,249 @@
+"""Cost-aware API rate limiting with token buckets.
+
+Each client has a bucket holding up to RATELIMIT_CAPACITY tokens. The bucket
+refills at RATELIMIT_REFILL_RATE tokens per second. Clients are identified
+by their JWT identity, or by their address on unauthenticated requests.
+Every blueprint request spends tokens according to its view's cost class:
+
+- `read`: cheap queries (the default)
+- `analytics`: aggregation queries such as the public health dashboard
+- `inference`: model predictions such as symptom analysis and risk assessment
+- `job`: requests that queue background work such as retraining
+
+Each class's cost is its RATELIMIT_*_COST setting. A request the bucket
+can't pay for gets a 429 with a Retry-After header giving the seconds until
+it can.
+
+Buckets live in Redis when RATELIMIT_STORAGE_URL is a redis:// URL, so every
+web worker shares them. A Lua script refills and spends a bucket atomically
+in one round trip, using the Redis clock. With a memory:// URL, or when the
+redis package isn't installed, buckets are kept per process. If Redis can't
+be reached, requests are still limited, by per-process buckets, until Redis
+answers again; it is retried after a backoff that doubles up to 30 seconds.
+During an outage each worker allows a full bucket, so a client can get
+through as many times more requests as there are workers.
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+logger = logging.getLogger(__name__)
+
+# Cost class -> config setting holding its token cost
+COSTS = {
+    'read': 'RATELIMIT_READ_COST',
+    'analytics': 'RATELIMIT_ANALYTICS_COST',
+    'inference': 'RATELIMIT_INFERENCE_COST',
+    'job': 'RATELIMIT_JOB_COST',
+}
+
+# How often the memory backend drops buckets that have refilled
+_SWEEP_INTERVAL = 60.0
+
+# Seconds before retrying an unreachable shared store: the first wait, and the most it doubles to
+_MIN_RETRY_INTERVAL = 1.0
+_MAX_RETRY_INTERVAL = 30.0
+
+
+def rate_cost(cost_class: str) -> Callable:
+    """Decorator: set the cost class a view's requests are charged."""
+    if cost_class not in COSTS:
+        raise ValueError(f"Unknown rate limit cost class: {cost_class}")
+
+    def decorator(view):
+        view.rate_cost = cost_class
+        return view
+
+    return decorator
+
+
+class MemoryTokenBuckets:
+    """Token buckets kept in this process."""
+
+    def __init__(self):
+        """Create an empty bucket store."""
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def consume(self, key: str, cost: float, capacity: float, rate: float) -> Tuple[bool, float, float]:
+        """Spend `cost` tokens from a bucket; returns (allowed, tokens left, seconds until allowed)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < cost:
+                return False, tokens, (cost - tokens) / rate
+
+            self._buckets[key] = (tokens - cost, now)
+            if now - self._swept_at >= _SWEEP_INTERVAL:
+                self._sweep(now, capacity, rate)
+            return True, tokens - cost, 0.0
+
+    def _sweep(self, now: float, capacity: float, rate: float):
+        # A full bucket is the same as no bucket
+        self._buckets = {key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                         if tokens + (now - updated) * rate < capacity}
+        self._swept_at = now
+
+
+# KEYS[1]: bucket; ARGV: capacity, refill rate, cost.
+# Returns {allowed, tokens left, seconds until allowed}; numbers as strings so Redis doesn't truncate them.
+_CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+if tokens < cost then
+    return {0, tostring(tokens), tostring((cost - tokens) / rate)}
+end
+
+tokens = tokens - cost
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+-- Expire the bucket once it would have refilled
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {1, tostring(tokens), '0'}
+"""
+
+
+class RedisTokenBuckets:
+    """Token buckets shared by every process through Redis."""
+
+    def __init__(self, url: str):
+        """Connect to Redis and register the consume script."""
+        import redis
+
+        self.redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.connection_errors = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+        self._consume = self.redis.register_script(_CONSUME_SCRIPT)
+
+    def consume(self, key: str, cost: float, capacity: float, rate: float) -> Tuple[bool, float, float]:
+        """Spend `cost` tokens from a bucket; returns (allowed, tokens left, seconds until allowed)."""
+        allowed, tokens, retry_after = self._consume(keys=[f'ratelimit:{key}'], args=[capacity, rate, cost])
+        return bool(allowed), float(tokens), float(retry_after)
+
+
+class FailoverTokenBuckets:
+    """Shared token buckets, with per-process ones standing in while the shared store is unreachable."""
+
+    def __init__(self, shared):
+        """Wrap a shared bucket store that names its `connection_errors`."""
+        self.shared = shared
+        self.local = MemoryTokenBuckets()
+        self._retry_at = None
+        self._retry_interval = _MIN_RETRY_INTERVAL
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, cost: float, capacity: float, rate: float) -> Tuple[bool, float, float]:
+        """Spend `cost` tokens from a bucket; returns (allowed, tokens left, seconds until allowed)."""
+        if self._retry_at is not None and time.monotonic() < self._retry_at:
+            return self.local.consume(key, cost, capacity, rate)
+
+        try:
+            result = self.shared.consume(key, cost, capacity, rate)
+        except self.shared.connection_errors as e:
+            self._failed(e)
+            return self.local.consume(key, cost, capacity, rate)
+
+        if self._retry_at is not None:
+            with self._lock:
+                if self._retry_at is not None:
+                    logger.info("Rate limit store reachable again; using shared buckets")
+                    self._retry_at = None
+                    self._retry_interval = _MIN_RETRY_INTERVAL
+        return result
+
+    def _failed(self, error: Exception):
+        with self._lock:
+            now = time.monotonic()
+            if self._retry_at is not None and now < self._retry_at:
+                # Another request already backed off for this failure
+                return
+            if self._retry_at is None:
+                logger.warning(f"Rate limit store unreachable, limiting per process: {error}")
+            else:
+                self._retry_interval = min(self._retry_interval * 2, _MAX_RETRY_INTERVAL)
+            self._retry_at = now + self._retry_interval
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def get_token_buckets():
+    """Get the bucket store for the current app's RATELIMIT_STORAGE_URL."""
+    global _buckets
+
+    if _buckets is None:
+        with _buckets_lock:
+            if _buckets is None:
+                url = current_app.config['RATELIMIT_STORAGE_URL']
+                if url.startswith(('redis://', 'rediss://', 'unix://')):
+                    try:
+                        _buckets = FailoverTokenBuckets(RedisTokenBuckets(url))
+                    except ImportError as e:
+                        logger.warning(f"Redis unavailable ({e}); rate limiting per process")
+                        _buckets = MemoryTokenBuckets()
+                else:
+                    _buckets = MemoryTokenBuckets()
+    return _buckets
+
+
+def client_key() -> str:
+    """The rate limit key of the requesting client: their user ID, or their address."""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        # Rejected by the view's own jwt_required; charge the address meanwhile
+        identity = None
+    return f'user:{identity}' if identity is not None else f'ip:{request.remote_addr}'
+
+
+def check_rate_limit():
+    """`before_request` hook: charge the request's cost, or answer 429 if the client can't pay it."""
+    if request.blueprint is None or request.method == 'OPTIONS':
+        return None
+
+    app_config = current_app.config
+    view = current_app.view_functions.get(request.endpoint)
+    capacity = app_config['RATELIMIT_CAPACITY']
+    rate = app_config['RATELIMIT_REFILL_RATE']
+    # A request costing more than a full bucket could never be allowed
+    cost = min(app_config[COSTS[getattr(view, 'rate_cost', 'read')]], capacity)
+
+    try:
+        allowed, _, retry_after = get_token_buckets().consume(client_key(), cost, capacity, rate)
+    except Exception as e:
+        logger.warning(f"Rate limit check failed, allowing request: {e}")
+        return None
+
+    if allowed:
+        return None
+
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({'error': 'Rate limit exceeded', 'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_rate_limiting(app) -> Optional[Callable]:
+    """Charge every blueprint request against its client's token bucket."""
+    if not app.config.get('RATELIMIT_ENABLED'):
+        return None
+
+    app.before_request(check_rate_limit)
+    return check_rate_limit
@@ -0,0 +1,293 @@
+"""Population-wide risk rescoring.
+
+Scores every active user with the current risk predictor, e.g. after a new
+model ships. Active users are read in id order, RESCORE_CHUNK_SIZE at a
+time, with their raw features from the feature store. Chunks are scored by
+a process pool, where each worker loads the model once. Each chunk is then
+written with one multi-row insert, in order.
+
+Bulk inserts bypass the session hooks, so each chunk also updates the
+users' health summary counters and risk assessment alerts itself.
+
+Progress is checkpointed to RESCORE_CHECKPOINT_PATH after every committed
+chunk. An interrupted run resumes after the last checkpointed user and
+keeps the same run timestamp. Users who already have an assessment from
+the run are skipped, so a chunk committed just before a crash is not
+written twice.
+
+Run `python rescore.py` from the repository root, or let the scheduler run
+it every RESCORE_INTERVAL seconds.
+"""
+
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import case, insert, or_, select, update
+
+from models.health import RiskAssessment, RiskCategory, SeverityLevel, UserAlert, UserHealthSummary, db
+from models.user import User
+from services.alert_rules import get_alert_rules
+from services.feature_store import FEATURE_COLUMNS, get_feature_rows
+from services.health_alerts import source_facts, sync_user_alerts
+from services.user_activity import invalidate_user_views
+
+logger = logging.getLogger(__name__)
+
+# Not the assessment endpoint's type: these are the model's own outputs, so they must
+# stay out of the risk training snapshot, which selects that type
+MODEL_TYPE = 'numerical_risk_rescoring'
+MODEL_VERSION = '1.0'
+
+# Values the assessment endpoint uses for fields a user hasn't provided
+FEATURE_DEFAULTS = {
+    'age': 30,
+    'gender_male': 0,
+    'gender_female': 0,
+    'family_history_cvd': 0,
+    'family_history_diabetes': 0,
+    'family_history_hypertension': 0,
+    'air_quality': 0,
+    'pollen_count': 0,
+    'allergies': 0,
+    'respiratory_infections': 0,
+}
+
+SCORING_COLUMNS = list(dict.fromkeys(FEATURE_COLUMNS + list(FEATURE_DEFAULTS)))
+
+RISK_LEVELS = {'high': SeverityLevel.HIGH, 'medium': SeverityLevel.MEDIUM}
+
+# The risk predictor in this process (a pool worker, or the caller when scoring in-process)
+_model = None
+
+
+def load_risk_model(runtime: str, model_path: str, export_path: str):
+    """Load the saved risk predictor, or its export for the NumPy runtime."""
+    if runtime == 'numpy':
+        from ml_models.runtime import load_runtime
+        return load_runtime(export_path)
+
+    from ml_models.numerical.risk_predictor import HealthRiskPredictor
+    return HealthRiskPredictor(model_path=model_path)
+
+
+def _init_worker(runtime: str, model_path: str, export_path: str):
+    global _model
+    _model = load_risk_model(runtime, model_path, export_path)
+
+
+def score_chunk(X: np.ndarray) -> List[Dict]:
+    """Score raw feature rows in `SCORING_COLUMNS` order with this process's model."""
+    return _model.predict_batch(pd.DataFrame(X, columns=SCORING_COLUMNS))
+
+
+def read_checkpoint(path: str) -> Optional[Dict]:
+    """Get the last run's checkpoint, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path: str, checkpoint: Dict):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.rescore.', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _chunk_features(user_ids: List[int]) -> np.ndarray:
+    X = get_feature_rows(user_ids, SCORING_COLUMNS)
+    for feature, default in FEATURE_DEFAULTS.items():
+        column = X[:, SCORING_COLUMNS.index(feature)]
+        column[np.isnan(column)] = default
+    return X
+
+
+def _already_scored(user_ids: List[int], run_at: datetime) -> set:
+    return set(db.session.scalars(select(RiskAssessment.user_id).where(
+        RiskAssessment.user_id.in_(user_ids),
+        RiskAssessment.model_type == MODEL_TYPE,
+        RiskAssessment.assessed_at == run_at
+    )))
+
+
+def write_assessments(user_ids: List[int], results: List[Dict], run_at: datetime) -> int:
+    """Bulk insert a chunk's assessments and apply their summary and alert updates (uncommitted)."""
+    now = datetime.utcnow()
+    rows = [{
+        'user_id': user_id,
+        'risk_category': RiskCategory.CHRONIC_DISEASE,
+        'risk_level': RISK_LEVELS.get(result['overall_risk'], SeverityLevel.LOW),
+        'risk_score': result['confidence'],
+        'predicted_condition': result['overall_risk'],
+        'confidence_score': result['confidence'],
+        'model_version': MODEL_VERSION,
+        'model_type': MODEL_TYPE,
+        'risk_factors': json.dumps(result['risk_scores']),
+        'recommendations': json.dumps(result['recommendations']),
+        'assessed_at': run_at,
+        'created_at': now,
+    } for user_id, result in zip(user_ids, results)]
+    if not rows:
+        return 0
+
+    db.session.execute(insert(RiskAssessment), rows)
+
+    last_assessed = UserHealthSummary.last_risk_assessment_at
+    db.session.execute(
+        update(UserHealthSummary)
+        .where(UserHealthSummary.user_id.in_(user_ids))
+        .values(
+            risk_assessment_count=UserHealthSummary.risk_assessment_count + 1,
+            last_risk_assessment_at=case(
+                (or_(last_assessed.is_(None), last_assessed < run_at), run_at), else_=last_assessed
+            ),
+            updated_at=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    # Alerts follow each user's latest assessment; users assessed since the run started keep theirs
+    rules = get_alert_rules()
+    with_alerts = set(db.session.scalars(select(UserAlert.user_id).where(
+        UserAlert.user_id.in_(user_ids), UserAlert.scope == 'risk_assessment'
+    )))
+    newer = set(db.session.scalars(select(RiskAssessment.user_id).where(
+        RiskAssessment.user_id.in_(user_ids), RiskAssessment.assessed_at > run_at
+    )))
+    with db.session.no_autoflush:
+        for row in rows:
+            if row['user_id'] in newer:
+                continue
+            assessment = RiskAssessment(**row)
+            matches = rules.evaluate('risk_assessment', source_facts('risk_assessment', assessment))
+            if matches or row['user_id'] in with_alerts:
+                sync_user_alerts(db.session, row['user_id'], 'risk_assessment', assessment, rules)
+
+    return len(rows)
+
+
+def rescore_population(force: bool = True, resume: bool = True, workers: Optional[int] = None,
+                       chunk_size: Optional[int] = None) -> Optional[Dict]:
+    """Score every active user with the current risk predictor.
+
+    Resumes an interrupted run unless `resume` is false. Without `force`,
+    does nothing if a run completed within RESCORE_INTERVAL. Returns the
+    run's statistics, or None if it was skipped.
+    """
+    app_config = current_app.config
+    workers = workers or app_config['RESCORE_WORKERS']
+    chunk_size = chunk_size or app_config['RESCORE_CHUNK_SIZE']
+    checkpoint_path = app_config['RESCORE_CHECKPOINT_PATH']
+
+    with open(f'{checkpoint_path}.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.warning("Rescoring is already running")
+            return None
+
+        checkpoint = read_checkpoint(checkpoint_path)
+        if checkpoint and checkpoint.get('completed_at'):
+            age = datetime.utcnow() - datetime.fromisoformat(checkpoint['completed_at'])
+            if not force and age.total_seconds() < app_config['RESCORE_INTERVAL']:
+                return None
+            checkpoint = None
+        if checkpoint is None or not resume:
+            checkpoint = {'run_at': datetime.utcnow().isoformat(), 'last_user_id': 0, 'scored': 0}
+        elif checkpoint['last_user_id']:
+            logger.info(f"Resuming rescoring run {checkpoint['run_at']} after user {checkpoint['last_user_id']}")
+
+        from api.predictions import MODEL_ARTIFACTS
+
+        source = (app_config['MODEL_RUNTIME'], *MODEL_ARTIFACTS['risk_predictor'])
+        _init_worker(*source)
+        if not _model.is_trained:
+            raise ValueError("No trained risk predictor to rescore with")
+
+        return _run(checkpoint, checkpoint_path, source, workers, chunk_size)
+
+
+def _run(checkpoint: Dict, checkpoint_path: str, source, workers: int, chunk_size: int) -> Dict:
+    run_at = datetime.fromisoformat(checkpoint['run_at'])
+    last_user_id = checkpoint['last_user_id']
+    check_existing = last_user_id > 0
+    started = time.monotonic()
+    scored = 0
+
+    def write(chunk_last_id, user_ids, results):
+        nonlocal scored
+        count = write_assessments(user_ids, results, run_at)
+        db.session.commit()
+        for user_id in user_ids:
+            invalidate_user_views(user_id)
+
+        scored += count
+        checkpoint['last_user_id'] = chunk_last_id
+        checkpoint['scored'] += count
+        _write_checkpoint(checkpoint_path, checkpoint)
+
+    # Spawned rather than forked: a fork copies locks held by this process's other threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker, initargs=source) if workers > 1 else nullcontext()
+    with pool:
+        pending = deque()
+        while True:
+            user_ids = list(db.session.scalars(
+                select(User.id).where(User.is_active.is_(True), User.id > last_user_id)
+                .order_by(User.id).limit(chunk_size)
+            ))
+            if not user_ids:
+                break
+            chunk_last_id = last_user_id = user_ids[-1]
+
+            if check_existing:
+                # The chunk after the checkpoint may have been committed before the run stopped
+                done = _already_scored(user_ids, run_at)
+                user_ids = [user_id for user_id in user_ids if user_id not in done]
+                check_existing = False
+
+            if not user_ids:
+                pending.append((chunk_last_id, user_ids, None))
+            elif workers > 1:
+                pending.append((chunk_last_id, user_ids, pool.submit(score_chunk, _chunk_features(user_ids))))
+            else:
+                write(chunk_last_id, user_ids, score_chunk(_chunk_features(user_ids)))
+
+            # Keep every worker busy while chunks are written in order
+            while len(pending) > (workers if workers > 1 else 0):
+                chunk_last_id, user_ids, future = pending.popleft()
+                write(chunk_last_id, user_ids, future.result() if future else [])
+
+        while pending:
+            chunk_last_id, user_ids, future = pending.popleft()
+            write(chunk_last_id, user_ids, future.result() if future else [])
+
+    elapsed = time.monotonic() - started
+    checkpoint['completed_at'] = datetime.utcnow().isoformat()
+    _write_checkpoint(checkpoint_path, checkpoint)
+
+    stats = {
+        'run_at': checkpoint['run_at'],
+        'scored': scored,
+        'total_scored': checkpoint['scored'],
+        'seconds': round(elapsed, 2),
+        'users_per_second': round(scored / elapsed, 1) if elapsed > 0 else None,
+    }
+    logger.info(f"Rescored {scored} users in {elapsed:.2f}s ({stats['users_per_second']} users/s)")
+    return stats
+
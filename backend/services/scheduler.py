@@ -0,0 +1,171 @@
+"""In-process scheduler for periodic background jobs.
+
+Jobs run one at a time on a single daemon thread, each inside an
+application context. Enable it in exactly one process per deployment
+(SCHEDULER_ENABLED) so jobs do not run once per web worker.
+"""
+
+import logging
+import random
+import threading
+import time
+from functools import partial
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A named function run every `interval` seconds."""
+
+    __slots__ = ('name', 'interval', 'fn', 'next_run')
+
+    def __init__(self, name: str, interval: float, fn: Callable, first_run: float):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.next_run = first_run
+
+
+class Scheduler:
+    """Run registered jobs periodically on a background thread."""
+
+    def __init__(self, app):
+        """Initialize the scheduler for a Flask app."""
+        self.app = app
+        self.jobs = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def add_job(self, name: str, interval: float, fn: Callable, initial_delay: Optional[float] = None):
+        """Register a job.
+
+        The first run is after `initial_delay` seconds, or a random delay of
+        up to a minute so jobs registered together don't all start at once.
+        """
+        if initial_delay is None:
+            initial_delay = random.uniform(0, min(interval, 60))
+        self.jobs[name] = Job(name, interval, fn, time.monotonic() + initial_delay)
+        self._wake.set()
+
+    def run_now(self, name: str):
+        """Run a job on the next scheduler tick."""
+        self.jobs[name].next_run = time.monotonic()
+        self._wake.set()
+
+    def start(self):
+        """Start the scheduler thread."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the scheduler thread after the current job finishes."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            jobs = list(self.jobs.values())
+            due = [job for job in jobs if job.next_run <= now]
+
+            for job in due:
+                if self._stop.is_set():
+                    return
+                self._run_job(job)
+
+            if not jobs:
+                delay = None
+            else:
+                delay = max(min(job.next_run for job in jobs) - time.monotonic(), 0)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _run_job(self, job: Job):
+        started = time.monotonic()
+        try:
+            with self.app.app_context():
+                job.fn()
+            logger.info(f"Scheduled job {job.name} finished in {time.monotonic() - started:.2f}s")
+        except Exception:
+            logger.exception(f"Scheduled job {job.name} failed")
+        finally:
+            job.next_run = started + job.interval
+
+
+_scheduler = None
+
+
+def init_scheduler(app) -> Optional[Scheduler]:
+    """Create the scheduler with the application's periodic jobs, if enabled.
+
+    The thread starts with the first request rather than here, so the
+    debug reloader's parent process (which never serves requests) doesn't
+    run jobs too.
+    """
+    global _scheduler
+
+    if not app.config.get('SCHEDULER_ENABLED'):
+        return None
+
+    if _scheduler is not None:
+        return _scheduler
+
+    from services.environmental_retention import apply_environmental_retention
+    from services.health_alerts import refresh_alert_rules
+    from services.outbreak_detection import detect_outbreaks
+    from services.task_queue import enqueue
+
+    scheduler = Scheduler(app)
+    scheduler.add_job(
+        'environmental_prefetch',
+        app.config['ENVIRONMENTAL_PREFETCH_INTERVAL'],
+        # Heavy jobs go to their task queue; they run inline in eager mode
+        partial(enqueue, 'prefetch_environmental_data'),
+        initial_delay=0
+    )
+    scheduler.add_job(
+        'environmental_retention',
+        app.config['ENVIRONMENTAL_RETENTION_INTERVAL'],
+        apply_environmental_retention
+    )
+    scheduler.add_job(
+        'alert_rules_refresh',
+        app.config['ALERT_RULES_CHECK_INTERVAL'],
+        refresh_alert_rules
+    )
+    scheduler.add_job(
+        'outbreak_detection',
+        app.config['OUTBREAK_DETECTION_INTERVAL'],
+        detect_outbreaks,
+        initial_delay=0
+    )
+    scheduler.add_job(
+        'training_snapshot',
+        app.config['TRAINING_SNAPSHOT_INTERVAL'],
+        partial(enqueue, 'append_training_snapshots')
+    )
+    scheduler.add_job(
+        'risk_rescore',
+        app.config['RESCORE_INTERVAL'],
+        partial(enqueue, 'rescore_population', force=False)
+    )
+
+    @app.before_request
+    def start_scheduler():
+        scheduler.start()
+
+    _scheduler = scheduler
+    return _scheduler
+
+
+def get_scheduler() -> Optional[Scheduler]:
+    """Get the running scheduler, if any."""
+    return _scheduler
@@ -0,0 +1,353 @@
+"""Background task queue for heavy work.
+
+Tasks are registered by name in `TASKS`, each on one of the named queues:
+
+- `training`: model training and retraining
+- `inference-batch`: population-wide rescoring
+- `ingestion`: environmental data prefetch and training snapshots
+- `analytics`: dashboard aggregation
+
+`enqueue` returns a job handle right away; `get_job` reports its state and,
+once finished, its result or error. Enqueueing a task with the same
+arguments as one that is still queued or running returns the existing job
+instead of starting another one, and adds the caller to the job's
+requesters (`user_ids`), who may all read it.
+
+With Celery, tasks go to Redis and workers run them. Results are kept in
+the Celery result backend, and job metadata and dedupe claims in Redis,
+for TASK_RESULT_TTL seconds. Start one worker per queue with
+`python -m services.task_queue worker <queue>` from the backend directory;
+its concurrency is that queue's TASK_*_CONCURRENCY setting. In eager mode
+(TASK_QUEUE_EAGER, used by the tests and by default in development) tasks
+run inline in the caller, with the same per-queue limits applied through a
+semaphore per queue. Otherwise heavy tasks never run in the caller: if the
+broker can't be reached, `enqueue` and `get_job` raise BrokerUnavailable,
+which the API answers with a 503.
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from flask import current_app, jsonify
+
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Queue -> config setting holding its concurrency limit
+QUEUES = {
+    'training': 'TASK_TRAINING_CONCURRENCY',
+    'inference-batch': 'TASK_INFERENCE_BATCH_CONCURRENCY',
+    'ingestion': 'TASK_INGESTION_CONCURRENCY',
+    'analytics': 'TASK_ANALYTICS_CONCURRENCY',
+}
+
+# Task name -> (queue, 'module:function'); functions run in an application context
+TASKS = {
+    'retrain_models': ('training', 'api.predictions:retrain'),
+    'rescore_population': ('inference-batch', 'services.rescoring:rescore_population'),
+    'prefetch_environmental_data': ('ingestion', 'services.environmental_prefetch:prefetch_environmental_data'),
+    'append_training_snapshots': ('ingestion', 'services.training_data:append_training_snapshots'),
+    'public_health_dashboard': ('analytics', 'api.dashboard:build_public_health_dashboard'),
+}
+
+# Celery states -> job states
+JOB_STATES = {
+    'PENDING': 'queued',
+    'RECEIVED': 'queued',
+    'RETRY': 'queued',
+    'STARTED': 'running',
+    'SUCCESS': 'succeeded',
+    'FAILURE': 'failed',
+    'REVOKED': 'failed',
+}
+FINISHED_STATES = ('succeeded', 'failed')
+
+# Seconds a client is asked to wait before retrying while the broker is unavailable
+BROKER_RETRY_AFTER = 30
+
+
+class BrokerUnavailable(Exception):
+    """Raised when the task broker or job store can't be reached."""
+
+
+def resolve_task(name: str):
+    """Import a registered task's function."""
+    module, function = TASKS[name][1].split(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def dedupe_key(name: str, args, kwargs) -> str:
+    """Key identifying a task call by name and arguments."""
+    payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return f'{name}:{hashlib.sha1(payload.encode()).hexdigest()}'
+
+
+class EagerTaskQueue:
+    """Run tasks inline in the caller, keeping job state in memory."""
+
+    def __init__(self, app_config):
+        """Create the per-queue semaphores and the in-memory job store."""
+        self.result_ttl = app_config['TASK_RESULT_TTL']
+        self.jobs = TTLCache(ttl=self.result_ttl)
+        self.semaphores = {queue: threading.BoundedSemaphore(app_config[setting])
+                           for queue, setting in QUEUES.items()}
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job: Dict, key: str) -> Dict:
+        """Run a job now, unless an identical one is already running; returns its handle."""
+        with self._lock:
+            running = self.jobs.get(self._claims.get(key))
+            if running is not None and running['state'] not in FINISHED_STATES:
+                running['user_ids'] = sorted(set(running['user_ids']) | set(job['user_ids']))
+                return running
+            self._claims[key] = job['id']
+            self.jobs.set(job['id'], job)
+
+        try:
+            with self.semaphores[job['queue']]:
+                job['state'] = 'running'
+                job['result'] = resolve_task(job['name'])(*job['args'], **job['kwargs'])
+            job['state'] = 'succeeded'
+        except Exception as e:
+            logger.exception(f"Task {job['name']} ({job['id']}) failed")
+            job['state'] = 'failed'
+            job['error'] = str(e)
+        finally:
+            job['finished_at'] = datetime.utcnow().isoformat()
+            with self._lock:
+                if self._claims.get(key) == job['id']:
+                    del self._claims[key]
+
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job's state, or None if it is unknown or expired."""
+        return self.jobs.get(job_id)
+
+
+# Deletes a dedupe claim only if it still belongs to the finishing job
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CeleryTaskQueue:
+    """Send tasks to Celery workers through Redis."""
+
+    def __init__(self, app_config):
+        """Configure Celery with a route and task per registered name."""
+        from celery import Celery
+        from kombu.exceptions import OperationalError
+        import redis
+
+        self.result_ttl = app_config['TASK_RESULT_TTL']
+        self.dedupe_ttl = app_config['TASK_DEDUPE_TTL']
+        self.redis = redis.Redis.from_url(app_config['REDIS_URL'], decode_responses=True)
+        self.connection_errors = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError, OperationalError)
+        self.release = self.redis.register_script(_RELEASE_SCRIPT)
+
+        self.celery = Celery('health_monitor', broker=app_config['CELERY_BROKER_URL'],
+                             backend=app_config['CELERY_RESULT_BACKEND'])
+        self.celery.conf.update(
+            task_serializer='json',
+            result_serializer='json',
+            accept_content=['json'],
+            result_expires=self.result_ttl,
+            task_track_started=True,
+            # Tasks are long; don't let one worker hold several while others idle
+            task_acks_late=True,
+            worker_prefetch_multiplier=1,
+            task_routes={name: {'queue': queue} for name, (queue, _) in TASKS.items()},
+        )
+        for name in TASKS:
+            self.celery.task(name=name, bind=True)(self._runner(name))
+
+    def _runner(self, name: str):
+        queue = self
+
+        def run(task, *args, dedupe_claim=None, **kwargs):
+            try:
+                with _flask_app().app_context():
+                    return resolve_task(name)(*args, **kwargs)
+            finally:
+                if dedupe_claim:
+                    queue.release(keys=[dedupe_claim], args=[task.request.id])
+
+        return run
+
+    def submit(self, job: Dict, key: str) -> Dict:
+        """Queue a job, unless an identical one is still queued or running; returns its handle.
+
+        Raises BrokerUnavailable if Redis or the broker can't be reached.
+        """
+        try:
+            return self._submit(job, key)
+        except self.connection_errors as e:
+            raise BrokerUnavailable(str(e)) from e
+
+    def _submit(self, job: Dict, key: str) -> Dict:
+        claim = f'task:dedupe:{key}'
+        while not self.redis.set(claim, job['id'], nx=True, ex=self.dedupe_ttl):
+            claimed_by = self.redis.get(claim)
+            existing = self.get(claimed_by) if claimed_by else None
+            if existing is not None and existing['state'] not in FINISHED_STATES:
+                self._add_requesters(existing['id'], job['user_ids'])
+                existing['user_ids'] = sorted(set(existing['user_ids']) | set(job['user_ids']))
+                return existing
+            # The claim outlived its job (e.g. a worker died before releasing it); take it over
+            if claimed_by:
+                self.release(keys=[claim], args=[claimed_by])
+
+        try:
+            self.redis.set(f"task:job:{job['id']}", json.dumps(job), ex=self.result_ttl)
+            self._add_requesters(job['id'], job['user_ids'])
+            self.celery.send_task(job['name'], args=job['args'], kwargs={**job['kwargs'], 'dedupe_claim': claim},
+                                  task_id=job['id'], queue=job['queue'])
+        except self.connection_errors:
+            self.release(keys=[claim], args=[job['id']])
+            raise
+        return job
+
+    def _add_requesters(self, job_id: str, user_ids):
+        if user_ids:
+            requesters = f'task:job:{job_id}:users'
+            self.redis.sadd(requesters, *user_ids)
+            self.redis.expire(requesters, self.result_ttl)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job's state and result from Redis, or None if it is unknown or expired.
+
+        Raises BrokerUnavailable if Redis can't be reached.
+        """
+        try:
+            stored = self.redis.get(f'task:job:{job_id}')
+            if stored is None:
+                return None
+
+            job = json.loads(stored)
+            job['user_ids'] = sorted(int(user_id) for user_id in self.redis.smembers(f'task:job:{job_id}:users'))
+            result = self.celery.AsyncResult(job_id)
+            state = result.state
+        except self.connection_errors as e:
+            raise BrokerUnavailable(str(e)) from e
+
+        job['state'] = JOB_STATES.get(state, 'queued')
+        if job['state'] == 'succeeded':
+            job['result'] = result.result
+        elif job['state'] == 'failed':
+            job['error'] = str(result.result)
+        if result.date_done and job['state'] in FINISHED_STATES:
+            job['finished_at'] = result.date_done.isoformat()
+        return job
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_app = None
+
+
+def _flask_app():
+    """The Flask app tasks run in: the current one, or the worker's."""
+    from flask import has_app_context
+    return current_app._get_current_object() if has_app_context() else _app
+
+
+def get_task_queue():
+    """Get the task queue for the current app's configuration.
+
+    Raises BrokerUnavailable if eager mode is off and Celery isn't installed.
+    """
+    global _queue
+
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                app_config = current_app.config
+                if app_config['TASK_QUEUE_EAGER']:
+                    _queue = EagerTaskQueue(app_config)
+                else:
+                    try:
+                        _queue = CeleryTaskQueue(app_config)
+                    except ImportError as e:
+                        raise BrokerUnavailable(f"Celery unavailable ({e}); install it or set TASK_QUEUE_EAGER") from e
+    return _queue
+
+
+def enqueue(name: str, *args, user_id=None, **kwargs) -> Dict:
+    """Queue a registered task; returns its job handle (the existing one for a duplicate call).
+
+    Raises BrokerUnavailable if the broker can't be reached.
+    """
+    queue_name = TASKS[name][0]
+    job = {
+        'id': uuid.uuid4().hex,
+        'name': name,
+        'queue': queue_name,
+        'state': 'queued',
+        'user_ids': [user_id] if user_id is not None else [],
+        'submitted_at': datetime.utcnow().isoformat(),
+        'args': list(args),
+        'kwargs': kwargs,
+    }
+    return get_task_queue().submit(job, dedupe_key(name, job['args'], kwargs))
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Get a job's handle with its state, and its result or error once finished.
+
+    Raises BrokerUnavailable if the job store can't be reached.
+    """
+    return get_task_queue().get(job_id)
+
+
+def broker_unavailable_response():
+    """503 response for a request that needs the unreachable broker."""
+    response = jsonify({'error': 'Task queue unavailable, try again later', 'retry_after': BROKER_RETRY_AFTER})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(BROKER_RETRY_AFTER)
+    return response
+
+
+def job_response(job: Dict) -> Dict:
+    """A job handle as returned by the API."""
+    response = {key: job[key] for key in ('id', 'name', 'queue', 'state', 'submitted_at')}
+    for key in ('finished_at', 'result', 'error'):
+        if key in job:
+            response[key] = job[key]
+    return response
+
+
+# Start a worker for one queue: python -m services.task_queue worker <queue>
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a task queue worker')
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('queue', choices=list(QUEUES))
+    args = parser.parse_args()
+
+    from app import app as _app
+
+    with _app.app_context():
+        task_queue = get_task_queue()
+        concurrency = _app.config[QUEUES[args.queue]]
+
+    if not isinstance(task_queue, CeleryTaskQueue):
+        raise SystemExit("Workers need Celery and TASK_QUEUE_EAGER disabled")
+
+    # Thread pool: tasks such as rescoring start process pools of their own
+    task_queue.celery.worker_main([
+        'worker', '--queues', args.queue, '--pool', 'threads', '--concurrency', str(concurrency),
+        '--hostname', f'{args.queue}@%h', '--loglevel', 'INFO'
+    ])
@@ -0,0 +1,296 @@
+"""Training data snapshots extracted from the production database.
+
+Labeled examples are streamed from the database in server-side cursor
+batches (`yield_per`) and appended to a Parquet snapshot per dataset under
+TRAINING_DATA_DIR. Each append writes one zstd-compressed part file, then
+advances the dataset's manifest; its watermark (timestamp and id of the
+last exported row) makes the next append read only newer rows. Training
+runs and experiments read the parts listed in the manifest instead of
+querying the database.
+
+Datasets:
+
+- `symptoms`: symptom report text, labeled with the condition of the
+  first symptom classifier assessment that followed the report within
+  SYMPTOM_LABEL_WINDOW_HOURS. Reports are only exported once that window
+  has passed, so their labels are settled.
+- `risk`: risk predictor assessments joined with the user's demographics
+  and latest health record at the time, labeled with the assessed level.
+  Its watermark follows when assessments were written (`created_at`), not
+  `assessed_at`: a rescoring run stamps every assessment with the run's
+  start, which can be behind the watermark by the time they commit.
+  Assessments are exported TRAINING_SNAPSHOT_SETTLE_MINUTES after they
+  were written, so ones still uncommitted at an append aren't skipped.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import current_app
+from sqlalchemy import and_, or_, select
+
+from models.health import HealthRecord, RiskAssessment, SymptomReport, db
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Risk levels as HealthRiskPredictor categories
+RISK_LABELS = {'low': 'low', 'medium': 'medium', 'high': 'high', 'critical': 'high'}
+
+
+def _first_symptom_assessment():
+    """Correlated subquery: the first classifier assessment at or after a report."""
+    return select(RiskAssessment.id).where(
+        RiskAssessment.user_id == SymptomReport.user_id,
+        RiskAssessment.model_type == 'nlp_symptom_classifier',
+        RiskAssessment.assessed_at >= SymptomReport.reported_at
+    ).order_by(RiskAssessment.assessed_at, RiskAssessment.id).limit(1).correlate(SymptomReport).scalar_subquery()
+
+
+def _latest_health_record():
+    """Correlated subquery: the user's latest health record at an assessment."""
+    return select(HealthRecord.id).where(
+        HealthRecord.user_id == RiskAssessment.user_id,
+        HealthRecord.recorded_at <= RiskAssessment.assessed_at
+    ).order_by(HealthRecord.recorded_at.desc(), HealthRecord.id.desc()).limit(1) \
+        .correlate(RiskAssessment).scalar_subquery()
+
+
+def _symptom_rows(rows, label_window: timedelta):
+    for row in rows:
+        if row.assessed_at - row.reported_at > label_window:
+            continue
+        yield {
+            'report_id': row.id,
+            'user_id': row.user_id,
+            'reported_at': row.reported_at,
+            'symptom_text': row.symptom_text,
+            'severity': row.severity.value if row.severity else None,
+            'duration_days': row.duration_days,
+            'air_quality_index': row.air_quality_index,
+            'assessment_id': row.assessment_id,
+            'assessed_at': row.assessed_at,
+            'label': row.predicted_condition,
+            'label_confidence': row.confidence_score,
+        }
+
+
+def _risk_rows(rows, label_window: timedelta):
+    for row in rows:
+        bmi = None
+        if row.weight and row.height:
+            bmi = row.weight / (row.height / 100) ** 2
+        yield {
+            'assessment_id': row.id,
+            'user_id': row.user_id,
+            'assessed_at': row.assessed_at,
+            'label': RISK_LABELS.get(row.risk_level.value),
+            'risk_score': row.risk_score,
+            'age': row.age,
+            'gender': row.gender,
+            'health_record_id': row.health_record_id,
+            'recorded_at': row.recorded_at,
+            'bp_systolic': row.blood_pressure_systolic,
+            'bp_diastolic': row.blood_pressure_diastolic,
+            'heart_rate': row.heart_rate,
+            'temperature': row.temperature,
+            'weight': row.weight,
+            'height': row.height,
+            'bmi': bmi,
+            'sleep_hours': row.sleep_hours,
+            'stress_level': row.stress_level,
+            'exercise_minutes': row.exercise_minutes,
+        }
+
+
+class Dataset:
+    """A labeled example stream: its query, watermark columns, row mapping and schema."""
+
+    def __init__(self, name: str, model, timestamp, query, to_rows, schema: pa.Schema, settle):
+        self.name = name
+        self.model = model
+        self.timestamp = timestamp
+        self.query = query
+        self.to_rows = to_rows
+        self.schema = schema
+        # Config -> how long after `timestamp` a row is final and can be exported
+        self.settle = settle
+
+
+DATASETS = {
+    'symptoms': Dataset(
+        'symptoms',
+        SymptomReport,
+        SymptomReport.reported_at,
+        lambda: select(
+            SymptomReport.id, SymptomReport.user_id, SymptomReport.reported_at, SymptomReport.symptom_text,
+            SymptomReport.severity, SymptomReport.duration_days, SymptomReport.air_quality_index,
+            RiskAssessment.id.label('assessment_id'), RiskAssessment.assessed_at,
+            RiskAssessment.predicted_condition, RiskAssessment.confidence_score
+        ).join(RiskAssessment, RiskAssessment.id == _first_symptom_assessment()),
+        _symptom_rows,
+        pa.schema([
+            ('report_id', pa.int64()), ('user_id', pa.int64()), ('reported_at', pa.timestamp('us')),
+            ('symptom_text', pa.string()), ('severity', pa.string()), ('duration_days', pa.int32()),
+            ('air_quality_index', pa.int32()), ('assessment_id', pa.int64()), ('assessed_at', pa.timestamp('us')),
+            ('label', pa.string()), ('label_confidence', pa.float64()),
+        ]),
+        lambda app_config: timedelta(hours=app_config['SYMPTOM_LABEL_WINDOW_HOURS'])
+    ),
+    'risk': Dataset(
+        'risk',
+        RiskAssessment,
+        RiskAssessment.created_at,
+        lambda: select(
+            RiskAssessment.id, RiskAssessment.user_id, RiskAssessment.created_at, RiskAssessment.assessed_at,
+            RiskAssessment.risk_level,
+            RiskAssessment.risk_score, User.age, User.gender, HealthRecord.id.label('health_record_id'),
+            HealthRecord.recorded_at, HealthRecord.blood_pressure_systolic, HealthRecord.blood_pressure_diastolic,
+            HealthRecord.heart_rate, HealthRecord.temperature, HealthRecord.weight, HealthRecord.height,
+            HealthRecord.sleep_hours, HealthRecord.stress_level, HealthRecord.exercise_minutes
+        ).join(User, User.id == RiskAssessment.user_id)
+         .outerjoin(HealthRecord, HealthRecord.id == _latest_health_record())
+         .where(RiskAssessment.model_type == 'numerical_risk_predictor'),
+        _risk_rows,
+        pa.schema([
+            ('assessment_id', pa.int64()), ('user_id', pa.int64()), ('assessed_at', pa.timestamp('us')),
+            ('label', pa.string()), ('risk_score', pa.float64()), ('age', pa.int32()), ('gender', pa.string()),
+            ('health_record_id', pa.int64()), ('recorded_at', pa.timestamp('us')),
+            ('bp_systolic', pa.int32()), ('bp_diastolic', pa.int32()), ('heart_rate', pa.int32()),
+            ('temperature', pa.float64()), ('weight', pa.float64()), ('height', pa.float64()),
+            ('bmi', pa.float64()), ('sleep_hours', pa.float64()), ('stress_level', pa.int32()),
+            ('exercise_minutes', pa.int32()),
+        ]),
+        lambda app_config: timedelta(minutes=app_config['TRAINING_SNAPSHOT_SETTLE_MINUTES'])
+    ),
+}
+
+
+def dataset_dir(name: str) -> str:
+    return os.path.join(current_app.config['TRAINING_DATA_DIR'], name)
+
+
+def read_manifest(name: str) -> Dict:
+    """Get a dataset's manifest; an empty one if it has no snapshot yet."""
+    try:
+        with open(os.path.join(dataset_dir(name), 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': MANIFEST_VERSION, 'dataset': name, 'watermark': None, 'rows': 0, 'parts': []}
+
+
+def _write_manifest(name: str, manifest: Dict):
+    directory = dataset_dir(name)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.manifest.', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, 'manifest.json'))
+
+
+def append_snapshot(name: str, now: Optional[datetime] = None) -> int:
+    """Append examples newer than the watermark to a dataset's snapshot; returns rows written.
+
+    Holds an exclusive file lock on the dataset, so concurrent appends from
+    other processes wait rather than write overlapping parts.
+    """
+    dataset = DATASETS[name]
+    app_config = current_app.config
+    now = now or datetime.utcnow()
+    label_window = timedelta(hours=app_config['SYMPTOM_LABEL_WINDOW_HOURS'])
+
+    directory = dataset_dir(name)
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        manifest = read_manifest(name)
+        timestamp, key = dataset.timestamp, dataset.model.id
+
+        query = dataset.query().where(timestamp < now - dataset.settle(app_config))
+        watermark = manifest['watermark']
+        if watermark:
+            since = datetime.fromisoformat(watermark['timestamp'])
+            query = query.where(or_(timestamp > since, and_(timestamp == since, key > watermark['id'])))
+        query = query.order_by(timestamp, key).execution_options(yield_per=app_config['TRAINING_SNAPSHOT_BATCH_SIZE'])
+
+        part = f"part-{len(manifest['parts']):06d}.parquet"
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{part}.', suffix='.tmp')
+        os.close(fd)
+
+        rows_written = 0
+        last = None
+        try:
+            with pq.ParquetWriter(tmp_path, dataset.schema, compression='zstd') as writer:
+                for rows in db.session.execute(query).partitions():
+                    last = rows[-1]
+                    examples = list(dataset.to_rows(rows, label_window))
+                    if examples:
+                        columns = {field: [example[field] for example in examples] for field in dataset.schema.names}
+                        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=dataset.schema))
+                        rows_written += len(examples)
+
+            if rows_written:
+                os.replace(tmp_path, os.path.join(directory, part))
+                manifest['parts'].append({'file': part, 'rows': rows_written, 'written_at': now.isoformat()})
+                manifest['rows'] += rows_written
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        # Rows skipped for lack of a label in time are settled too, so the watermark passes them
+        if last is not None:
+            manifest['watermark'] = {'timestamp': getattr(last, timestamp.key).isoformat(), 'id': last.id}
+            _write_manifest(name, manifest)
+
+    logger.info(f"Training snapshot {name}: appended {rows_written} rows ({manifest['rows']} total)")
+    return rows_written
+
+
+def append_training_snapshots() -> Dict[str, int]:
+    """Scheduled job: append new examples to every dataset's snapshot."""
+    return {name: append_snapshot(name) for name in DATASETS}
+
+
+def read_snapshot(name: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read a dataset's snapshot as a DataFrame (empty if there is none)."""
+    manifest = read_manifest(name)
+    schema = DATASETS[name].schema
+    if not manifest['parts']:
+        table = schema.empty_table()
+        return table.select(columns).to_pandas() if columns else table.to_pandas()
+
+    paths = [os.path.join(dataset_dir(name), part['file']) for part in manifest['parts']]
+    return pq.ParquetDataset(paths, schema=schema).read(columns=columns).to_pandas()
+
+
+def has_enough_examples(labels, minimum: int) -> bool:
+    """Whether labels support a stratified train/validation split of at least `minimum` examples."""
+    counts = Counter(labels)
+    return len(labels) >= minimum and len(counts) >= 2 and min(counts.values()) >= 2
+
+
+def symptom_training_set() -> Tuple[List[str], List[str]]:
+    """Symptom texts and condition labels from the snapshot."""
+    df = read_snapshot('symptoms', columns=['symptom_text', 'label']).dropna()
+    return df['symptom_text'].tolist(), df['label'].tolist()
+
+
+def risk_training_set() -> Tuple[pd.DataFrame, pd.Series]:
+    """Risk features (as raw columns for `prepare_features`) and risk labels from the snapshot."""
+    df = read_snapshot('risk').dropna(subset=['label'])
+    features = df.drop(columns=['assessment_id', 'user_id', 'assessed_at', 'label', 'risk_score',
+                                'health_record_id', 'recorded_at'])
+    # A measurement nobody has recorded yet has no median to impute; leave it out
+    return features.dropna(axis=1, how='all'), df['label']
@@ -0,0 +1,229 @@
+"""Columnar time-series engine for health trends.
+
+Trends are read as plain columns (no ORM objects) into NumPy arrays, with
+wearable samples merged into the matching series, then optionally
+resampled into hourly or daily buckets with min/mean/max and downsampled
+to a target point count with Largest-Triangle-Three-Buckets (LTTB), so
+responses stay small for minute-level wearable data over any date range.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from models.health import VITAL_METRICS, HealthRecord, VitalSample, db
+
+# Trend name -> value columns; the first column drives downsampling
+TREND_SERIES = {
+    'blood_pressure': ('blood_pressure_systolic', 'blood_pressure_diastolic'),
+    'heart_rate': ('heart_rate',),
+    'weight': ('weight',),
+    'sleep_hours': ('sleep_hours',),
+    'stress_level': ('stress_level',),
+}
+
+# Output names for multi-column series
+SERIES_FIELDS = {
+    'blood_pressure': ('systolic', 'diastolic'),
+}
+
+# Trend name -> wearable metric merged into the series
+WEARABLE_SERIES = {
+    'heart_rate': 'heart_rate',
+}
+
+RESOLUTIONS = {
+    'raw': None,
+    'hour': 3600,
+    'day': 86400,
+}
+
+_DATE_FORMATS = {
+    'raw': 'datetime64[D]',
+    'hour': 'datetime64[m]',
+    'day': 'datetime64[D]',
+}
+
+
+def load_trend_columns(user_id, start, end=None):
+    """Load recorded_at (epoch seconds) and every trend column as float arrays.
+
+    Missing values are NaN.
+    """
+    metrics = sorted({column for columns in TREND_SERIES.values() for column in columns})
+    query = select(HealthRecord.recorded_at, *[getattr(HealthRecord, metric) for metric in metrics])\
+        .where(HealthRecord.user_id == int(user_id), HealthRecord.recorded_at >= start)
+    if end is not None:
+        query = query.where(HealthRecord.recorded_at <= end)
+    query = query.order_by(HealthRecord.recorded_at)
+
+    rows = db.session.execute(query).all()
+    if not rows:
+        columns = {metric: np.empty(0) for metric in metrics}
+        return np.empty(0, dtype=np.int64), columns
+
+    transposed = list(zip(*rows))
+    timestamps = np.array(transposed[0], dtype='datetime64[s]').astype(np.int64)
+    columns = {
+        metric: np.array(values, dtype=np.float64)
+        for metric, values in zip(metrics, transposed[1:])
+    }
+    return timestamps, columns
+
+
+def load_vital_samples(user_id, metric, start, end=None):
+    """Load a wearable metric's samples as (epoch seconds, values) arrays."""
+    query = select(VitalSample.recorded_at, VitalSample.value)\
+        .where(VitalSample.user_id == int(user_id),
+               VitalSample.metric == VITAL_METRICS.index(metric),
+               VitalSample.recorded_at >= start)
+    if end is not None:
+        query = query.where(VitalSample.recorded_at <= end)
+    query = query.order_by(VitalSample.recorded_at)
+
+    rows = db.session.execute(query).all()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    recorded_at, values = zip(*rows)
+    return (np.array(recorded_at, dtype='datetime64[s]').astype(np.int64),
+            np.array(values, dtype=np.float64))
+
+
+def _merge_wearable(name, user_id, start, end, timestamps, columns):
+    """Merge a series' wearable samples with its health record values, in time order."""
+    sample_times, sample_values = load_vital_samples(user_id, WEARABLE_SERIES[name], start, end)
+    if not len(sample_times):
+        return timestamps, columns
+
+    column = TREND_SERIES[name][0]
+    merged_times = np.concatenate([timestamps, sample_times])
+    merged_values = np.concatenate([columns[column], sample_values])
+    order = np.argsort(merged_times, kind='stable')
+    return merged_times[order], {column: merged_values[order]}
+
+
+def resample(timestamps, values, bucket_seconds):
+    """Aggregate a sorted series into fixed-width buckets.
+
+    `values` is a 2-D array (points x columns). Returns bucket start times
+    and per-column min, mean and max, plus the point count per bucket.
+    """
+    buckets = timestamps // bucket_seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(timestamps)])
+
+    return {
+        'timestamps': buckets[starts] * bucket_seconds,
+        'min': np.minimum.reduceat(values, starts, axis=0),
+        'mean': np.add.reduceat(values, starts, axis=0) / counts[:, None],
+        'max': np.maximum.reduceat(values, starts, axis=0),
+        'count': counts,
+    }
+
+
+def lttb(x, y, threshold):
+    """Select indices of `threshold` points that preserve the series' visual shape.
+
+    Largest-Triangle-Three-Buckets keeps the first and last points and, for
+    each bucket in between, the point forming the largest triangle with the
+    previously selected point and the average of the next bucket.
+    """
+    n = len(x)
+    threshold = max(threshold, 3)
+    if threshold >= n:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def _format_dates(timestamps, unit):
+    dates = timestamps.astype('datetime64[s]').astype(unit)
+    return np.datetime_as_string(dates).tolist()
+
+
+def build_series(name, timestamps, columns, resolution='raw', points: Optional[int] = None):
+    """Build one trend's points from the loaded columns."""
+    metrics = TREND_SERIES[name]
+    fields = SERIES_FIELDS.get(name, ('value',))
+    values = np.column_stack([columns[metric] for metric in metrics])
+
+    # A point needs every column present and non-zero
+    valid = np.all(np.nan_to_num(values) != 0, axis=1)
+    timestamps, values = timestamps[valid], values[valid]
+    if not len(timestamps):
+        return []
+
+    bucket_seconds = RESOLUTIONS[resolution]
+    if bucket_seconds:
+        buckets = resample(timestamps, values, bucket_seconds)
+        timestamps, values = buckets['timestamps'], buckets['mean']
+        extra = {'min': buckets['min'], 'max': buckets['max']}
+        counts = buckets['count']
+    else:
+        extra = {}
+        counts = None
+
+    if points:
+        keep = lttb(timestamps, values[:, 0], points)
+        timestamps, values = timestamps[keep], values[keep]
+        extra = {key: array[keep] for key, array in extra.items()}
+        counts = counts[keep] if counts is not None else None
+
+    # Downsampled raw points keep their full timestamp so they can be plotted
+    unit = 'datetime64[s]' if resolution == 'raw' and points else _DATE_FORMATS[resolution]
+    dates = _format_dates(timestamps, unit)
+    series = []
+    for i, date in enumerate(dates):
+        point = {'date': date}
+        for j, field in enumerate(fields):
+            point[field] = round(float(values[i, j]), 2)
+            for key, array in extra.items():
+                point[f'{field}_{key}' if len(fields) > 1 else key] = round(float(array[i, j]), 2)
+        if counts is not None:
+            point['count'] = int(counts[i])
+        series.append(point)
+
+    return series
+
+
+def build_trends(user_id, start, end=None, resolution='raw', points: Optional[int] = None) -> Dict[str, list]:
+    """Build every trend series for a user over a date range.
+
+    `resolution` is 'raw', 'hour' or 'day'; `points` downsamples each
+    series to at most that many points with LTTB.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Unknown resolution: {resolution}')
+
+    timestamps, columns = load_trend_columns(user_id, start, end)
+
+    trends = {}
+    for name in TREND_SERIES:
+        series_timestamps, series_columns = timestamps, columns
+        if name in WEARABLE_SERIES:
+            series_timestamps, series_columns = _merge_wearable(name, user_id, start, end, timestamps, columns)
+        trends[name] = build_series(name, series_timestamps, series_columns, resolution, points)
+
+    return trends
@@ -0,0 +1,129 @@
+"""Single round-trip access to a user's recent activity.
+
+The overview and summary endpoints need the user's health summary row
+and the latest few health records, symptom reports and risk assessments.
+`fetch_user_activity` gets all of it in one UNION ALL query: each branch
+ranks one table's rows with ROW_NUMBER() and counts them with a window
+COUNT(*), and every branch projects every table's columns (NULL for the
+other tables) so rows can be rebuilt into transient model objects that
+serialize through the usual `to_dict()`.
+
+Built views are cached per user and dropped when that user's activity
+changes. The cache is per process: a write only drops the views held by the
+worker that committed it, so other workers can serve a view up to
+USER_VIEW_CACHE_TTL seconds old.
+"""
+
+import threading
+
+from flask import current_app
+from sqlalchemy import and_, cast, func, literal, null, or_, select, union_all
+
+from models.health import HealthRecord, SymptomReport, RiskAssessment, UserHealthSummary, db
+from models.user import User
+from services.cache import TTLCache, invalidate_on_commit
+
+# Activity source name -> (model, ordering timestamp)
+ACTIVITY_SOURCES = {
+    'health_records': (HealthRecord, HealthRecord.recorded_at),
+    'symptom_reports': (SymptomReport, SymptomReport.reported_at),
+    'risk_assessments': (RiskAssessment, RiskAssessment.assessed_at),
+    'health_summary': (UserHealthSummary, UserHealthSummary.updated_at),
+}
+
+
+def _column_label(source, column):
+    return f'{source}__{column.key}'
+
+
+def _activity_select(source, user_id):
+    """Build one UNION branch: `source` rows for the user, other columns NULL."""
+    model, timestamp = ACTIVITY_SOURCES[source]
+
+    ordering = [timestamp.desc()] + [column.desc() for column in model.__table__.primary_key.columns]
+    columns = [
+        literal(source).label('source'),
+        func.row_number().over(order_by=ordering).label('position'),
+        func.count().over().label('total')
+    ]
+
+    for other_source, (other_model, _) in ACTIVITY_SOURCES.items():
+        for column in other_model.__table__.columns:
+            label = _column_label(other_source, column)
+            if other_source == source:
+                columns.append(column.label(label))
+            else:
+                # Typed NULLs keep result processing (enums, dates) correct in every branch
+                columns.append(cast(null(), column.type).label(label))
+
+    return select(*columns).where(model.user_id == user_id)
+
+
+def fetch_user_activity(user_id, limits):
+    """Fetch recent rows and totals for each activity source in one query.
+
+    `limits` maps source names to how many recent rows to return; a limit
+    of 0 still returns the total. Returns {source: {'rows': [...], 'total': n}}.
+    """
+    user_id = int(user_id)
+    activity = union_all(*[_activity_select(source, user_id) for source in ACTIVITY_SOURCES]).subquery()
+
+    # Keep one row for sources that only need a total
+    conditions = [
+        and_(activity.c.source == source, activity.c.position <= max(limits.get(source, 0), 1))
+        for source in ACTIVITY_SOURCES
+    ]
+    query = select(activity).where(or_(*conditions))\
+        .order_by(activity.c.source, activity.c.position)
+
+    result = {source: {'rows': [], 'total': 0} for source in ACTIVITY_SOURCES}
+    for row in db.session.execute(query).mappings():
+        source = row['source']
+        model, _ = ACTIVITY_SOURCES[source]
+
+        result[source]['total'] = row['total']
+        if row['position'] <= limits.get(source, 0):
+            values = {
+                column.key: row[_column_label(source, column)]
+                for column in model.__table__.columns
+            }
+            result[source]['rows'].append(model(**values))
+
+    return result
+
+
+_view_cache = TTLCache(ttl=10)
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def invalidate_user_views(user_id):
+    """Drop every cached view for a user."""
+    with _generations_lock:
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+    _view_cache.invalidate(user_id)
+
+
+for _model, _ in ACTIVITY_SOURCES.values():
+    invalidate_on_commit(_model, lambda row: row.user_id, invalidate_user_views)
+invalidate_on_commit(User, lambda user: user.id, invalidate_user_views)
+
+
+def cached_user_view(user_id, name, builder):
+    """Get a named per-user view, building and caching it on a miss."""
+    user_id = int(user_id)
+    views = _view_cache.get(user_id) or {}
+    if name in views:
+        return views[name]
+
+    generation = _generations.get(user_id, 0)
+    value = builder()
+
+    # A write that committed while building makes the result stale; serve it but don't cache it
+    with _generations_lock:
+        if _generations.get(user_id, 0) == generation:
+            views = dict(_view_cache.get(user_id) or {})
+            views[name] = value
+            _view_cache.set(user_id, views, ttl=current_app.config['USER_VIEW_CACHE_TTL'])
+
+    return value
@@ -0,0 +1,306 @@
+"""Bulk ingestion of high-frequency wearable vitals.
+
+Devices upload batches of (timestamp, metric, value) samples either as
+NDJSON or as a packed little-endian binary array of `SAMPLE_DTYPE` records
+(13 bytes per sample). A batch is parsed straight into a NumPy structured
+array, validated with vectorized range and clock checks, de-duplicated, and
+written in bulk: COPY through a staging table on PostgreSQL, chunked
+`executemany` inserts elsewhere. Samples that already exist are skipped so
+device retries are idempotent.
+
+Run `python -m services.vitals_ingest` from the backend directory for a
+throughput benchmark.
+"""
+
+import io
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import insert, text
+
+from models.health import VITAL_METRICS, VitalSample
+
+# t: epoch milliseconds (UTC), metric: index into VITAL_METRICS, value: reading
+SAMPLE_DTYPE = np.dtype([('t', '<i8'), ('metric', 'u1'), ('value', '<f4')])
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+BINARY_CONTENT_TYPES = ('application/octet-stream', 'application/vnd.healthmonitor.vitals')
+
+# Plausible reading ranges per metric
+VITAL_RANGES = {
+    'heart_rate': (25, 250),
+    'spo2': (50, 100),
+    'respiratory_rate': (4, 60),
+    'skin_temperature': (25, 45),
+    'steps': (0, 10000),
+    'blood_pressure_systolic': (60, 260),
+    'blood_pressure_diastolic': (30, 160),
+}
+
+_LOW = np.array([VITAL_RANGES[metric][0] for metric in VITAL_METRICS], dtype=np.float32)
+_HIGH = np.array([VITAL_RANGES[metric][1] for metric in VITAL_METRICS], dtype=np.float32)
+_METRIC_CODES = {metric: code for code, metric in enumerate(VITAL_METRICS)}
+_INVALID_METRIC = 255
+
+_COLUMNS = ('user_id', 'metric', 'recorded_at', 'value')
+
+
+def parse_binary(body: bytes) -> np.ndarray:
+    """Parse a packed binary batch without copying."""
+    if len(body) % SAMPLE_DTYPE.itemsize:
+        raise ValueError(f'Binary batch length must be a multiple of {SAMPLE_DTYPE.itemsize} bytes')
+    return np.frombuffer(body, dtype=SAMPLE_DTYPE)
+
+
+def parse_ndjson(body: bytes) -> np.ndarray:
+    """Parse an NDJSON batch.
+
+    Each line is {"t": epoch_ms or "recorded_at": ISO-8601, "metric": name
+    or code, "value": number}. Lines with unknown metrics or missing values
+    are kept with an invalid metric code so validation rejects them.
+    """
+    lines = [line for line in body.splitlines() if line.strip()]
+    samples = np.zeros(len(lines), dtype=SAMPLE_DTYPE)
+    t, metric, value = samples['t'], samples['metric'], samples['value']
+
+    for i, line in enumerate(lines):
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ValueError(f'Invalid JSON on line {i + 1}')
+        if not isinstance(item, dict):
+            raise ValueError(f'Line {i + 1} is not a JSON object')
+
+        code = item.get('metric')
+        code = _METRIC_CODES.get(code, _INVALID_METRIC) if isinstance(code, str) else code
+        if not isinstance(code, int) or isinstance(code, bool) or not 0 <= code < len(VITAL_METRICS):
+            code = _INVALID_METRIC
+
+        try:
+            if 't' in item:
+                t[i] = int(item['t'])
+            else:
+                recorded_at = datetime.fromisoformat(item['recorded_at'])
+                if recorded_at.tzinfo is None:
+                    recorded_at = recorded_at.replace(tzinfo=timezone.utc)
+                t[i] = int(recorded_at.timestamp() * 1000)
+            value[i] = float(item['value'])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            code = _INVALID_METRIC
+
+        metric[i] = code
+
+    return samples
+
+
+def parse_batch(body: bytes, content_type: str) -> np.ndarray:
+    """Parse a batch according to its content type."""
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if mimetype in BINARY_CONTENT_TYPES:
+        return parse_binary(body)
+    if mimetype in NDJSON_CONTENT_TYPES:
+        return parse_ndjson(body)
+    raise ValueError('Content type must be NDJSON or application/octet-stream')
+
+
+def validate_samples(samples: np.ndarray, now_ms: int, max_age_ms: int, max_skew_ms: int) -> np.ndarray:
+    """Get a mask of samples with a known metric, an in-range value and a plausible time."""
+    metric = samples['metric']
+    value = samples['value']
+    t = samples['t']
+
+    known = metric < len(VITAL_METRICS)
+    codes = np.where(known, metric, 0)
+
+    return (
+        known
+        & np.isfinite(value)
+        & (value >= _LOW[codes])
+        & (value <= _HIGH[codes])
+        & (t >= now_ms - max_age_ms)
+        & (t <= now_ms + max_skew_ms)
+    )
+
+
+def deduplicate(samples: np.ndarray) -> np.ndarray:
+    """Drop repeated (metric, t) samples, keeping the first, sorted by metric then time."""
+    order = np.lexsort((samples['t'], samples['metric']))
+    ordered = samples[order]
+    repeated = (ordered['metric'][1:] == ordered['metric'][:-1]) & (ordered['t'][1:] == ordered['t'][:-1])
+    return ordered[np.r_[True, ~repeated]]
+
+
+_partitions = set()
+
+
+def ensure_vital_partitions(engine, samples: np.ndarray):
+    """Create the monthly PostgreSQL partitions a batch needs.
+
+    Partitions are created in their own transaction so they survive a
+    rollback of the batch that needed them.
+    """
+    months = np.unique(samples['t'].astype('datetime64[ms]').astype('datetime64[M]'))
+    missing = [month for month in months if month not in _partitions]
+    if not missing:
+        return
+
+    with engine.begin() as connection:
+        for month in missing:
+            start = np.datetime_as_string(month.astype('datetime64[D]'))
+            end = np.datetime_as_string((month + 1).astype('datetime64[D]'))
+            name = f"vital_samples_{start[:7].replace('-', '_')}"
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF vital_samples "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            ))
+
+    _partitions.update(missing)
+
+
+def _copy_samples(connection, user_id, samples: np.ndarray) -> int:
+    """Write samples with COPY into a staging table, then insert the new ones."""
+    ensure_vital_partitions(connection.engine, samples)
+
+    timestamps = np.datetime_as_string(samples['t'].astype('datetime64[ms]'))
+    buffer = io.StringIO()
+    buffer.writelines(
+        f'{user_id}\t{metric}\t{recorded_at}\t{value!r}\n'
+        for metric, recorded_at, value in zip(samples['metric'].tolist(), timestamps, samples['value'].tolist())
+    )
+    buffer.seek(0)
+
+    connection.execute(text(
+        'CREATE TEMP TABLE IF NOT EXISTS vital_samples_staging '
+        '(LIKE vital_samples INCLUDING DEFAULTS) ON COMMIT DELETE ROWS'
+    ))
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY vital_samples_staging ({', '.join(_COLUMNS)}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+    result = connection.execute(text(
+        f"INSERT INTO vital_samples ({', '.join(_COLUMNS)}) "
+        f"SELECT {', '.join(_COLUMNS)} FROM vital_samples_staging ON CONFLICT DO NOTHING"
+    ))
+    return result.rowcount
+
+
+def _insert_samples(connection, user_id, samples: np.ndarray, chunk_size: int) -> int:
+    """Write samples with chunked executemany inserts that skip existing rows."""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(VitalSample.__table__).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(VitalSample.__table__).on_conflict_do_nothing()
+    else:
+        statement = insert(VitalSample.__table__)
+
+    inserted = 0
+    for start in range(0, len(samples), chunk_size):
+        chunk = samples[start:start + chunk_size]
+        recorded_at = chunk['t'].astype('datetime64[ms]').astype(object)
+        rows = [
+            {'user_id': user_id, 'metric': metric, 'recorded_at': timestamp, 'value': value}
+            for metric, timestamp, value in zip(chunk['metric'].tolist(), recorded_at, chunk['value'].tolist())
+        ]
+        result = connection.execute(statement, rows)
+        inserted += max(result.rowcount, 0)
+
+    return inserted
+
+
+def write_samples(connection, user_id, samples: np.ndarray, chunk_size: int = 10000) -> int:
+    """Bulk write samples for a user, returning how many new rows were stored."""
+    if not len(samples):
+        return 0
+
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        return _copy_samples(connection, int(user_id), samples)
+
+    return _insert_samples(connection, int(user_id), samples, chunk_size)
+
+
+def ingest_samples(connection, user_id, samples: np.ndarray, max_age_days: int = 30,
+                   max_skew_seconds: int = 300, chunk_size: int = 10000) -> Dict:
+    """Validate, de-duplicate and store a parsed batch."""
+    now_ms = int(time.time() * 1000)
+    valid = validate_samples(samples, now_ms, max_age_days * 86400 * 1000, max_skew_seconds * 1000)
+    unique = deduplicate(samples[valid])
+    stored = write_samples(connection, user_id, unique, chunk_size)
+
+    return {
+        'received': int(len(samples)),
+        'rejected': int(len(samples) - valid.sum()),
+        'duplicates': int(valid.sum() - stored),
+        'stored': int(stored)
+    }
+
+
+def ingest_vitals(user_id, body: bytes, content_type: str) -> Dict:
+    """Ingest an uploaded batch for a user within the current request's transaction."""
+    from flask import current_app
+    from models.health import db
+
+    app_config = current_app.config
+    samples = parse_batch(body, content_type)
+    if len(samples) > app_config['VITALS_MAX_BATCH_SAMPLES']:
+        raise ValueError(f"Batch exceeds {app_config['VITALS_MAX_BATCH_SAMPLES']} samples")
+
+    result = ingest_samples(
+        db.session.connection(), user_id, samples,
+        max_age_days=app_config['VITALS_MAX_AGE_DAYS'],
+        max_skew_seconds=app_config['VITALS_MAX_CLOCK_SKEW_SECONDS'],
+        chunk_size=app_config['VITALS_INSERT_CHUNK_SIZE']
+    )
+    db.session.commit()
+    return result
+
+
+# Ingestion throughput benchmark
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import Column, Integer, Table, create_engine
+
+    parser = argparse.ArgumentParser(description='Throughput benchmark for vitals ingestion')
+    parser.add_argument('--database-url', default='sqlite://')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--format', choices=['binary', 'ndjson'], default='binary')
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if 'users' not in VitalSample.metadata.tables:
+        # Minimal target for the user_id foreign key when models.user is not loaded
+        Table('users', VitalSample.metadata, Column('id', Integer, primary_key=True))
+    VitalSample.metadata.create_all(engine, tables=[VitalSample.metadata.tables['users'], VitalSample.__table__])
+    rng = np.random.default_rng(42)
+
+    for user_id, size in enumerate(args.sizes, start=1):
+        # One sample per second per metric, ending now
+        samples = np.zeros(size, dtype=SAMPLE_DTYPE)
+        samples['metric'] = rng.integers(0, 2, size)
+        samples['t'] = int(time.time() * 1000) - np.arange(size)[::-1] * 1000
+        samples['value'] = np.where(samples['metric'] == 0, rng.normal(72, 8, size), rng.normal(97, 1.5, size))
+
+        if args.format == 'binary':
+            body, content_type = samples.tobytes(), 'application/octet-stream'
+        else:
+            body = '\n'.join(
+                json.dumps({'t': int(t), 'metric': VITAL_METRICS[m], 'value': float(v)})
+                for t, m, v in samples.tolist()
+            ).encode()
+            content_type = 'application/x-ndjson'
+
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            result = ingest_samples(connection, user_id, parse_batch(body, content_type))
+        elapsed = time.perf_counter() - started
+
+        print(f"{size:>8,} samples ({len(body) / 1024:,.0f} KiB {args.format}): "
+              f"{elapsed * 1000:,.0f} ms, {size / elapsed:,.0f} samples/s, {result}")
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import flask_sqlalchemy
+import pytest
+
+# Tests import backend modules the way the app does, from the backend directory, and
+# the models from the repository root
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.dirname(BACKEND_DIR)]
+
+# Each models module creates its own SQLAlchemy() but a Flask app can only register
+# one; hand them all the same instance so every model lives on the test app
+_db = flask_sqlalchemy.SQLAlchemy()
+flask_sqlalchemy.SQLAlchemy = lambda *args, **kwargs: _db
+
+
+@pytest.fixture
+def db():
+    return _db
+
+
+@pytest.fixture
+def app(db):
+    """A Flask app with the testing config on an empty in-memory database."""
+    from flask import Flask
+
+    from config.config import TestingConfig
+    import models.user  # noqa: F401
+    import models.health  # noqa: F401
+
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create and save users."""
+    from models.user import User
+
+    def make_user(email='user@example.com', **fields):
+        user = User(email=email, first_name='Test', last_name='User', **fields)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make_user
@@ -0,0 +1,144 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import environmental_providers
+from services.environmental_providers import (
+    CircuitBreaker, Provider, ProviderClient, ProviderError, ProviderUnavailable,
+    build_air_quality_request, build_weather_request, parse_air_quality, parse_weather
+)
+from services.mock_providers import MockProviderServer
+
+
+@pytest.fixture
+def server():
+    with MockProviderServer() as server:
+        yield server
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of sleeping; jitter always picks its upper bound."""
+    recorded = []
+    monkeypatch.setattr(environmental_providers, 'time', SimpleNamespace(monotonic=time.monotonic,
+                                                                         sleep=recorded.append))
+    monkeypatch.setattr(environmental_providers, 'random', SimpleNamespace(uniform=lambda low, high: high))
+    return recorded
+
+
+def weather_provider(server, **kwargs):
+    return Provider('openweathermap', server.url, 'key', build_weather_request, parse_weather, **kwargs)
+
+
+def test_fetch_parses_response(server):
+    data = weather_provider(server).fetch(location='Boston')
+
+    assert data['temperature'] == 22.5
+    assert data['wind_direction'] == 'SW'
+    assert server.requests == 1
+
+
+def test_retries_transient_failures_with_exponential_backoff(server, sleeps):
+    server.failure_rate = 1.0
+    provider = weather_provider(server, max_retries=3, backoff=0.1)
+
+    with pytest.raises(ProviderError):
+        provider.fetch(location='Boston')
+
+    assert server.requests == 4
+    assert sleeps == pytest.approx([0.1, 0.2, 0.4])
+
+
+def test_client_errors_are_not_retried(server, sleeps):
+    server.failure_rate, server.failure_status = 1.0, 401
+    provider = weather_provider(server, max_retries=3)
+
+    with pytest.raises(ProviderError):
+        provider.fetch(location='Boston')
+
+    assert server.requests == 1
+    assert sleeps == []
+
+
+def test_breaker_opens_then_half_opens_and_closes(server, sleeps):
+    server.failure_rate = 1.0
+    provider = weather_provider(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1))
+
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            provider.fetch(location='Boston')
+    assert provider.breaker.state == 'open'
+
+    with pytest.raises(ProviderUnavailable):
+        provider.fetch(location='Boston')
+    assert server.requests == 2
+
+    time.sleep(0.15)
+    assert provider.breaker.state == 'half_open'
+
+    server.failure_rate = 0.0
+    provider.fetch(location='Boston')
+    assert provider.breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_breaker(server, sleeps):
+    server.failure_rate = 1.0
+    provider = weather_provider(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+
+    with pytest.raises(ProviderError):
+        provider.fetch(location='Boston')
+    time.sleep(0.15)
+
+    with pytest.raises(ProviderError):
+        provider.fetch(location='Boston')
+    assert provider.breaker.state == 'open'
+
+
+def test_invalid_request_does_not_touch_breaker(server):
+    provider = Provider('airvisual', server.url, 'key', build_air_quality_request, parse_air_quality,
+                        breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            provider.fetch(location='Boston')
+
+    assert provider.breaker.state == 'closed'
+    assert server.requests == 0
+    assert provider.fetch(latitude=42.36, longitude=-71.06)['aqi'] == 85
+
+
+def test_unexpected_parse_error_releases_half_open_trial(server, sleeps):
+    def parse(payload):
+        raise RuntimeError('unexpected payload')
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    provider = Provider('openweathermap', server.url, 'key', build_weather_request, parse,
+                        max_retries=0, breaker=breaker)
+
+    with pytest.raises(ProviderError):
+        provider.fetch(location='Boston')
+    time.sleep(0.15)
+    with pytest.raises(ProviderError):
+        provider.fetch(location='Boston')
+
+    # The trial was released, so another one is allowed after the next reset timeout
+    time.sleep(0.15)
+    assert breaker.allow()
+
+
+def test_fetch_all_reports_failed_sources_as_none(server, sleeps):
+    def parse(payload):
+        raise RuntimeError('unexpected payload')
+
+    client = ProviderClient({
+        'weather': weather_provider(server),
+        'broken': Provider('broken', server.url, 'key', build_weather_request, parse, max_retries=0),
+        'air_quality': Provider('airvisual', server.url, 'key', build_air_quality_request, parse_air_quality),
+        'disabled': Provider('disabled', server.url, '', build_weather_request, parse_weather),
+    })
+
+    results = client.fetch_all(location='Boston', deadline=5)
+
+    assert results['weather']['temperature'] == 22.5
+    assert results == {**results, 'broken': None, 'air_quality': None, 'disabled': None}
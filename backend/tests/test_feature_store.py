@@ -0,0 +1,43 @@
+import pytest
+
+from services import feature_store
+from services.feature_store import get_feature_matrix, get_user_features, refresh_feature_store
+
+
+@pytest.fixture(autouse=True)
+def cold_store(monkeypatch):
+    for name, value in [('_table', None), ('_loaded_on', None), ('_synced_at', None), ('_stale', set())]:
+        monkeypatch.setattr(feature_store, name, value)
+
+
+@pytest.fixture
+def users(app, make_user):
+    return [make_user(email=f'user{i}@example.com', age=40 + i) for i in range(3)]
+
+
+def test_cold_start_loads_only_requested_users(users):
+    assert get_user_features(users[1].id)['age'] == 41
+    assert len(feature_store._table) == 1
+    assert feature_store._loaded_on is None
+
+
+def test_build_replaces_cold_table(users):
+    get_user_features(users[0].id)
+    refresh_feature_store()
+
+    user_ids, matrix = get_feature_matrix(['age'])
+    assert sorted(user_ids.tolist()) == [user.id for user in users]
+    assert sorted(matrix[:, 0].tolist()) == [40, 41, 42]
+
+
+def test_matrix_builds_full_table_when_cold(users):
+    user_ids, _ = get_feature_matrix()
+    assert len(user_ids) == 3
+
+
+def test_commit_reloads_row_on_next_read(db, users):
+    refresh_feature_store()
+    users[2].age = 70
+    db.session.commit()
+
+    assert get_user_features(users[2].id)['age'] == 70
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services.geo import EARTH_RADIUS_KM, KDTree, StationIndex, chord_to_km, km_to_chord, unit_vectors
+
+
+def great_circle_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@pytest.mark.parametrize('count', [1, 15, 17, 1000])
+def test_tree_matches_brute_force(count):
+    rng = np.random.default_rng(count)
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    longitudes = rng.uniform(-180, 180, count)
+    tree = KDTree(unit_vectors(latitudes, longitudes))
+
+    for latitude, longitude in zip(np.degrees(np.arcsin(rng.uniform(-1, 1, 50))), rng.uniform(-180, 180, 50)):
+        distances = great_circle_km(latitude, longitude, latitudes, longitudes)
+        position, chord = tree.nearest(unit_vectors([latitude], [longitude])[0])
+
+        assert position == int(np.argmin(distances))
+        assert chord_to_km(chord) == pytest.approx(distances.min(), abs=1e-6)
+
+
+def test_tree_respects_radius():
+    # Across the antimeridian: 179.9E and 179.9W are ~22 km apart
+    tree = KDTree(unit_vectors([0.0], [179.9]))
+    query = unit_vectors([0.0], [-179.9])[0]
+
+    position, chord = tree.nearest(query, km_to_chord(25))
+    assert position == 0
+    assert chord_to_km(chord) == pytest.approx(22.24, abs=0.01)
+    assert tree.nearest(query, km_to_chord(20)) is None
+    assert KDTree(np.empty((0, 3))).nearest(query) is None
+
+
+def test_station_index_returns_nearest_recent_row(app, db):
+    from models.health import EnvironmentalData
+
+    now = datetime.utcnow()
+    rows = [
+        EnvironmentalData(location='Boston', latitude=42.36, longitude=-71.06, recorded_at=now),
+        EnvironmentalData(location='Cambridge', latitude=42.37, longitude=-71.11, recorded_at=now),
+        EnvironmentalData(location='Old Boston', latitude=42.35, longitude=-71.05,
+                          recorded_at=now - timedelta(hours=2)),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+
+    index = StationIndex(max_age_seconds=3600)
+    row_id, distance_km = index.nearest(42.355, -71.05, radius_km=5)
+
+    assert len(index) == 2
+    assert row_id == rows[0].id
+    assert distance_km == pytest.approx(great_circle_km(42.355, -71.05, 42.36, -71.06), rel=1e-9)
+    assert index.nearest(40.71, -74.0, radius_km=5) is None
@@ -0,0 +1,43 @@
+import pytest
+
+from models.health import AlertRulesState, HealthRecord, UserAlert
+from services.health_alerts import get_user_alerts, refresh_alert_rules
+
+
+@pytest.fixture
+def user(app, make_user):
+    return make_user()
+
+
+def rule_ids(user):
+    return [alert['rule_id'] for alert in get_user_alerts(user.id)]
+
+
+def test_alerts_follow_latest_record(db, user):
+    db.session.add(HealthRecord(user_id=user.id, blood_pressure_systolic=150, heart_rate=110))
+    db.session.commit()
+    assert rule_ids(user) == ['high_blood_pressure', 'elevated_heart_rate']
+
+    db.session.add(HealthRecord(user_id=user.id, blood_pressure_systolic=120, heart_rate=110))
+    db.session.commit()
+    assert rule_ids(user) == ['elevated_heart_rate']
+
+    record = HealthRecord.query.filter_by(user_id=user.id, blood_pressure_systolic=120).one()
+    db.session.delete(record)
+    db.session.commit()
+    assert rule_ids(user) == ['high_blood_pressure', 'elevated_heart_rate']
+
+
+def test_refresh_persists_evaluated_version(db, user):
+    db.session.add(HealthRecord(user_id=user.id, blood_pressure_systolic=150))
+    db.session.commit()
+
+    # Alerts lost outside the write path are restored by the first evaluation
+    UserAlert.query.delete()
+    db.session.commit()
+    assert refresh_alert_rules() == 1
+    assert rule_ids(user) == ['high_blood_pressure']
+
+    version = db.session.get(AlertRulesState, 1).evaluated_version
+    assert refresh_alert_rules() == 0
+    assert db.session.get(AlertRulesState, 1).evaluated_version == version
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.health import HealthRecord, SeverityLevel, SymptomReport, UserHealthSummary
+from services.health_summary import rebuild_user_summary, summary_statistics
+
+
+@pytest.fixture
+def user(app, make_user):
+    return make_user()
+
+
+def snapshot(summary):
+    return {
+        'health_record_count': summary.health_record_count,
+        'symptom_report_count': summary.symptom_report_count,
+        'latest_vitals': summary.get_latest_vitals(),
+        'statistics': summary_statistics(summary),
+    }
+
+
+def test_summary_follows_writes(db, user):
+    now = datetime.utcnow()
+    records = [HealthRecord(user_id=user.id, heart_rate=rate, weight=70.0 + i,
+                            recorded_at=now - timedelta(days=10 - i))
+               for i, rate in enumerate([60, 72, 85, 90, 64])]
+    db.session.add_all(records)
+    db.session.add(SymptomReport(user_id=user.id, symptom_text='cough', severity=SeverityLevel.LOW))
+    db.session.commit()
+
+    summary = db.session.get(UserHealthSummary, user.id)
+    assert summary.health_record_count == 5
+    assert summary.symptom_report_count == 1
+    assert summary_statistics(summary)['all_time']['heart_rate']['mean'] == 74.2
+
+    records[1].heart_rate = 100
+    db.session.delete(records[4])
+    db.session.commit()
+
+    incremental = snapshot(db.session.get(UserHealthSummary, user.id))
+    assert incremental['health_record_count'] == 4
+    assert incremental['latest_vitals']['heart_rate'] == 90
+
+    # Maintained on write, the summary matches one rebuilt from the full history
+    assert incremental == snapshot(rebuild_user_summary(user.id))
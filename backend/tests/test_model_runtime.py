@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml_models.runtime import load_runtime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = {'numpy': {}, 'compact': {'compact': True}}
+
+SYMPTOM_TEXTS = [
+    "Running nose, cough, and fever for 3 days",
+    "Severe headache with nausea and sensitivity to light",
+    "Chest pain and shortness of breath when climbing stairs",
+    "Itchy eyes and sneezing every morning",
+]
+
+
+@pytest.fixture(scope='module')
+def risk_predictor():
+    from ml_models.numerical.risk_predictor import HealthRiskPredictor
+
+    predictor = HealthRiskPredictor()
+    predictor.train()
+    return predictor
+
+
+@pytest.fixture(scope='module')
+def symptom_classifier():
+    from ml_models.nlp.symptom_classifier import SymptomClassifier
+
+    classifier = SymptomClassifier()
+    classifier.train()
+    return classifier
+
+
+@pytest.fixture(scope='module')
+def patients(risk_predictor):
+    data = risk_predictor.generate_synthetic_data(50)
+    return data.drop(columns=['risk_category', 'cv_risk_score', 'diabetes_risk_score']).to_dict('records')
+
+
+def risk_outputs(outputs):
+    return ([output['overall_risk'] for output in outputs],
+            np.array([list(output['all_probabilities'].values()) + list(output['risk_scores'].values())
+                      for output in outputs]))
+
+
+@pytest.mark.parametrize('variant', VARIANTS)
+def test_risk_runtime_matches_sklearn(risk_predictor, patients, tmp_path, variant):
+    path = str(tmp_path / 'risk_predictor.npz')
+    risk_predictor.export(path, **VARIANTS[variant])
+    runtime = load_runtime(path)
+
+    expected, expected_probabilities = risk_outputs([risk_predictor.predict(patient) for patient in patients])
+    predicted, probabilities = risk_outputs([runtime.predict(patient) for patient in patients])
+
+    assert predicted == expected
+    assert np.abs(probabilities - expected_probabilities).max() < 1e-9
+
+
+@pytest.mark.parametrize('variant', VARIANTS)
+def test_symptom_runtime_matches_sklearn(symptom_classifier, tmp_path, variant):
+    path = str(tmp_path / 'symptom_classifier.npz')
+    symptom_classifier.export(path, **VARIANTS[variant])
+    runtime = load_runtime(path)
+
+    for text in SYMPTOM_TEXTS:
+        expected, output = symptom_classifier.predict(text), runtime.predict(text)
+        assert output['predicted_condition'] == expected['predicted_condition']
+        assert np.allclose(list(output['all_probabilities'].values()),
+                           list(expected['all_probabilities'].values()), atol=1e-9)
+
+
+def most_likely(probabilities):
+    return max(probabilities, key=probabilities.get)
+
+
+def test_predicted_label_is_most_likely_calibrated_class(risk_predictor, symptom_classifier, patients, tmp_path):
+    risk_path, symptom_path = str(tmp_path / 'risk_predictor.npz'), str(tmp_path / 'symptom_classifier.npz')
+    risk_predictor.export(risk_path)
+    symptom_classifier.export(symptom_path)
+
+    for model in (risk_predictor, load_runtime(risk_path)):
+        outputs = [model.predict(patient) for patient in patients] + model.predict_batch(pd.DataFrame(patients))
+        for output in outputs:
+            assert output['overall_risk'] == most_likely(output['all_probabilities'])
+            assert output['confidence'] == max(output['all_probabilities'].values())
+
+    for model in (symptom_classifier, load_runtime(symptom_path)):
+        for text in SYMPTOM_TEXTS:
+            output = model.predict(text)
+            assert output['predicted_condition'] == most_likely(output['all_probabilities'])
+
+
+def test_numpy_runtime_serves_without_sklearn(risk_predictor, patients, tmp_path):
+    path = str(tmp_path / 'risk_predictor.npz')
+    risk_predictor.export(path)
+
+    # A fresh interpreter importing the request-serving modules and predicting with the export
+    script = (
+        "import json, sys\n"
+        "import api.dashboard, api.environmental, api.health, api.jobs\n"
+        "from ml_models.runtime import load_runtime\n"
+        f"load_runtime({path!r}).predict(json.loads({json.dumps(patients[0], default=float)!r}))\n"
+        "print(json.dumps(sorted(name for name in sys.modules if name.split('.')[0] == 'sklearn')))\n"
+    )
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join([BACKEND_DIR, os.path.dirname(BACKEND_DIR)])}
+    output = subprocess.run([sys.executable, '-c', script], cwd=str(tmp_path), env=env,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert json.loads(output.strip().splitlines()[-1]) == []
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import outbreak_detection
+from services.outbreak_detection import detect_outbreaks, recent_outbreak_alerts
+
+
+@pytest.fixture(autouse=True)
+def fresh_detector(monkeypatch):
+    monkeypatch.setattr(outbreak_detection, '_detector', None)
+    monkeypatch.setattr(outbreak_detection, '_read_until', None)
+    monkeypatch.setattr(outbreak_detection, '_recent_ids', {})
+
+
+@pytest.fixture
+def report(app, db, make_user):
+    from models.health import SeverityLevel, SymptomReport
+
+    user = make_user()
+
+    def report(reported_at, location='Springfield', count=1):
+        for _ in range(count):
+            db.session.add(SymptomReport(user_id=user.id, symptom_text='cough', severity=SeverityLevel.LOW,
+                                         location=location, reported_at=reported_at))
+        db.session.commit()
+
+    return report
+
+
+def open_count(location='springfield', category='respiratory'):
+    return outbreak_detection._detector._buckets[(location, category)].count
+
+
+def test_spike_raises_one_stored_alert(report):
+    now = datetime.utcnow()
+    for days_ago in range(30, 1, -1):
+        report(now - timedelta(days=days_ago), count=2)
+    report(now - timedelta(days=1), count=20)
+    report(now)
+
+    alerts = detect_outbreaks()
+
+    assert [(alert['category'], alert['observed']) for alert in alerts] == [('respiratory', 20)]
+    assert recent_outbreak_alerts('springfield ') == alerts
+    assert recent_outbreak_alerts('Shelbyville') == []
+
+    # A restarted detector replays the same history without storing the alert twice
+    outbreak_detection._detector = None
+    detect_outbreaks()
+    assert len(recent_outbreak_alerts()) == 1
+
+
+def test_reports_are_counted_once(report):
+    now = datetime.utcnow()
+    report(now - timedelta(minutes=1))
+    detect_outbreaks()
+    assert open_count() == 1
+
+    # Still inside the late-commit window, so read again but not counted again
+    report(now)
+    detect_outbreaks()
+    assert open_count() == 2
+
+    detect_outbreaks()
+    assert open_count() == 2
+
+
+def test_late_committed_report_is_counted(report):
+    now = datetime.utcnow()
+    detect_outbreaks()
+
+    # Saved with a timestamp before the last run, committed after it
+    report(now - timedelta(minutes=1))
+    detect_outbreaks()
+    assert open_count() == 1
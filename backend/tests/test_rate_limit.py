@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Blueprint, Flask
+
+from services import rate_limit
+from services.rate_limit import FailoverTokenBuckets, MemoryTokenBuckets, init_rate_limiting, rate_cost
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(rate_limit, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_bucket_spends_and_refills(clock):
+    buckets = MemoryTokenBuckets()
+
+    assert buckets.consume('a', 6, capacity=10, rate=2) == (True, 4, 0)
+    assert buckets.consume('a', 6, capacity=10, rate=2) == (False, 4, 1.0)
+    # Other clients have buckets of their own
+    assert buckets.consume('b', 10, capacity=10, rate=2) == (True, 0, 0)
+
+    clock.now += 1
+    assert buckets.consume('a', 6, capacity=10, rate=2) == (True, 0, 0)
+
+    # Refills stop at capacity
+    clock.now += 60
+    assert buckets.consume('a', 1, capacity=10, rate=2) == (True, 9, 0)
+
+
+def test_unknown_cost_class_is_rejected():
+    assert rate_cost('inference')(lambda: None).rate_cost == 'inference'
+    with pytest.raises(ValueError):
+        rate_cost('expensive')
+
+
+class DownStore:
+    connection_errors = (ConnectionError,)
+
+    def __init__(self):
+        self.calls = 0
+        self.down = True
+
+    def consume(self, key, cost, capacity, rate):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError('connection refused')
+        return True, capacity - cost, 0.0
+
+
+def test_unreachable_store_falls_back_to_local_buckets(clock):
+    shared = DownStore()
+    buckets = FailoverTokenBuckets(shared)
+
+    # Still limited while the store is down, and not retried on every request
+    assert buckets.consume('a', 6, capacity=10, rate=1)[0]
+    assert not buckets.consume('a', 6, capacity=10, rate=1)[0]
+    assert shared.calls == 1
+
+    # Each failed retry doubles the wait before the next
+    clock.now += rate_limit._MIN_RETRY_INTERVAL
+    buckets.consume('a', 1, capacity=10, rate=1)
+    assert shared.calls == 2
+    clock.now += rate_limit._MIN_RETRY_INTERVAL
+    buckets.consume('a', 1, capacity=10, rate=1)
+    assert shared.calls == 2
+
+    shared.down = False
+    clock.now += rate_limit._MIN_RETRY_INTERVAL
+    assert buckets.consume('a', 1, capacity=10, rate=1) == (True, 9, 0.0)
+    assert buckets.consume('a', 1, capacity=10, rate=1) == (True, 9, 0.0)
+    assert shared.calls == 4
+
+
+@pytest.fixture
+def client(monkeypatch, clock):
+    from config.config import TestingConfig
+
+    monkeypatch.setattr(rate_limit, '_buckets', None)
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config.update(RATELIMIT_ENABLED=True, RATELIMIT_CAPACITY=10, RATELIMIT_REFILL_RATE=0.5,
+                      RATELIMIT_READ_COST=1, RATELIMIT_INFERENCE_COST=4)
+
+    bp = Blueprint('limited', __name__)
+    bp.add_url_rule('/read', 'read', lambda: 'ok')
+    bp.add_url_rule('/predict', 'predict', rate_cost('inference')(lambda: 'ok'))
+    app.register_blueprint(bp)
+    app.add_url_rule('/health', 'health', lambda: 'ok')
+    init_rate_limiting(app)
+    return app.test_client()
+
+
+def test_request_over_budget_gets_429(client):
+    assert [client.get('/predict').status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get('/read').status_code == 200
+
+    response = client.get('/predict')
+    assert response.status_code == 429
+    # One token left, three more at 0.5 a second
+    assert response.headers['Retry-After'] == '6'
+    assert response.get_json()['retry_after'] == 6
+
+    # Routes outside blueprints aren't charged
+    assert client.get('/health').status_code == 200
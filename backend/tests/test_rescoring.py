@@ -0,0 +1,78 @@
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from models.health import RiskAssessment, UserHealthSummary
+from services import feature_store, rescoring
+from services.rescoring import read_checkpoint
+
+
+@pytest.fixture(scope='module')
+def model_source(tmp_path_factory):
+    from ml_models.numerical.risk_predictor import HealthRiskPredictor
+
+    directory = tmp_path_factory.mktemp('models')
+    predictor = HealthRiskPredictor()
+    predictor.train()
+    predictor.save_model(str(directory / 'risk_predictor.pkl'))
+    return ('sklearn', str(directory / 'risk_predictor.pkl'), str(directory / 'risk_predictor.npz'))
+
+
+@pytest.fixture
+def users(app, make_user, model_source, monkeypatch):
+    monkeypatch.setattr(feature_store, '_table', None)
+    monkeypatch.setattr(feature_store, '_stale', set())
+    rescoring._init_worker(*model_source)
+    return [make_user(email=f'user{i}@example.com', age=30 + i) for i in range(7)]
+
+
+def new_checkpoint():
+    return {'run_at': datetime.utcnow().replace(microsecond=0).isoformat(), 'last_user_id': 0, 'scored': 0}
+
+
+def assessments_per_user(run_at):
+    rows = RiskAssessment.query.filter_by(assessed_at=datetime.fromisoformat(run_at)).all()
+    return Counter(row.user_id for row in rows)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rescore_scores_every_user_once(users, model_source, tmp_path, workers):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = new_checkpoint()
+
+    stats = rescoring._run(checkpoint, path, model_source, workers, chunk_size=3)
+
+    assert stats['scored'] == len(users)
+    assert assessments_per_user(checkpoint['run_at']) == {user.id: 1 for user in users}
+    assert read_checkpoint(path)['completed_at']
+    assert all(summary.risk_assessment_count == 1 for summary in UserHealthSummary.query)
+
+
+def test_resume_after_crash_between_commit_and_checkpoint(users, model_source, tmp_path, monkeypatch):
+    path = str(tmp_path / 'checkpoint.json')
+    checkpoint = new_checkpoint()
+    write_checkpoint = rescoring._write_checkpoint
+    writes = []
+
+    def crash_on_second_chunk(path, checkpoint):
+        writes.append(checkpoint['last_user_id'])
+        if len(writes) == 2:
+            raise RuntimeError('killed')
+        write_checkpoint(path, checkpoint)
+
+    monkeypatch.setattr(rescoring, '_write_checkpoint', crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        rescoring._run(checkpoint, path, model_source, 1, chunk_size=3)
+    monkeypatch.setattr(rescoring, '_write_checkpoint', write_checkpoint)
+
+    # The second chunk committed, but the checkpoint stops after the first
+    resumed = read_checkpoint(path)
+    assert resumed['last_user_id'] == users[2].id
+    assert len(assessments_per_user(resumed['run_at'])) == 6
+
+    stats = rescoring._run(resumed, path, model_source, 1, chunk_size=3)
+
+    assert stats['run_at'] == checkpoint['run_at']
+    assert stats['scored'] == 1
+    assert assessments_per_user(checkpoint['run_at']) == {user.id: 1 for user in users}
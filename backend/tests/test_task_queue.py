@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from services import task_queue
+from services.task_queue import BrokerUnavailable, enqueue, get_job
+
+
+@pytest.fixture
+def tasks(app, monkeypatch):
+    """Run registered task names with test functions instead of their real ones."""
+    functions = {}
+    monkeypatch.setattr(task_queue, '_queue', None)
+    monkeypatch.setattr(task_queue, 'resolve_task', lambda name: functions[name])
+    # Create the eager queue here, where the app context is
+    task_queue.get_task_queue()
+    return functions
+
+
+def test_duplicate_call_joins_running_job(tasks):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def rescore(force=True):
+        calls.append(force)
+        started.set()
+        release.wait(5)
+        return {'scored': 3}
+
+    tasks['rescore_population'] = rescore
+    first = {}
+    runner = threading.Thread(target=lambda: first.update(enqueue('rescore_population', user_id=1)))
+    runner.start()
+    assert started.wait(5)
+
+    duplicate = enqueue('rescore_population', user_id=2)
+    assert duplicate['state'] == 'running'
+    assert duplicate['user_ids'] == [1, 2]
+
+    release.set()
+    runner.join(5)
+    assert first['id'] == duplicate['id']
+    assert calls == [True]
+    assert get_job(first['id'])['result'] == {'scored': 3}
+
+    # Finished jobs aren't joined; the same call runs again
+    assert enqueue('rescore_population', user_id=2)['id'] != first['id']
+    assert calls == [True, True]
+
+
+def test_failed_task_is_recorded(tasks):
+    def retrain(source):
+        raise ValueError(f'no {source} data')
+
+    tasks['retrain_models'] = retrain
+    job = enqueue('retrain_models', 'snapshot', user_id=1)
+
+    assert job['state'] == 'failed'
+    assert job['error'] == 'no snapshot data'
+    assert 'finished_at' in job
+
+
+def test_unreachable_broker_is_not_run_inline(tasks, monkeypatch):
+    class DownQueue:
+        def submit(self, job, key):
+            raise BrokerUnavailable('connection refused')
+
+        def get(self, job_id):
+            raise BrokerUnavailable('connection refused')
+
+    tasks['rescore_population'] = lambda **kwargs: pytest.fail('ran inline')
+    monkeypatch.setattr(task_queue, '_queue', DownQueue())
+
+    with pytest.raises(BrokerUnavailable):
+        enqueue('rescore_population', user_id=1)
+    with pytest.raises(BrokerUnavailable):
+        get_job('missing')
+
+    response = task_queue.broker_unavailable_response()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(task_queue.BROKER_RETRY_AFTER)
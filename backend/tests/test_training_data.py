@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.health import RiskAssessment, RiskCategory, SeverityLevel, SymptomReport
+from services import rescoring
+from services.training_data import append_snapshot, read_manifest, read_snapshot
+
+
+@pytest.fixture
+def user(app, make_user, tmp_path):
+    app.config['TRAINING_DATA_DIR'] = str(tmp_path)
+    return make_user()
+
+
+def assessment(user, created_at, assessed_at=None, model_type='numerical_risk_predictor', **fields):
+    return RiskAssessment(user_id=user.id, risk_category=RiskCategory.CHRONIC_DISEASE,
+                          risk_level=SeverityLevel.MEDIUM, risk_score=0.5, model_type=model_type,
+                          assessed_at=assessed_at or created_at, created_at=created_at, **fields)
+
+
+def test_risk_watermark_follows_write_time(db, user):
+    start = datetime(2026, 1, 1, 12, 0)
+    db.session.add(assessment(user, start))
+    db.session.commit()
+    assert append_snapshot('risk', now=start + timedelta(minutes=20)) == 1
+
+    # A rescoring run stamps assessments with its start, behind the watermark by now
+    db.session.add(assessment(user, created_at=start + timedelta(minutes=25), assessed_at=start - timedelta(hours=1)))
+    db.session.commit()
+
+    # Not exported until it has settled, then exported rather than skipped
+    assert append_snapshot('risk', now=start + timedelta(minutes=30)) == 0
+    assert append_snapshot('risk', now=start + timedelta(minutes=40)) == 1
+    assert append_snapshot('risk', now=start + timedelta(minutes=50)) == 0
+
+    snapshot = read_snapshot('risk')
+    assert len(snapshot) == 2
+    assert snapshot['label'].tolist() == ['medium', 'medium']
+    assert read_manifest('risk')['rows'] == 2
+
+
+def test_rescoring_assessments_are_not_labels(db, user):
+    start = datetime(2026, 1, 1, 12, 0)
+    db.session.add(assessment(user, start, model_type=rescoring.MODEL_TYPE))
+    db.session.commit()
+
+    assert append_snapshot('risk', now=start + timedelta(hours=1)) == 0
+
+
+def test_symptoms_wait_for_their_label(db, user):
+    reported_at = datetime(2026, 1, 1, 12, 0)
+    db.session.add(SymptomReport(user_id=user.id, symptom_text='cough and fever', severity=SeverityLevel.LOW,
+                                 reported_at=reported_at))
+    db.session.add(assessment(user, reported_at + timedelta(minutes=1), model_type='nlp_symptom_classifier',
+                              predicted_condition='common_cold'))
+    db.session.commit()
+
+    assert append_snapshot('symptoms', now=reported_at + timedelta(hours=1)) == 0
+    assert append_snapshot('symptoms', now=reported_at + timedelta(hours=25)) == 1
+    assert read_snapshot('symptoms', columns=['label'])['label'].tolist() == ['common_cold']
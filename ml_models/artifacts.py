@@ -0,0 +1,41 @@
+"""Model artifact files.
+
+Artifacts are written to a temporary file in the destination directory and
+renamed over the destination, so a reader (another worker loading the
+model, or a concurrent save) only ever sees a complete file.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+import joblib
+
+
+@contextmanager
+def atomic_write(path: str):
+    """Open a binary file that replaces `path` atomically when the block exits cleanly."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file owner-only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_dump(data, path: str):
+    """Serialize `data` to `path` with joblib, replacing it atomically."""
+    with atomic_write(path) as f:
+        joblib.dump(data, f)
@@ -0,0 +1,67 @@
+"""Probability calibration as precomputed interpolation tables.
+
+A `CalibrationTable` holds one isotonic map per class, fitted on held-out
+(or out-of-bag) predictions and sampled onto a uniform probability grid.
+Applying it is a gather and a linear blend over an (n_classes, grid)
+array, followed by renormalization across classes, so calibrating a
+single row or a batch costs a few vectorized NumPy operations. Only
+`fit` needs scikit-learn; the runtime applies stored tables as they are.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+
+class CalibrationTable:
+    """Per-class calibration maps sampled on a uniform grid over [0, 1]."""
+
+    def __init__(self, table):
+        """Wrap an (n_classes, grid_size) table of calibrated values."""
+        self.table = np.asarray(table, dtype=np.float64)
+        self.classes = np.arange(self.table.shape[0])
+        self.steps = self.table.shape[1] - 1
+
+    @classmethod
+    def fit(cls, probabilities: np.ndarray, labels: np.ndarray, grid_size: int = 1001) -> 'CalibrationTable':
+        """Fit isotonic maps (one-vs-rest) from predicted probabilities and class column indices."""
+        from sklearn.isotonic import IsotonicRegression
+
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        labels = np.asarray(labels)
+        grid = np.linspace(0.0, 1.0, grid_size)
+
+        table = np.empty((probabilities.shape[1], grid_size))
+        for k in range(probabilities.shape[1]):
+            target = (labels == k).astype(float)
+            if target.min() == target.max():
+                # Nothing to learn from a class that is always or never present
+                table[k] = grid
+                continue
+            isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip')
+            table[k] = isotonic.fit(probabilities[:, k], target).predict(grid)
+
+        return cls(table)
+
+    def transform(self, probabilities: np.ndarray) -> np.ndarray:
+        """Calibrate probabilities of shape (n_classes,) or (n_samples, n_classes); rows sum to one."""
+        position = np.clip(np.asarray(probabilities, dtype=np.float64), 0.0, 1.0) * self.steps
+        index = np.minimum(position.astype(np.intp), self.steps - 1)
+        weight = position - index
+
+        lower = self.table[self.classes, index]
+        calibrated = lower + (self.table[self.classes, index + 1] - lower) * weight
+
+        total = calibrated.sum(axis=-1, keepdims=True)
+        return np.divide(calibrated, total, out=np.full_like(calibrated, 1.0 / len(self.classes)),
+                         where=total > 0)
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Arrays to store the table under `prefix`."""
+        return {f'{prefix}.table': self.table}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'CalibrationTable':
+        """Read the table stored under `prefix`, or None if there is none."""
+        key = f'{prefix}.table'
+        return cls(arrays[key]) if key in arrays else None
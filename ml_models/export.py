@@ -0,0 +1,364 @@
+"""Export trained models for the NumPy runtime.
+
+Flattens the fitted scikit-learn objects of a `HealthRiskPredictor` or
+`SymptomClassifier` into arrays and a JSON header, written as one `.npz`
+file that `ml_models.runtime.load_runtime` executes without scikit-learn.
+"""
+
+import json
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from ml_models.artifacts import atomic_write
+from ml_models.runtime import FORMAT_VERSION, TreeEnsemble
+
+
+def tree_arrays(estimator, normalize: bool = False):
+    """Node arrays of a fitted scikit-learn tree, with leaves pointing to themselves.
+
+    With `normalize`, leaf values are turned into class probabilities as
+    in `DecisionTreeClassifier.predict_proba`.
+    """
+    tree = estimator.tree_
+    nodes = np.arange(tree.node_count)
+    leaf = tree.children_left == -1
+
+    value = tree.value[:, 0, :]
+    if normalize:
+        total = value.sum(axis=1, keepdims=True)
+        value = value / np.where(total == 0, 1.0, total)
+
+    return (np.where(leaf, nodes, tree.children_left), np.where(leaf, nodes, tree.children_right),
+            np.where(leaf, 0, tree.feature), np.where(leaf, 0.0, tree.threshold), value)
+
+
+def collapse_subtrees(left, right, feature, threshold, value, tolerance: float = 0.0):
+    """Merge sibling leaves whose values differ by at most `tolerance`, bottom-up.
+
+    With a zero tolerance predictions are unchanged; otherwise a merged
+    leaf takes the midpoint of its children, off by at most tolerance / 2.
+    Returns the reachable nodes renumbered in preorder, and the depth.
+    """
+    left, right, value = left.copy(), right.copy(), value.copy()
+
+    # Range of the original leaf values under each merged leaf
+    low, high = value.copy(), value.copy()
+
+    # Children always have higher indices than their parent
+    for node in range(len(left) - 1, -1, -1):
+        l, r = left[node], right[node]
+        if l == node or left[l] != l or left[r] != r:
+            continue
+        node_low, node_high = np.minimum(low[l], low[r]), np.maximum(high[l], high[r])
+        if (node_high - node_low).max() <= tolerance:
+            low[node], high[node] = node_low, node_high
+            value[node] = (node_low + node_high) / 2
+            left[node] = right[node] = node
+
+    order, depths, stack = [], [], [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        order.append(node)
+        depths.append(depth)
+        if left[node] != node:
+            stack.extend([(right[node], depth + 1), (left[node], depth + 1)])
+
+    order = np.array(order)
+    index = np.zeros(len(left), dtype=np.int64)
+    index[order] = np.arange(len(order))
+    return (index[left[order]], index[right[order]], feature[order], threshold[order], value[order]), max(depths)
+
+
+def pack_trees(trees: Sequence, normalize: bool = False, tolerance: Optional[float] = None) -> TreeEnsemble:
+    """Pack fitted scikit-learn decision trees into flat node arrays.
+
+    With a `tolerance`, sibling leaves closer than it are merged first
+    (see `collapse_subtrees`).
+    """
+    packed = [[], [], [], [], []]
+    roots = []
+    offset = 0
+    max_depth = 0
+    for estimator in trees:
+        arrays = tree_arrays(estimator, normalize)
+        depth = estimator.tree_.max_depth
+        if tolerance is not None:
+            arrays, depth = collapse_subtrees(*arrays, tolerance=tolerance)
+
+        left, right, feature, threshold, value = arrays
+        for column, array in zip(packed, (left + offset, right + offset, feature, threshold, value)):
+            column.append(array)
+
+        roots.append(offset)
+        offset += len(left)
+        max_depth = max(max_depth, depth)
+
+    left, right, feature, threshold, value = (np.concatenate(column) for column in packed)
+    return TreeEnsemble(left.astype(np.int32), right.astype(np.int32), feature.astype(np.int32),
+                        threshold.astype(np.float64), value.astype(np.float64),
+                        np.array(roots, dtype=np.int32), max_depth)
+
+
+def compact_ensemble(ensemble: TreeEnsemble, feature_map: Optional[np.ndarray] = None) -> TreeEnsemble:
+    """Store an ensemble in float32 with the narrowest index types.
+
+    Thresholds are rounded down to float32, which keeps every split
+    unchanged since features are compared as float32. `feature_map`
+    renumbers feature columns (after dropping unused ones).
+    """
+    threshold = ensemble.threshold.astype(np.float32)
+    above = threshold.astype(np.float64) > ensemble.threshold
+    threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+
+    feature = ensemble.feature if feature_map is None else feature_map[ensemble.feature]
+    node_type = np.min_scalar_type(len(ensemble.left))
+    feature_type = np.min_scalar_type(max(int(feature.max(initial=0)), 1))
+
+    return TreeEnsemble(ensemble.left.astype(node_type), ensemble.right.astype(node_type),
+                        feature.astype(feature_type), threshold, ensemble.value.astype(np.float32),
+                        ensemble.roots.astype(node_type), ensemble.depth)
+
+
+def write_export(path: str, header: Dict, arrays: Dict[str, np.ndarray]):
+    """Write an exported model file atomically."""
+    header = dict(header, format_version=FORMAT_VERSION)
+    with atomic_write(path) as f:
+        np.savez(f, header=np.array(json.dumps(header)), **arrays)
+
+
+def export_risk_predictor(predictor, path: str, compact: bool = False, prune_tolerance: float = 0.0):
+    """Export a trained `HealthRiskPredictor`.
+
+    `compact` stores the trees in float32 with merged redundant leaves.
+    A positive `prune_tolerance` also merges leaves closer than it and
+    drops boosting stages whose contribution never varies by more than it,
+    folding their midpoint into the initial prediction.
+    """
+    if not predictor.is_trained:
+        raise ValueError("Model must be trained before exporting")
+
+    model = predictor.model
+    n_classes = model.estimators_.shape[1]
+
+    # Initial raw prediction: the decision function minus every tree's contribution
+    zero = np.zeros((1, model.n_features_in_))
+    contributions = np.array([
+        sum(tree.predict(zero)[0] for tree in model.estimators_[:, k]) for k in range(n_classes)
+    ])
+    init = model.decision_function(zero).reshape(-1) - model.learning_rate * contributions
+
+    trees, outputs = [], []
+    for stage in model.estimators_:
+        for k, tree in enumerate(stage):
+            leaves = tree.tree_.value[tree.tree_.children_left == -1, 0, 0]
+            if prune_tolerance > 0 and model.learning_rate * np.ptp(leaves) / 2 <= prune_tolerance:
+                init[k] += model.learning_rate * (leaves.max() + leaves.min()) / 2
+                continue
+            trees.append(tree)
+            outputs.append(k)
+
+    tolerance = prune_tolerance / model.learning_rate if compact or prune_tolerance > 0 else None
+    ensemble = pack_trees(trees, tolerance=tolerance)
+    if compact:
+        ensemble = compact_ensemble(ensemble)
+
+    header = {
+        'kind': 'risk_predictor',
+        'feature_names': list(predictor.feature_names),
+        'classes': [str(label) for label in predictor.label_encoder.classes_[model.classes_]],
+        'learning_rate': float(model.learning_rate),
+        'high_risk_thresholds': {
+            condition: spec['high_risk_threshold'] for condition, spec in predictor.risk_categories.items()
+        },
+        'conditions': [],
+        'condition_feature_names': [],
+        'compact': compact,
+        'prune_tolerance': prune_tolerance,
+        'pruned_trees': model.estimators_.size - len(trees),
+    }
+    arrays = {
+        'features.medians': predictor.imputer.statistics_,
+        'features.means': predictor.scaler.mean_,
+        'features.scales': predictor.scaler.scale_,
+        'gbm.init': init,
+        'gbm.outputs': np.array(outputs, dtype=np.min_scalar_type(n_classes)),
+        **ensemble.to_arrays('gbm'),
+    }
+    if predictor.calibration is not None:
+        arrays.update(predictor.calibration.to_arrays('calibration'))
+
+    condition_model = predictor.condition_model
+    if condition_model.is_trained:
+        header['conditions'] = list(condition_model.conditions)
+        header['condition_feature_names'] = list(condition_model.feature_names)
+        arrays.update({
+            'conditions.medians': condition_model.medians,
+            'conditions.means': condition_model.means,
+            'conditions.scales': condition_model.scales,
+            'conditions.coef': condition_model.coef,
+            'conditions.intercept': condition_model.intercept,
+        })
+
+    write_export(path, header, arrays)
+
+
+def export_symptom_classifier(classifier, path: str, compact: bool = False, prune_tolerance: float = 0.0):
+    """Export a trained `SymptomClassifier`.
+
+    `compact` stores the forest in float32 with merged redundant leaves,
+    and only materializes the TF-IDF columns that some split uses; the
+    other terms are kept for the row norm alone. A positive
+    `prune_tolerance` also merges leaves whose class probabilities differ
+    by at most it.
+    """
+    if not classifier.is_trained:
+        raise ValueError("Model must be trained before exporting")
+
+    vectorizer = classifier.vectorizer
+    if vectorizer.analyzer != 'word' or vectorizer.preprocessor or vectorizer.tokenizer or vectorizer.strip_accents:
+        raise ValueError("Only word analyzers with the default preprocessing can be exported")
+
+    vocabulary = vectorizer.vocabulary_
+    estimators = classifier.classifier.estimators_
+    tolerance = prune_tolerance if compact or prune_tolerance > 0 else None
+    ensemble = pack_trees(estimators, normalize=True, tolerance=tolerance)
+
+    columns = np.arange(len(vocabulary))
+    if compact:
+        used = np.zeros(len(vocabulary), dtype=bool)
+        used[ensemble.feature[ensemble.left != np.arange(len(ensemble.left))]] = True
+        columns = np.where(used, np.cumsum(used) - 1, -1)
+        # Leaves never read their feature, so unused columns may map anywhere
+        ensemble = compact_ensemble(ensemble, feature_map=np.maximum(columns, 0))
+
+    header = {
+        'kind': 'symptom_classifier',
+        'classes': [str(label) for label in classifier.label_encoder.classes_[classifier.classifier.classes_]],
+        'symptom_categories': classifier.symptom_categories,
+        'lemmatize': classifier.nlp is not None,
+        'token_pattern': vectorizer.token_pattern,
+        'ngram_range': list(vectorizer.ngram_range),
+        'lowercase': bool(vectorizer.lowercase),
+        'sublinear_tf': bool(vectorizer.sublinear_tf),
+        'norm': vectorizer.norm,
+        'compact': compact,
+        'prune_tolerance': prune_tolerance,
+    }
+    arrays = {
+        'tfidf.terms': np.array(sorted(vocabulary, key=vocabulary.get)),
+        'tfidf.idf': vectorizer.idf_ if vectorizer.use_idf else np.ones(len(vocabulary)),
+        'tfidf.columns': columns.astype(np.int32),
+        'tfidf.stop_words': np.array(sorted(vectorizer.get_stop_words() or []), dtype=str),
+        **ensemble.to_arrays('forest'),
+    }
+    if classifier.calibration is not None:
+        arrays.update(classifier.calibration.to_arrays('calibration'))
+
+    write_export(path, header, arrays)
+
+
+# Parity and accuracy against scikit-learn per export variant, then worker cold start, RSS and artifact size
+# Run from the repository root: python -m ml_models.export
+if __name__ == "__main__":
+    import argparse
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    from ml_models.nlp.symptom_classifier import SymptomClassifier
+    from ml_models.numerical.risk_predictor import HealthRiskPredictor
+    from ml_models.runtime import load_runtime
+
+    parser = argparse.ArgumentParser(description='Export models and compare the NumPy runtime with scikit-learn')
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--prune-tolerance', type=float, default=0.01)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    variants = {
+        'numpy': {},
+        'compact': {'compact': True},
+        'pruned': {'compact': True, 'prune_tolerance': args.prune_tolerance},
+    }
+
+    predictor = HealthRiskPredictor()
+    predictor.train()
+    classifier = SymptomClassifier()
+    classifier.train()
+    models = {'risk_predictor': predictor, 'symptom_classifier': classifier}
+
+    paths = {}
+    for kind, model in models.items():
+        paths[kind, 'sklearn'] = os.path.join(directory, f'{kind}.pkl')
+        model.save_model(paths[kind, 'sklearn'])
+        for variant, options in variants.items():
+            paths[kind, variant] = os.path.join(directory, f'{kind}.{variant}.npz')
+            model.export(paths[kind, variant], **options)
+
+    # Evaluation sets: synthetic patients and symptom texts with their labels
+    patients = predictor.generate_synthetic_data(args.samples).sample(frac=1.0, random_state=7)
+    risk_labels = patients['risk_category'].tolist()
+    patients = patients.drop(columns=['risk_category', 'cv_risk_score', 'diabetes_risk_score']).to_dict('records')
+    symptoms = classifier.create_training_data().sample(n=args.samples, replace=True, random_state=7)
+    symptom_labels = symptoms['disease'].tolist()
+    texts = symptoms['symptom_text'].tolist()
+
+    def evaluate(kind, model):
+        if kind == 'risk_predictor':
+            outputs = [model.predict(patient) for patient in patients]
+            predicted = [output['overall_risk'] for output in outputs]
+            probabilities = np.array([list(output['all_probabilities'].values()) + list(output['risk_scores'].values())
+                                      for output in outputs])
+            return predicted, probabilities, risk_labels
+        outputs = [model.predict(text) for text in texts]
+        predicted = [output['predicted_condition'] for output in outputs]
+        probabilities = np.array([list(output['all_probabilities'].values()) for output in outputs])
+        return predicted, probabilities, symptom_labels
+
+    print(f"\n{'model':<20}{'variant':<10}{'accuracy':>10}{'delta':>9}{'agree':>8}{'max |diff|':>12}")
+    for kind, model in models.items():
+        expected, expected_probabilities, labels = evaluate(kind, model)
+        accuracy = np.mean(np.array(expected) == np.array(labels))
+        print(f"{kind:<20}{'sklearn':<10}{accuracy:>10.4f}")
+        for variant in variants:
+            predicted, probabilities, _ = evaluate(kind, load_runtime(paths[kind, variant]))
+            variant_accuracy = np.mean(np.array(predicted) == np.array(labels))
+            agree = np.mean(np.array(predicted) == np.array(expected))
+            diff = np.abs(probabilities - expected_probabilities).max()
+            print(f"{kind:<20}{variant:<10}{variant_accuracy:>10.4f}{variant_accuracy - accuracy:>+9.4f}"
+                  f"{agree:>8.3f}{diff:>12.2e}")
+
+    # Cold start and peak RSS of a fresh worker loading each artifact and predicting once
+    loaders = {
+        'risk_predictor': "from ml_models.numerical.risk_predictor import HealthRiskPredictor as M; m = M(model_path=path)",
+        'symptom_classifier': "from ml_models.nlp.symptom_classifier import SymptomClassifier as M; m = M(model_path=path)",
+    }
+    inputs = {'risk_predictor': patients[0], 'symptom_classifier': "Running nose, cough, and fever for 3 days"}
+
+    print(f"\n{'model':<20}{'variant':<10}{'cold start':>12}{'peak RSS':>12}{'artifact':>12}  sklearn imported")
+    for kind, variant in paths:
+        if variant == 'sklearn':
+            load = loaders[kind]
+        else:
+            load = "from ml_models.runtime import load_runtime; m = load_runtime(path)"
+        script = (
+            "import contextlib, io, json, resource, sys, time\n"
+            f"path, sample = {paths[kind, variant]!r}, json.loads({json.dumps(inputs[kind], default=lambda v: v.item())!r})\n"
+            "started = time.perf_counter()\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            f"    {load}; m.predict(sample)\n"
+            "seconds = time.perf_counter() - started\n"
+            # ru_maxrss survives exec on Linux, so prefer this process's own high-water mark
+            "try:\n"
+            "    status = open('/proc/self/status').read()\n"
+            "    rss_mb = int(status.split('VmHWM:')[1].split()[0]) / 1024\n"
+            "except (OSError, IndexError):\n"
+            "    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n"
+            "print(json.dumps([seconds, rss_mb, 'sklearn' in sys.modules]))\n"
+        )
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+        seconds, rss_mb, sklearn_imported = json.loads(output.strip().splitlines()[-1])
+        size_mb = os.path.getsize(paths[kind, variant]) / 1e6
+        print(f"{kind:<20}{variant:<10}{seconds * 1000:>9.0f} ms{rss_mb:>9.1f} MB{size_mb:>9.2f} MB  {sklearn_imported}")
@@ -0,0 +1,37 @@
+"""Symptom category keywords shared by the NLP classifier and the backend.
+
+Kept free of spaCy/scikit-learn imports so lightweight consumers (outbreak
+detection, analytics) can categorize symptom text without loading models.
+"""
+
+from typing import Dict, List
+
+# Symptom categories mapping
+SYMPTOM_CATEGORIES: Dict[str, List[str]] = {
+    'respiratory': ['cough', 'shortness of breath', 'chest pain', 'wheezing',
+                    'sore throat', 'runny nose', 'congestion', 'sneezing'],
+    'gastrointestinal': ['nausea', 'vomiting', 'diarrhea', 'constipation',
+                         'abdominal pain', 'bloating', 'heartburn', 'loss of appetite'],
+    'neurological': ['headache', 'dizziness', 'confusion', 'memory loss',
+                     'seizures', 'numbness', 'tingling', 'weakness'],
+    'cardiovascular': ['chest pain', 'palpitations', 'irregular heartbeat',
+                       'swelling', 'shortness of breath', 'fainting'],
+    'musculoskeletal': ['joint pain', 'muscle aches', 'back pain',
+                        'stiffness', 'swelling', 'limited mobility'],
+    'dermatological': ['rash', 'itching', 'skin changes', 'bruising',
+                       'hair loss', 'nail changes'],
+    'systemic': ['fever', 'chills', 'fatigue', 'weight loss', 'weight gain',
+                 'night sweats', 'general malaise']
+}
+
+
+def match_categories(text: str) -> List[str]:
+    """Return every symptom category with a keyword present in the text."""
+    if not text:
+        return []
+
+    text = text.lower()
+    return [
+        category for category, keywords in SYMPTOM_CATEGORIES.items()
+        if any(keyword in text for keyword in keywords)
+    ]
@@ -7,11 +7,15 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, accuracy_score
 from sklearn.preprocessing import LabelEncoder
 import joblib
-import spacy
-import re
 from typing import List, Dict, Tuple
 import os
 
+from ml_models.artifacts import atomic_dump
+from ml_models.calibration import CalibrationTable
+from ml_models.export import export_symptom_classifier
+from ml_models.nlp.symptom_categories import SYMPTOM_CATEGORIES
+from ml_models.nlp.text_processing import categorize_symptoms, extract_symptoms, load_nlp, preprocess_text
+
 class SymptomClassifier:
     """NLP-based symptom classifier for health monitoring."""
     
@@ -27,35 +31,20 @@ class SymptomClassifier:
         self.classifier = RandomForestClassifier(
             n_estimators=100,
             random_state=42,
-            class_weight='balanced'
+            class_weight='balanced',
+            oob_score=True
         )
         self.label_encoder = LabelEncoder()
+        self.calibration = None
         self.is_trained = False
         self.model_path = model_path
         
         # Load spaCy model for text preprocessing
-        try:
-            self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            print("Warning: spaCy model not found. Using basic preprocessing.")
-            self.nlp = None
+        self.nlp = load_nlp()
         
         # Symptom categories mapping
         self.symptom_categories = {
-            'respiratory': ['cough', 'shortness of breath', 'chest pain', 'wheezing', 
-                           'sore throat', 'runny nose', 'congestion', 'sneezing'],
-            'gastrointestinal': ['nausea', 'vomiting', 'diarrhea', 'constipation', 
-                               'abdominal pain', 'bloating', 'heartburn', 'loss of appetite'],
-            'neurological': ['headache', 'dizziness', 'confusion', 'memory loss', 
-                           'seizures', 'numbness', 'tingling', 'weakness'],
-            'cardiovascular': ['chest pain', 'palpitations', 'irregular heartbeat', 
-                             'swelling', 'shortness of breath', 'fainting'],
-            'musculoskeletal': ['joint pain', 'muscle aches', 'back pain', 
-                              'stiffness', 'swelling', 'limited mobility'],
-            'dermatological': ['rash', 'itching', 'skin changes', 'bruising', 
-                             'hair loss', 'nail changes'],
-            'systemic': ['fever', 'chills', 'fatigue', 'weight loss', 'weight gain', 
-                        'night sweats', 'general malaise']
+            category: list(keywords) for category, keywords in SYMPTOM_CATEGORIES.items()
         }
         
         # Load pre-trained model if path provided
@@ -64,68 +53,15 @@ class SymptomClassifier:
     
     def preprocess_text(self, text: str) -> str:
         """Preprocess symptom text."""
-        if not text:
-            return ""
-        
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove special characters and numbers
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-        
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
-        # Use spaCy for advanced preprocessing if available
-        if self.nlp:
-            doc = self.nlp(text)
-            tokens = [token.lemma_ for token in doc if not token.is_stop and not token.is_punct]
-            text = ' '.join(tokens)
-        
-        return text
+        return preprocess_text(text, self.nlp)
     
     def extract_symptoms(self, text: str) -> List[str]:
         """Extract individual symptoms from text."""
-        text = self.preprocess_text(text)
-        
-        # Split by common separators
-        symptoms = []
-        for separator in [',', ';', ' and ', ' or ', '\n']:
-            if separator in text:
-                symptoms.extend(text.split(separator))
-                break
-        else:
-            symptoms = [text]
-        
-        # Clean and filter symptoms
-        cleaned_symptoms = []
-        for symptom in symptoms:
-            symptom = symptom.strip()
-            if symptom and len(symptom) > 2:
-                cleaned_symptoms.append(symptom)
-        
-        return cleaned_symptoms
+        return extract_symptoms(text, self.nlp)
     
     def categorize_symptoms(self, symptoms: List[str]) -> Dict[str, List[str]]:
         """Categorize symptoms into body systems."""
-        categorized = {category: [] for category in self.symptom_categories.keys()}
-        
-        for symptom in symptoms:
-            symptom_lower = symptom.lower()
-            for category, keywords in self.symptom_categories.items():
-                if any(keyword in symptom_lower for keyword in keywords):
-                    categorized[category].append(symptom)
-                    break
-            else:
-                # If no category found, add to 'other'
-                if 'other' not in categorized:
-                    categorized['other'] = []
-                categorized['other'].append(symptom)
-        
-        # Remove empty categories
-        categorized = {k: v for k, v in categorized.items() if v}
-        
-        return categorized
+        return categorize_symptoms(symptoms, self.symptom_categories)
     
     def create_training_data(self) -> pd.DataFrame:
         """Create synthetic training data for symptom classification."""
@@ -165,7 +101,14 @@ class SymptomClassifier:
         return pd.DataFrame(training_data)
     
     def train(self, X_train: List[str] = None, y_train: List[str] = None):
-        """Train the symptom classifier."""
+        """Train the symptom classifier.
+        
+        A trained classifier is read-only so it can be shared between
+        threads; to retrain, train a new instance and swap it in.
+        """
+        if self.is_trained:
+            raise ValueError("Model is already trained; train a new instance instead")
+        
         if X_train is None or y_train is None:
             # Use synthetic data if no training data provided
             df = self.create_training_data()
@@ -183,6 +126,14 @@ class SymptomClassifier:
         
         # Train classifier
         self.classifier.fit(X_train_vectorized, y_train_encoded)
+        
+        # Calibrate on out-of-bag probabilities; samples in every bootstrap have none
+        oob_probabilities = self.classifier.oob_decision_function_
+        has_oob = np.isfinite(oob_probabilities).all(axis=1)
+        self.calibration = CalibrationTable.fit(
+            oob_probabilities[has_oob],
+            np.searchsorted(self.classifier.classes_, y_train_encoded[has_oob])
+        )
         self.is_trained = True
         
         print("Training completed successfully!")
@@ -206,12 +157,18 @@ class SymptomClassifier:
         text_vectorized = self.vectorizer.transform([processed_text])
         
         # Predict
-        prediction = self.classifier.predict(text_vectorized)[0]
         probability = self.classifier.predict_proba(text_vectorized)[0]
         
+        # Calibrated probabilities (raw ones for models saved without calibration)
+        if self.calibration is not None:
+            probability = self.calibration.transform(probability)
+        
+        # The most likely condition after calibration, so it agrees with the reported probabilities
+        predicted = np.argmax(probability)
+        
         # Get prediction details
-        predicted_disease = self.label_encoder.inverse_transform([prediction])[0]
-        confidence = np.max(probability)
+        predicted_disease = self.label_encoder.classes_[self.classifier.classes_[predicted]]
+        confidence = probability[predicted]
         
         # Extract and categorize symptoms
         symptoms = self.extract_symptoms(symptom_text)
@@ -240,15 +197,22 @@ class SymptomClassifier:
             'vectorizer': self.vectorizer,
             'classifier': self.classifier,
             'label_encoder': self.label_encoder,
+            'calibration': self.calibration,
             'is_trained': self.is_trained
         }
         
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        
-        joblib.dump(model_data, path)
+        # Write to a temporary file and rename, so readers never see a partial artifact
+        atomic_dump(model_data, path)
         print(f"Model saved to {path}")
     
+    def export(self, path: str, compact: bool = False, prune_tolerance: float = 0.0):
+        """Export the trained model for the NumPy runtime (`ml_models.runtime`).
+        
+        `compact` stores it in float32 with redundant nodes merged; see
+        `export_symptom_classifier` for `prune_tolerance`.
+        """
+        export_symptom_classifier(self, path, compact=compact, prune_tolerance=prune_tolerance)
+    
     def load_model(self, path: str = None):
         """Load a trained model."""
         if path is None:
@@ -262,6 +226,7 @@ class SymptomClassifier:
         self.vectorizer = model_data['vectorizer']
         self.classifier = model_data['classifier']
         self.label_encoder = model_data['label_encoder']
+        self.calibration = model_data.get('calibration')
         self.is_trained = model_data['is_trained']
         
         print(f"Model loaded from {path}")
@@ -0,0 +1,86 @@
+"""Symptom text preprocessing shared by the classifier and its NumPy runtime.
+
+Kept free of scikit-learn imports; spaCy is only imported when a
+lemmatizer is requested.
+"""
+
+import re
+from typing import Dict, List
+
+
+def load_nlp(model: str = "en_core_web_sm"):
+    """Load the spaCy pipeline used for lemmatization, or None if unavailable."""
+    try:
+        import spacy
+        return spacy.load(model)
+    except (ImportError, OSError):
+        print("Warning: spaCy model not found. Using basic preprocessing.")
+        return None
+
+
+def preprocess_text(text: str, nlp=None) -> str:
+    """Preprocess symptom text."""
+    if not text:
+        return ""
+
+    # Convert to lowercase
+    text = text.lower()
+
+    # Remove special characters and numbers
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+
+    # Remove extra whitespace
+    text = ' '.join(text.split())
+
+    # Use spaCy for advanced preprocessing if available
+    if nlp:
+        doc = nlp(text)
+        tokens = [token.lemma_ for token in doc if not token.is_stop and not token.is_punct]
+        text = ' '.join(tokens)
+
+    return text
+
+
+def extract_symptoms(text: str, nlp=None) -> List[str]:
+    """Extract individual symptoms from text."""
+    text = preprocess_text(text, nlp)
+
+    # Split by common separators
+    symptoms = []
+    for separator in [',', ';', ' and ', ' or ', '\n']:
+        if separator in text:
+            symptoms.extend(text.split(separator))
+            break
+    else:
+        symptoms = [text]
+
+    # Clean and filter symptoms
+    cleaned_symptoms = []
+    for symptom in symptoms:
+        symptom = symptom.strip()
+        if symptom and len(symptom) > 2:
+            cleaned_symptoms.append(symptom)
+
+    return cleaned_symptoms
+
+
+def categorize_symptoms(symptoms: List[str], symptom_categories: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Categorize symptoms into body systems."""
+    categorized = {category: [] for category in symptom_categories.keys()}
+
+    for symptom in symptoms:
+        symptom_lower = symptom.lower()
+        for category, keywords in symptom_categories.items():
+            if any(keyword in symptom_lower for keyword in keywords):
+                categorized[category].append(symptom)
+                break
+        else:
+            # If no category found, add to 'other'
+            if 'other' not in categorized:
+                categorized['other'] = []
+            categorized['other'].append(symptom)
+
+    # Remove empty categories
+    categorized = {k: v for k, v in categorized.items() if v}
+
+    return categorized
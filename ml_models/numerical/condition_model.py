@@ -0,0 +1,142 @@
+"""Multi-output condition risk model.
+
+Learns a high-risk probability for every condition (cardiovascular,
+diabetes, hypertension, respiratory) from one shared, imputed and
+standardized feature matrix. Each condition's logistic model only sees its
+own feature subset, so the learned weights form a block-sparse
+(n_features, n_conditions) matrix; Platt scaling fitted on a held-out
+split is folded into those weights. Inference for a whole batch is a
+single matrix product followed by a sigmoid.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import brier_score_loss, roc_auc_score
+
+from ml_models.numerical.feature_vector import FeatureVectorBuilder
+from ml_models.runtime import sigmoid
+
+
+class ConditionRiskModel:
+    """Calibrated per-condition risk probabilities in one vectorized call."""
+
+    def __init__(self, risk_categories: Dict[str, Dict], C: float = 1.0):
+        """Initialize from the predictor's risk categories (feature subsets and thresholds)."""
+        self.conditions = list(risk_categories)
+        self.subsets = {condition: list(spec['features']) for condition, spec in risk_categories.items()}
+        self.thresholds = {condition: spec['high_risk_threshold'] for condition, spec in risk_categories.items()}
+        self.C = C
+
+        self.feature_names: List[str] = []
+        self.medians = None
+        self.means = None
+        self.scales = None
+        self.coef = None
+        self.intercept = None
+        self.builder = None
+        self.is_trained = False
+
+    def _matrix(self, X: pd.DataFrame) -> np.ndarray:
+        """Impute and standardize features into the shared matrix."""
+        values = X.reindex(columns=self.feature_names).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        values = np.where(np.isnan(values), self.medians, values)
+        return (values - self.means) / self.scales
+
+    def fit(self, X: pd.DataFrame, targets: pd.DataFrame, calibration_size: float = 0.2,
+            random_state: int = 42) -> Dict[str, Dict[str, float]]:
+        """Fit every condition in one pass over a shared feature matrix.
+
+        `targets` has one binary column per condition. Returns held-out
+        AUC and Brier score per condition.
+        """
+        self.feature_names = list(X.columns)
+        values = X.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        self.medians = np.nan_to_num(np.nanmedian(values, axis=0))
+        values = np.where(np.isnan(values), self.medians, values)
+        self.means = values.mean(axis=0)
+        self.scales = values.std(axis=0)
+        self.scales[self.scales == 0] = 1.0
+        Z = (values - self.means) / self.scales
+        y = targets[self.conditions].to_numpy(dtype=int)
+
+        rng = np.random.default_rng(random_state)
+        order = rng.permutation(len(Z))
+        n_calibration = int(len(Z) * calibration_size)
+        calibration, train = order[:n_calibration], order[n_calibration:]
+
+        # Block-sparse weights: condition k only uses its own feature subset
+        self.coef = np.zeros((len(self.feature_names), len(self.conditions)))
+        self.intercept = np.zeros(len(self.conditions))
+        for k, condition in enumerate(self.conditions):
+            columns = [self.feature_names.index(feature) for feature in self.subsets[condition]
+                       if feature in self.feature_names]
+            weights, bias = _fit_logistic(Z[train][:, columns], y[train, k], self.C)
+            self.coef[columns, k] = weights
+            self.intercept[k] = bias
+
+        # Platt scaling on held-out logits, folded into the weights
+        logits = Z[calibration] @ self.coef + self.intercept
+        for k in range(len(self.conditions)):
+            (slope,), offset = _fit_logistic(logits[:, [k]], y[calibration, k], C=1e6)
+            if slope > 0:
+                self.coef[:, k] *= slope
+                self.intercept[k] = self.intercept[k] * slope + offset
+
+        self.builder = FeatureVectorBuilder(self.feature_names, self.medians, self.means, self.scales)
+        self.is_trained = True
+
+        probabilities = sigmoid(Z[calibration] @ self.coef + self.intercept)
+        metrics = {}
+        for k, condition in enumerate(self.conditions):
+            labels = y[calibration, k]
+            metrics[condition] = {
+                'positive_rate': float(y[:, k].mean()),
+                'brier': float(brier_score_loss(labels, probabilities[:, k])),
+                'auc': float(roc_auc_score(labels, probabilities[:, k])) if 0 < labels.sum() < len(labels) else None
+            }
+        return metrics
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        """High-risk probability per condition, (n_samples, n_conditions)."""
+        if not self.is_trained:
+            raise ValueError("Condition model must be trained before making predictions")
+        return sigmoid(self._matrix(X) @ self.coef + self.intercept)
+
+    def predict_frame(self, X: pd.DataFrame) -> pd.DataFrame:
+        """High-risk probabilities as a DataFrame with one column per condition."""
+        return pd.DataFrame(self.predict_proba(X), columns=self.conditions, index=X.index)
+
+    def predict(self, X: pd.DataFrame) -> Dict[str, float]:
+        """High-risk probabilities for a single sample."""
+        return {condition: float(p) for condition, p in zip(self.conditions, self.predict_proba(X)[0])}
+
+    def predict_features(self, features: Dict) -> Dict[str, float]:
+        """High-risk probabilities for a single feature dict, without pandas."""
+        if not self.is_trained:
+            raise ValueError("Condition model must be trained before making predictions")
+        probabilities = sigmoid(self.builder.build(features) @ self.coef + self.intercept)
+        return {condition: float(p) for condition, p in zip(self.conditions, probabilities)}
+
+
+def _fit_logistic(Z: np.ndarray, y: np.ndarray, C: float):
+    """Fit a logistic regression, falling back to the base rate for single-class targets."""
+    if len(np.unique(y)) < 2:
+        rate = np.clip(y.mean() if len(y) else 0.5, 1e-3, 1 - 1e-3)
+        return np.zeros(Z.shape[1]), float(np.log(rate / (1 - rate)))
+
+    model = LogisticRegression(C=C, max_iter=1000)
+    model.fit(Z, y)
+    return model.coef_[0], float(model.intercept_[0])
+
+
+def condition_targets(scores: pd.DataFrame, thresholds: Dict[str, float],
+                      conditions: Optional[List[str]] = None) -> pd.DataFrame:
+    """Binary high-risk targets: a condition's rule score reaching its threshold."""
+    conditions = conditions or list(thresholds)
+    return pd.DataFrame({
+        # Tolerance for weights that sum to the threshold in floating point
+        condition: (scores[condition] >= thresholds[condition] - 1e-9).astype(int) for condition in conditions
+    }, index=scores.index)
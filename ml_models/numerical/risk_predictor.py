@@ -11,6 +11,14 @@ from typing import Dict, List, Tuple, Optional
 import warnings
 warnings.filterwarnings('ignore')
 
+from ml_models.artifacts import atomic_dump
+from ml_models.calibration import CalibrationTable
+from ml_models.export import export_risk_predictor
+from ml_models.numerical.condition_model import ConditionRiskModel, condition_targets
+from ml_models.numerical.feature_vector import FeatureVectorBuilder
+from ml_models.numerical.risk_rules import get_risk_rules, recommend_features, score_features
+from ml_models.runtime import risk_predictions
+
 class HealthRiskPredictor:
     """Numerical risk predictor for health monitoring using structured data."""
     
@@ -25,9 +33,11 @@ class HealthRiskPredictor:
             max_depth=6,
             random_state=42
         )
+        self.calibration = None
         self.is_trained = False
         self.model_path = model_path
         self.feature_names = []
+        self.feature_builder = None
         
         # Risk categories and thresholds
         self.risk_categories = {
@@ -53,6 +63,9 @@ class HealthRiskPredictor:
             }
         }
         
+        # Per-condition high-risk probabilities over the category feature subsets
+        self.condition_model = ConditionRiskModel(self.risk_categories)
+        
         # Load pre-trained model if path provided
         if model_path and os.path.exists(model_path):
             self.load_model()
@@ -107,44 +120,6 @@ class HealthRiskPredictor:
             respiratory_infections = np.random.randint(0, 5)  # last year
             lung_function = np.random.normal(100, 15)         # % of normal
             
-            # Calculate risk factors based on values
-            # Cardiovascular risk
-            cv_risk_score = 0
-            if age > 45:
-                cv_risk_score += 0.2
-            if bp_systolic > 140 or bp_diastolic > 90:
-                cv_risk_score += 0.3
-            if cholesterol > 240:
-                cv_risk_score += 0.2
-            if bmi > 30:
-                cv_risk_score += 0.1
-            if smoking:
-                cv_risk_score += 0.3
-            if family_history_cvd:
-                cv_risk_score += 0.2
-            
-            # Diabetes risk
-            diabetes_risk_score = 0
-            if age > 45:
-                diabetes_risk_score += 0.2
-            if bmi > 25:
-                diabetes_risk_score += 0.2
-            if glucose > 100:
-                diabetes_risk_score += 0.3
-            if family_history_diabetes:
-                diabetes_risk_score += 0.3
-            if physical_activity < 3:
-                diabetes_risk_score += 0.1
-            
-            # Determine overall risk category
-            max_risk = max(cv_risk_score, diabetes_risk_score)
-            if max_risk > 0.7:
-                risk_category = 'high'
-            elif max_risk > 0.4:
-                risk_category = 'medium'
-            else:
-                risk_category = 'low'
-            
             data.append({
                 'age': age,
                 'gender': gender,
@@ -171,13 +146,19 @@ class HealthRiskPredictor:
                 'salt_intake': salt_intake,
                 'allergies': allergies,
                 'respiratory_infections': respiratory_infections,
-                'lung_function': lung_function,
-                'risk_category': risk_category,
-                'cv_risk_score': cv_risk_score,
-                'diabetes_risk_score': diabetes_risk_score
+                'lung_function': lung_function
             })
         
-        return pd.DataFrame(data)
+        df = pd.DataFrame(data)
+        
+        # Label every sample at once from the shared risk rules
+        scores = get_risk_rules().score(df, cap=False)
+        max_risk = scores[['cardiovascular', 'diabetes']].max(axis=1)
+        df['risk_category'] = np.select([max_risk > 0.7, max_risk > 0.4], ['high', 'medium'], default='low')
+        df['cv_risk_score'] = scores['cardiovascular']
+        df['diabetes_risk_score'] = scores['diabetes']
+        
+        return df
     
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Prepare features for training or prediction."""
@@ -200,18 +181,37 @@ class HealthRiskPredictor:
         
         # Select only available features
         available_features = [f for f in numerical_features if f in df_processed.columns]
-        self.feature_names = available_features
         
         return df_processed[available_features]
     
-    def train(self, X_train: pd.DataFrame = None, y_train: pd.Series = None):
-        """Train the risk prediction model."""
+    def train(self, X_train: pd.DataFrame = None, y_train: pd.Series = None,
+              condition_labels: pd.DataFrame = None):
+        """Train the risk prediction model.
+        
+        `condition_labels` has one binary high-risk column per risk
+        category; without it, labels come from the shared risk rules and
+        each category's high-risk threshold.
+        
+        A trained predictor is read-only so it can be shared between
+        threads; to retrain, train a new instance and swap it in.
+        """
+        if self.is_trained:
+            raise ValueError("Model is already trained; train a new instance instead")
+        
         if X_train is None or y_train is None:
             # Generate synthetic data if no training data provided
             df = self.generate_synthetic_data(2000)
             X_train = self.prepare_features(df)
             y_train = df['risk_category']
         
+        if condition_labels is None:
+            condition_labels = condition_targets(
+                get_risk_rules().score(X_train, cap=False),
+                {category: spec['high_risk_threshold'] for category, spec in self.risk_categories.items()}
+            )
+        
+        self.feature_names = list(X_train.columns)
+        
         # Handle missing values
         X_train_imputed = self.imputer.fit_transform(X_train)
         
@@ -239,9 +239,23 @@ class HealthRiskPredictor:
         y_pred_proba = self.model.predict_proba(X_val_split)[:, 2] if len(self.model.classes_) > 2 else self.model.predict_proba(X_val_split)[:, 1]
         auc_score = roc_auc_score(y_val_binary, y_pred_proba)
         
+        # Calibrate class probabilities on the held-out split
+        self.calibration = CalibrationTable.fit(
+            self.model.predict_proba(X_val_split), np.searchsorted(self.model.classes_, y_val_split)
+        )
+        
+        # Fixed feature order and fused imputation/scaling for single-row prediction
+        self.feature_builder = FeatureVectorBuilder.from_fitted(self.feature_names, self.imputer, self.scaler)
+        
+        # Train all condition risks in one pass over the shared feature matrix
+        condition_metrics = self.condition_model.fit(X_train, condition_labels)
+        
         print("Training completed successfully!")
         print(f"Validation accuracy: {accuracy:.3f}")
         print(f"AUC score (high risk): {auc_score:.3f}")
+        for condition, metrics in condition_metrics.items():
+            auc = f"{metrics['auc']:.3f}" if metrics['auc'] is not None else 'n/a'
+            print(f"{condition}: AUC {auc}, Brier {metrics['brier']:.3f}")
         
         return accuracy, auc_score
     
@@ -250,28 +264,28 @@ class HealthRiskPredictor:
         if not self.is_trained:
             raise ValueError("Model must be trained before making predictions")
         
-        # Convert features to DataFrame
-        df = pd.DataFrame([features])
-        
-        # Prepare features
-        X = self.prepare_features(df)
-        
-        # Handle missing values
-        X_imputed = self.imputer.transform(X)
-        
-        # Scale features
-        X_scaled = self.scaler.transform(X_imputed)
+        # Standardized feature row (thread-local buffer, no DataFrame)
+        X_scaled = self.feature_builder.build(features).reshape(1, -1)
         
         # Make prediction
-        prediction = self.model.predict(X_scaled)[0]
         probabilities = self.model.predict_proba(X_scaled)[0]
         
+        # Calibrated probabilities (raw ones for models saved without calibration)
+        if self.calibration is not None:
+            probabilities = self.calibration.transform(probabilities)
+        
+        # The most likely category after calibration, so it agrees with the reported probabilities
+        predicted = np.argmax(probabilities)
+        
         # Get prediction details
-        risk_category = self.label_encoder.inverse_transform([prediction])[0]
-        confidence = np.max(probabilities)
+        risk_category = self.label_encoder.classes_[self.model.classes_[predicted]]
+        confidence = probabilities[predicted]
         
-        # Calculate specific risk scores
-        risk_scores = self.calculate_specific_risks(features)
+        # Calibrated per-condition probabilities, or rule scores for models saved without them
+        if self.condition_model.is_trained:
+            risk_scores = self.condition_model.predict_features(features)
+        else:
+            risk_scores = self.calculate_specific_risks(features)
         
         # Generate recommendations
         recommendations = self.generate_recommendations(features, risk_scores)
@@ -280,6 +294,10 @@ class HealthRiskPredictor:
             'overall_risk': risk_category,
             'confidence': float(confidence),
             'risk_scores': risk_scores,
+            'high_risk_conditions': [
+                condition for condition, score in risk_scores.items()
+                if score >= self._high_risk_cutoff(condition)
+            ],
             'recommendations': recommendations,
             'all_probabilities': {
                 category: float(prob) for category, prob in 
@@ -287,110 +305,61 @@ class HealthRiskPredictor:
             }
         }
     
+    def predict_batch(self, df: pd.DataFrame) -> List[Dict]:
+        """Predict health risk for a batch of raw feature rows; same dicts as `predict`.
+        
+        Columns are features by name (gender as its indicator columns);
+        missing columns and values are imputed.
+        """
+        if not self.is_trained:
+            raise ValueError("Model must be trained before making predictions")
+        
+        X_scaled = self.feature_builder.transform(df.reindex(columns=self.feature_names).to_numpy(dtype=float))
+        probabilities = self.model.predict_proba(X_scaled)
+        if self.calibration is not None:
+            probabilities = self.calibration.transform(probabilities)
+        predicted = np.argmax(probabilities, axis=1)
+        
+        if self.condition_model.is_trained:
+            risk_scores = self.condition_model.predict_frame(df)
+        else:
+            risk_scores = self.calculate_specific_risks_batch(df)
+        conditions = list(risk_scores.columns)
+        
+        return risk_predictions(
+            list(self.label_encoder.classes_[self.model.classes_]), predicted, probabilities,
+            conditions, risk_scores.to_numpy(),
+            {condition: self._high_risk_cutoff(condition) for condition in conditions},
+            get_risk_rules().recommend(df)
+        )
+    
+    def predict_condition_risks(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Predict per-condition high-risk probabilities for a batch in one call."""
+        if not self.condition_model.is_trained:
+            raise ValueError("Model must be trained before making predictions")
+        return self.condition_model.predict_frame(self.prepare_features(df).reindex(columns=self.feature_names))
+    
+    def _high_risk_cutoff(self, condition: str) -> float:
+        # Probabilities are of reaching the category threshold; rule scores compare with it directly
+        if self.condition_model.is_trained:
+            return 0.5
+        return self.risk_categories[condition]['high_risk_threshold']
+    
     def calculate_specific_risks(self, features: Dict) -> Dict:
         """Calculate specific risk scores for different conditions."""
-        risk_scores = {}
-        
-        # Cardiovascular risk
-        cv_score = 0
-        if features.get('age', 0) > 45:
-            cv_score += 0.2
-        if features.get('bp_systolic', 0) > 140:
-            cv_score += 0.3
-        if features.get('cholesterol', 0) > 240:
-            cv_score += 0.2
-        if features.get('bmi', 0) > 30:
-            cv_score += 0.1
-        if features.get('smoking', 0):
-            cv_score += 0.3
-        if features.get('family_history_cvd', 0):
-            cv_score += 0.2
-        risk_scores['cardiovascular'] = min(cv_score, 1.0)
-        
-        # Diabetes risk
-        diabetes_score = 0
-        if features.get('age', 0) > 45:
-            diabetes_score += 0.2
-        if features.get('bmi', 0) > 25:
-            diabetes_score += 0.2
-        if features.get('glucose', 0) > 100:
-            diabetes_score += 0.3
-        if features.get('family_history_diabetes', 0):
-            diabetes_score += 0.3
-        risk_scores['diabetes'] = min(diabetes_score, 1.0)
-        
-        # Hypertension risk
-        hypertension_score = 0
-        if features.get('bp_systolic', 0) > 130:
-            hypertension_score += 0.4
-        if features.get('bp_diastolic', 0) > 85:
-            hypertension_score += 0.3
-        if features.get('salt_intake', 0) > 2300:
-            hypertension_score += 0.2
-        if features.get('stress_level', 0) > 7:
-            hypertension_score += 0.1
-        risk_scores['hypertension'] = min(hypertension_score, 1.0)
-        
-        # Respiratory risk
-        respiratory_score = 0
-        if features.get('smoking', 0):
-            respiratory_score += 0.4
-        if features.get('air_quality', 0) > 100:
-            respiratory_score += 0.3
-        if features.get('allergies', 0):
-            respiratory_score += 0.2
-        if features.get('respiratory_infections', 0) > 2:
-            respiratory_score += 0.1
-        risk_scores['respiratory'] = min(respiratory_score, 1.0)
-        
-        return risk_scores
+        return score_features(features)
     
-    def generate_recommendations(self, features: Dict, risk_scores: Dict) -> List[str]:
-        """Generate personalized health recommendations."""
-        recommendations = []
-        
-        # Cardiovascular recommendations
-        if risk_scores.get('cardiovascular', 0) > 0.5:
-            recommendations.append("Consider cardiovascular screening with your doctor")
-            if features.get('smoking', 0):
-                recommendations.append("Quit smoking to reduce cardiovascular risk")
-            if features.get('bp_systolic', 0) > 140:
-                recommendations.append("Monitor blood pressure regularly")
-            if features.get('cholesterol', 0) > 240:
-                recommendations.append("Consider cholesterol management")
-        
-        # Diabetes recommendations
-        if risk_scores.get('diabetes', 0) > 0.5:
-            recommendations.append("Consider diabetes screening")
-            if features.get('bmi', 0) > 25:
-                recommendations.append("Consider weight management")
-            if features.get('physical_activity', 0) < 3:
-                recommendations.append("Increase physical activity")
-        
-        # Hypertension recommendations
-        if risk_scores.get('hypertension', 0) > 0.5:
-            recommendations.append("Monitor blood pressure regularly")
-            if features.get('salt_intake', 0) > 2300:
-                recommendations.append("Reduce sodium intake")
-            if features.get('stress_level', 0) > 7:
-                recommendations.append("Consider stress management techniques")
-        
-        # Respiratory recommendations
-        if risk_scores.get('respiratory', 0) > 0.5:
-            recommendations.append("Consider respiratory health assessment")
-            if features.get('air_quality', 0) > 100:
-                recommendations.append("Limit outdoor activities during poor air quality")
-            if features.get('allergies', 0):
-                recommendations.append("Manage allergies with appropriate treatment")
-        
-        # General recommendations
-        if features.get('sleep_hours', 0) < 6:
-            recommendations.append("Aim for 7-8 hours of sleep per night")
-        
-        if not recommendations:
-            recommendations.append("Continue maintaining healthy lifestyle habits")
-        
-        return recommendations
+    def calculate_specific_risks_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Calculate specific risk scores for a batch of patients, one column per condition."""
+        return get_risk_rules().score(df)
+    
+    def generate_recommendations(self, features: Dict, risk_scores: Dict = None) -> List[str]:
+        """Generate personalized health recommendations.
+        
+        Recommendations follow from the same rule table as the risk scores,
+        so `risk_scores` is accepted for compatibility but not needed.
+        """
+        return recommend_features(features)
     
     def save_model(self, path: str = None):
         """Save the trained model."""
@@ -406,15 +375,23 @@ class HealthRiskPredictor:
             'imputer': self.imputer,
             'label_encoder': self.label_encoder,
             'feature_names': self.feature_names,
+            'condition_model': self.condition_model,
+            'calibration': self.calibration,
             'is_trained': self.is_trained
         }
         
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        
-        joblib.dump(model_data, path)
+        # Write to a temporary file and rename, so readers never see a partial artifact
+        atomic_dump(model_data, path)
         print(f"Model saved to {path}")
     
+    def export(self, path: str, compact: bool = False, prune_tolerance: float = 0.0):
+        """Export the trained model for the NumPy runtime (`ml_models.runtime`).
+        
+        `compact` stores it in float32 with redundant nodes merged; see
+        `export_risk_predictor` for `prune_tolerance`.
+        """
+        export_risk_predictor(self, path, compact=compact, prune_tolerance=prune_tolerance)
+    
     def load_model(self, path: str = None):
         """Load a trained model."""
         if path is None:
@@ -430,7 +407,10 @@ class HealthRiskPredictor:
         self.imputer = model_data['imputer']
         self.label_encoder = model_data['label_encoder']
         self.feature_names = model_data['feature_names']
+        self.condition_model = model_data.get('condition_model') or ConditionRiskModel(self.risk_categories)
+        self.calibration = model_data.get('calibration')
         self.is_trained = model_data['is_trained']
+        self.feature_builder = FeatureVectorBuilder.from_fitted(self.feature_names, self.imputer, self.scaler)
         
         print(f"Model loaded from {path}")
 
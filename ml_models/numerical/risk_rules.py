@@ -0,0 +1,189 @@
+"""Declarative risk rules shared by risk scoring, recommendations and synthetic labels.
+
+Each rule adds `weight` to a risk category when any of its conditions
+holds, and contributes its recommendation when that category's score is
+above its recommendation threshold. The table is compiled once into NumPy
+arrays, so scoring a batch of patients is one comparison over an
+(n_patients, n_conditions) matrix followed by two matrix products.
+Missing features (NaN) never satisfy a condition.
+"""
+
+import operator
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# (category, conditions (any of), weight, recommendation)
+RISK_RULES = [
+    ('cardiovascular', [('age', '>', 45)], 0.2, None),
+    ('cardiovascular', [('smoking', '>', 0)], 0.3, "Quit smoking to reduce cardiovascular risk"),
+    ('cardiovascular', [('bp_systolic', '>', 140), ('bp_diastolic', '>', 90)], 0.3,
+     "Monitor blood pressure regularly"),
+    ('cardiovascular', [('cholesterol', '>', 240)], 0.2, "Consider cholesterol management"),
+    ('cardiovascular', [('bmi', '>', 30)], 0.1, None),
+    ('cardiovascular', [('family_history_cvd', '>', 0)], 0.2, None),
+
+    ('diabetes', [('age', '>', 45)], 0.2, None),
+    ('diabetes', [('bmi', '>', 25)], 0.2, "Consider weight management"),
+    ('diabetes', [('glucose', '>', 100)], 0.3, None),
+    ('diabetes', [('family_history_diabetes', '>', 0)], 0.3, None),
+    ('diabetes', [('physical_activity', '<', 3)], 0.1, "Increase physical activity"),
+
+    ('hypertension', [('bp_systolic', '>', 130)], 0.4, None),
+    ('hypertension', [('bp_diastolic', '>', 85)], 0.3, None),
+    ('hypertension', [('salt_intake', '>', 2300)], 0.2, "Reduce sodium intake"),
+    ('hypertension', [('stress_level', '>', 7)], 0.1, "Consider stress management techniques"),
+
+    ('respiratory', [('smoking', '>', 0)], 0.4, None),
+    ('respiratory', [('air_quality', '>', 100)], 0.3, "Limit outdoor activities during poor air quality"),
+    ('respiratory', [('allergies', '>', 0)], 0.2, "Manage allergies with appropriate treatment"),
+    ('respiratory', [('respiratory_infections', '>', 2)], 0.1, None),
+
+    # Always recommended when it applies, whatever the scores
+    ('general', [('sleep_hours', '<', 6)], 0.0, "Aim for 7-8 hours of sleep per night"),
+]
+
+# Category -> (score above which its recommendations apply, recommendation leading them)
+CATEGORY_RECOMMENDATIONS = {
+    'cardiovascular': (0.5, "Consider cardiovascular screening with your doctor"),
+    'diabetes': (0.5, "Consider diabetes screening"),
+    'hypertension': (0.5, "Monitor blood pressure regularly"),
+    'respiratory': (0.5, "Consider respiratory health assessment"),
+    'general': (-np.inf, None),
+}
+
+DEFAULT_RECOMMENDATION = "Continue maintaining healthy lifestyle habits"
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+
+class RiskRuleTable:
+    """A rule table compiled into threshold and weight matrices."""
+
+    def __init__(self, rules=RISK_RULES, category_recommendations=CATEGORY_RECOMMENDATIONS):
+        """Compile the rule table."""
+        self.categories = list(dict.fromkeys(category for category, _, _, _ in rules))
+        self.scored_categories = [category for category in self.categories if category != 'general']
+        self.recommendations = [recommendation for _, _, _, recommendation in rules]
+
+        conditions = list(dict.fromkeys(condition for _, rule_conditions, _, _ in rules
+                                        for condition in rule_conditions))
+        for _, op, _ in conditions:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown risk rule operator: {op}")
+
+        self.features = list(dict.fromkeys(feature for feature, _, _ in conditions))
+        self.feature_index = np.array([self.features.index(feature) for feature, _, _ in conditions])
+        self.thresholds = np.array([threshold for _, _, threshold in conditions], dtype=float)
+        self.operator_columns = {
+            op: np.array([i for i, (_, condition_op, _) in enumerate(conditions) if condition_op == op])
+            for op in dict.fromkeys(op for _, op, _ in conditions)
+        }
+
+        # membership[c, r]: condition c belongs to rule r; weights[r, k]: rule r's weight for category k
+        self.membership = np.zeros((len(conditions), len(rules)))
+        self.weights = np.zeros((len(rules), len(self.categories)))
+        self.rule_category = np.zeros(len(rules), dtype=int)
+        for r, (category, rule_conditions, weight, _) in enumerate(rules):
+            for condition in rule_conditions:
+                self.membership[conditions.index(condition), r] = 1.0
+            self.rule_category[r] = self.categories.index(category)
+            self.weights[r, self.rule_category[r]] = weight
+
+        self.recommendation_thresholds = np.array([category_recommendations[category][0]
+                                                   for category in self.categories])
+        self.category_recommendations = [category_recommendations[category][1]
+                                         for category in self.categories]
+
+    def feature_matrix(self, rows) -> np.ndarray:
+        """Build the (n, n_features) float matrix from a DataFrame or feature dicts; missing is NaN."""
+        if isinstance(rows, pd.DataFrame):
+            return rows.reindex(columns=self.features).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+        rows = list(rows)
+        X = np.full((len(rows), len(self.features)), np.nan)
+        for n, row in enumerate(rows):
+            for i, feature in enumerate(self.features):
+                try:
+                    X[n, i] = row.get(feature)
+                except (TypeError, ValueError):
+                    pass
+        return X
+
+    def rule_hits(self, X: np.ndarray) -> np.ndarray:
+        """Which rules hold for each row, as an (n, n_rules) boolean matrix."""
+        values = X[:, self.feature_index]
+        hits = np.zeros(values.shape, dtype=bool)
+        for op, columns in self.operator_columns.items():
+            hits[:, columns] = OPERATORS[op](values[:, columns], self.thresholds[columns])
+
+        return hits.astype(float) @ self.membership > 0
+
+    def score_matrix(self, X: np.ndarray, hits: Optional[np.ndarray] = None) -> np.ndarray:
+        """Uncapped category scores, (n, n_categories)."""
+        if hits is None:
+            hits = self.rule_hits(X)
+        return hits.astype(float) @ self.weights
+
+    def score(self, rows, cap: bool = True) -> pd.DataFrame:
+        """Score a batch of patients, one column per risk category."""
+        scores = self.score_matrix(self.feature_matrix(rows))
+        if cap:
+            scores = np.minimum(scores, 1.0)
+
+        index = rows.index if isinstance(rows, pd.DataFrame) else None
+        columns = [self.categories.index(category) for category in self.scored_categories]
+        return pd.DataFrame(scores[:, columns], columns=self.scored_categories, index=index)
+
+    def recommend(self, rows) -> List[List[str]]:
+        """Recommendations for a batch of patients, in rule table order."""
+        X = self.feature_matrix(rows)
+        hits = self.rule_hits(X)
+        active = np.minimum(self.score_matrix(X, hits), 1.0) > self.recommendation_thresholds
+        applicable = hits & active[:, self.rule_category]
+
+        batch = []
+        for row_active, row_applicable in zip(active, applicable):
+            recommendations = []
+            for k in range(len(self.categories)):
+                if row_active[k] and self.category_recommendations[k]:
+                    recommendations.append(self.category_recommendations[k])
+                for r in np.flatnonzero(row_applicable & (self.rule_category == k)):
+                    if self.recommendations[r]:
+                        recommendations.append(self.recommendations[r])
+
+            batch.append(list(dict.fromkeys(recommendations)) or [DEFAULT_RECOMMENDATION])
+
+        return batch
+
+
+_table = None
+
+
+def get_risk_rules() -> RiskRuleTable:
+    """Get the compiled default rule table."""
+    global _table
+
+    if _table is None:
+        _table = RiskRuleTable()
+    return _table
+
+
+def score_features(features: Dict) -> Dict[str, float]:
+    """Capped category scores for one patient."""
+    table = get_risk_rules()
+    scores = np.minimum(table.score_matrix(table.feature_matrix([features]))[0], 1.0)
+    return {category: float(scores[table.categories.index(category)]) for category in table.scored_categories}
+
+
+def recommend_features(features: Dict) -> List[str]:
+    """Recommendations for one patient."""
+    return get_risk_rules().recommend([features])[0]
+
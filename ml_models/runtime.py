@@ -0,0 +1,313 @@
+"""Pure-NumPy inference runtime for exported models.
+
+`ml_models.export` flattens a trained `HealthRiskPredictor` (imputer,
+scaler, gradient boosting and condition model) or `SymptomClassifier`
+(TF-IDF and random forest) into a single `.npz` file of plain arrays plus
+a JSON header. This module executes those files with NumPy alone, so
+request workers never import scikit-learn and artifacts load without
+unpickling.
+
+Tree ensembles are packed into flat node arrays where leaves point to
+themselves; all trees of a batch descend together, one vectorized step
+per level.
+"""
+
+import json
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ml_models.calibration import CalibrationTable
+from ml_models.nlp.text_processing import categorize_symptoms, extract_symptoms, load_nlp, preprocess_text
+from ml_models.numerical.feature_vector import FeatureVectorBuilder
+from ml_models.numerical.risk_rules import get_risk_rules, recommend_features, score_features
+
+FORMAT_VERSION = 1
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    """Numerically stable logistic function."""
+    return np.exp(-np.logaddexp(0.0, -z))
+
+
+def softmax(z: np.ndarray) -> np.ndarray:
+    """Softmax over the last axis."""
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def _calibrate(calibration: Optional[CalibrationTable], probabilities: np.ndarray) -> np.ndarray:
+    """Apply a calibration table, if the export has one."""
+    return probabilities if calibration is None else calibration.transform(probabilities)
+
+
+def risk_predictions(classes, predicted: np.ndarray, probabilities: np.ndarray, conditions: List[str],
+                     risk_scores: np.ndarray, cutoffs: Dict[str, float], recommendations: List[List[str]]) -> List[Dict]:
+    """Per-row risk prediction dicts, as returned by `predict`, from batch outputs."""
+    high_risk = risk_scores >= np.array([cutoffs[condition] for condition in conditions])
+    results = []
+    for n, k in enumerate(predicted):
+        results.append({
+            'overall_risk': classes[k],
+            'confidence': float(probabilities[n, k]),
+            'risk_scores': dict(zip(conditions, risk_scores[n].tolist())),
+            'high_risk_conditions': [condition for condition, high in zip(conditions, high_risk[n]) if high],
+            'recommendations': recommendations[n],
+            'all_probabilities': dict(zip(classes, probabilities[n].tolist()))
+        })
+    return results
+
+
+class TreeEnsemble:
+    """Decision trees packed into flat node arrays."""
+
+    def __init__(self, left, right, feature, threshold, value, roots, depth: int):
+        """Wrap packed arrays; leaves have left == right == their own index."""
+        self.left = np.asarray(left)
+        self.right = np.asarray(right)
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots)
+        self.depth = int(depth)
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> 'TreeEnsemble':
+        """Read the ensemble stored under `prefix` in an exported file."""
+        return cls(*(arrays[f'{prefix}.{name}'] for name in ('left', 'right', 'feature', 'threshold', 'value', 'roots')),
+                   depth=int(arrays[f'{prefix}.depth']))
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Arrays to store the ensemble under `prefix`."""
+        return {
+            f'{prefix}.left': self.left, f'{prefix}.right': self.right,
+            f'{prefix}.feature': self.feature, f'{prefix}.threshold': self.threshold,
+            f'{prefix}.value': self.value, f'{prefix}.roots': self.roots,
+            f'{prefix}.depth': np.array(self.depth),
+        }
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Leaf value of every tree for every row, (n_samples, n_trees, n_outputs)."""
+        # Trees split on float32 features, as in scikit-learn
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes]
+
+
+class TfidfTransform:
+    """Word n-gram TF-IDF with a fixed vocabulary, matching TfidfVectorizer."""
+
+    def __init__(self, terms, idf, stop_words, token_pattern: str, ngram_range, lowercase: bool = True,
+                 sublinear_tf: bool = False, norm: str = 'l2', columns=None):
+        """Build the term index from vocabulary terms ordered by index.
+
+        `columns` maps each term to its output column, or -1 for terms that
+        only count towards the row norm; by default every term is a column.
+        """
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.columns = np.arange(len(self.idf)) if columns is None else np.asarray(columns)
+        self.n_columns = int(self.columns.max(initial=-1)) + 1
+        self.stop_words = frozenset(stop_words)
+        self.token_pattern = re.compile(token_pattern)
+        self.min_n, self.max_n = ngram_range
+        self.lowercase = lowercase
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+
+    def analyze(self, text: str) -> List[str]:
+        """Tokenize, drop stop words and emit n-grams."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = [token for token in self.token_pattern.findall(text) if token not in self.stop_words]
+
+        ngrams = []
+        for n in range(self.min_n, self.max_n + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(' '.join(tokens[i:i + n]))
+        return ngrams
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Dense TF-IDF rows, (n_texts, n_columns)."""
+        X = np.zeros((len(texts), self.n_columns))
+        for row, text in enumerate(texts):
+            counts = Counter(self.vocabulary[term] for term in self.analyze(text) if term in self.vocabulary)
+            if not counts:
+                continue
+
+            terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            if self.sublinear_tf:
+                weights = np.log(weights) + 1
+            weights *= self.idf[terms]
+
+            if self.norm == 'l2':
+                weights /= np.sqrt(np.dot(weights, weights)) or 1.0
+            elif self.norm == 'l1':
+                weights /= np.abs(weights).sum() or 1.0
+
+            columns = self.columns[terms]
+            kept = columns >= 0
+            X[row, columns[kept]] = weights[kept]
+        return X
+
+
+class RiskRuntime:
+    """Exported `HealthRiskPredictor`, same `predict` output."""
+
+    def __init__(self, header: Dict, arrays):
+        """Rebuild feature scaling, the boosted trees and the condition model."""
+        self.header = header
+        self.classes = header['classes']
+        self.learning_rate = header['learning_rate']
+        self.thresholds = header['high_risk_thresholds']
+        self.builder = FeatureVectorBuilder(header['feature_names'], arrays['features.medians'],
+                                            arrays['features.means'], arrays['features.scales'])
+        self.trees = TreeEnsemble.from_arrays(arrays, 'gbm')
+        self.init = np.asarray(arrays['gbm.init'], dtype=np.float64)
+
+        # (n_trees, n_classes) indicator of the class each boosting tree adds to
+        outputs = arrays['gbm.outputs'] if 'gbm.outputs' in arrays else \
+            np.tile(np.arange(len(self.init)), len(self.trees.roots) // len(self.init))
+        self.tree_outputs = np.eye(len(self.init))[outputs]
+
+        self.conditions = header['conditions']
+        self.condition_trained = bool(self.conditions)
+        if self.condition_trained:
+            self.condition_builder = FeatureVectorBuilder(
+                header['condition_feature_names'], arrays['conditions.medians'],
+                arrays['conditions.means'], arrays['conditions.scales']
+            )
+            self.coef = np.asarray(arrays['conditions.coef'], dtype=np.float64)
+            self.intercept = np.asarray(arrays['conditions.intercept'], dtype=np.float64)
+
+        self.calibration = CalibrationTable.from_arrays(arrays, 'calibration')
+        self.is_trained = True
+
+    def predict_proba(self, X: np.ndarray, calibrated: bool = True) -> np.ndarray:
+        """Risk category probabilities for standardized rows, in `classes` order."""
+        values = self.trees.leaf_values(X)[:, :, 0]
+        raw = self.init + self.learning_rate * (values @ self.tree_outputs)
+        if raw.shape[1] == 1:
+            positive = sigmoid(raw[:, 0])
+            probabilities = np.column_stack([1 - positive, positive])
+        else:
+            probabilities = softmax(raw)
+        return _calibrate(self.calibration, probabilities) if calibrated else probabilities
+
+    def predict_condition_risks(self, features: Dict) -> Dict[str, float]:
+        """High-risk probabilities per condition for a single feature dict."""
+        probabilities = sigmoid(self.condition_builder.build(features) @ self.coef + self.intercept)
+        return {condition: float(p) for condition, p in zip(self.conditions, probabilities)}
+
+    def predict_batch(self, df) -> List[Dict]:
+        """Predict health risk for a DataFrame of raw feature rows; same dicts as `predict`."""
+        X = self.builder.transform(df.reindex(columns=self.builder.feature_names).to_numpy(dtype=np.float64))
+        probabilities = self.predict_proba(X)
+        predicted = probabilities.argmax(axis=1)
+
+        if self.condition_trained:
+            Z = self.condition_builder.transform(
+                df.reindex(columns=self.condition_builder.feature_names).to_numpy(dtype=np.float64)
+            )
+            conditions, risk_scores = self.conditions, sigmoid(Z @ self.coef + self.intercept)
+            cutoffs = dict.fromkeys(conditions, 0.5)
+        else:
+            scores = get_risk_rules().score(df)
+            conditions, risk_scores = list(scores.columns), scores.to_numpy()
+            cutoffs = self.thresholds
+
+        return risk_predictions(self.classes, predicted, probabilities, conditions, risk_scores, cutoffs,
+                                get_risk_rules().recommend(df))
+
+    def predict(self, features: Dict) -> Dict:
+        """Predict health risk from features."""
+        probabilities = self.predict_proba(self.builder.build(features).reshape(1, -1))[0]
+        predicted = int(np.argmax(probabilities))
+
+        if self.condition_trained:
+            risk_scores = self.predict_condition_risks(features)
+            cutoffs = dict.fromkeys(risk_scores, 0.5)
+        else:
+            risk_scores = score_features(features)
+            cutoffs = self.thresholds
+
+        return {
+            'overall_risk': self.classes[predicted],
+            'confidence': float(probabilities[predicted]),
+            'risk_scores': risk_scores,
+            'high_risk_conditions': [
+                condition for condition, score in risk_scores.items() if score >= cutoffs[condition]
+            ],
+            'recommendations': recommend_features(features),
+            'all_probabilities': {
+                category: float(prob) for category, prob in zip(self.classes, probabilities)
+            }
+        }
+
+
+class SymptomRuntime:
+    """Exported `SymptomClassifier`, same `predict` output."""
+
+    def __init__(self, header: Dict, arrays):
+        """Rebuild the TF-IDF transform and the forest."""
+        self.header = header
+        self.classes = header['classes']
+        self.symptom_categories = header['symptom_categories']
+        self.nlp = load_nlp() if header['lemmatize'] else None
+        self.tfidf = TfidfTransform(
+            arrays['tfidf.terms'], arrays['tfidf.idf'], arrays['tfidf.stop_words'],
+            header['token_pattern'], tuple(header['ngram_range']), header['lowercase'],
+            header['sublinear_tf'], header['norm'], arrays.get('tfidf.columns')
+        )
+        self.trees = TreeEnsemble.from_arrays(arrays, 'forest')
+        self.calibration = CalibrationTable.from_arrays(arrays, 'calibration')
+        self.is_trained = True
+
+    def predict_proba(self, texts: List[str], calibrated: bool = True) -> np.ndarray:
+        """Condition probabilities for preprocessed texts, in `classes` order."""
+        probabilities = self.trees.leaf_values(self.tfidf.transform(texts)).mean(axis=1, dtype=np.float64)
+        return _calibrate(self.calibration, probabilities) if calibrated else probabilities
+
+    def predict(self, symptom_text: str) -> Dict:
+        """Predict disease/condition from symptom text."""
+        probability = self.predict_proba([preprocess_text(symptom_text, self.nlp)])[0]
+        predicted = int(np.argmax(probability))
+
+        symptoms = extract_symptoms(symptom_text, self.nlp)
+        return {
+            'predicted_condition': self.classes[predicted],
+            'confidence': float(probability[predicted]),
+            'symptoms_extracted': symptoms,
+            'symptoms_categorized': categorize_symptoms(symptoms, self.symptom_categories),
+            'all_probabilities': {
+                disease: float(prob) for disease, prob in zip(self.classes, probability)
+            }
+        }
+
+
+RUNTIMES = {
+    'risk_predictor': RiskRuntime,
+    'symptom_classifier': SymptomRuntime,
+}
+
+
+def load_runtime(path: str):
+    """Load an exported model file into its NumPy runtime."""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    header = json.loads(str(arrays.pop('header')))
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported exported model format {header.get('format_version')} in {path}")
+    if header.get('kind') not in RUNTIMES:
+        raise ValueError(f"Unknown exported model kind {header.get('kind')!r} in {path}")
+
+    return RUNTIMES[header['kind']](header, arrays)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+AI Health Monitoring System - Population Rescoring
+
+Scores every active user with the current risk predictor and stores a
+risk assessment for each, e.g. after a new model ships. An interrupted
+run resumes from its checkpoint when started again.
+
+Usage: python rescore.py [--workers N] [--chunk-size N] [--restart]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+
+def main():
+    """Run a rescoring pass with the backend's configuration."""
+    parser = argparse.ArgumentParser(description='Rescore every active user with the risk predictor')
+    parser.add_argument('--workers', type=int, help='scoring processes (default: RESCORE_WORKERS)')
+    parser.add_argument('--chunk-size', type=int, help='users per chunk (default: RESCORE_CHUNK_SIZE)')
+    parser.add_argument('--restart', action='store_true', help='start a new run instead of resuming')
+    args = parser.parse_args()
+
+    # Same working directory as the server, so model and checkpoint paths match
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    sys.path.insert(0, os.getcwd())
+
+    from app import app
+    from services.rescoring import rescore_population
+
+    with app.app_context():
+        stats = rescore_population(resume=not args.restart, workers=args.workers, chunk_size=args.chunk_size)
+
+    if stats is None:
+        print("Rescoring is already running")
+        return 1
+
+    print(json.dumps(stats, indent=2))
+    print(f"Rescored {stats['scored']} users at {stats['users_per_second']} users/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
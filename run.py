@@ -80,6 +80,8 @@ def start_backend():
     # Set environment variables
     os.environ['FLASK_ENV'] = 'development'
     os.environ['FLASK_APP'] = 'app.py'
+    # The only server process, so it runs the background jobs
+    os.environ.setdefault('SCHEDULER_ENABLED', 'true')
     
     try:
         # Import and run the Flask app